@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import asyncpg
+
+# Когорта — задачи менеджера, созданные в окне. Для каждой берется первый переход в каждый статус,
+# перцентили считаются на стороне PostgreSQL, в Python приходит по строке на сотрудника плюс итог.
+MANAGER_ANALYTICS_QUERY = '''
+    WITH created AS (
+        SELECT task_id, employee_id, created_at
+        FROM task_events
+        WHERE manager_id = $1 AND created_at >= CURRENT_TIMESTAMP - make_interval(days => $2) AND old_status IS NULL
+    ), transitions AS (
+        SELECT task_id,
+               MIN(created_at) FILTER (WHERE new_status = 'accepted') AS accepted_at,
+               MIN(created_at) FILTER (WHERE new_status = 'completed') AS completed_at,
+               MIN(created_at) FILTER (WHERE new_status = 'rejected') AS rejected_at
+        FROM task_events
+        WHERE manager_id = $1 AND created_at >= CURRENT_TIMESTAMP - make_interval(days => $2) AND old_status IS NOT NULL
+        GROUP BY task_id
+    ), per_task AS (
+        SELECT c.employee_id,
+               EXTRACT(EPOCH FROM tr.accepted_at - c.created_at)::float8 AS accept_seconds,
+               EXTRACT(EPOCH FROM tr.completed_at - c.created_at)::float8 AS complete_seconds,
+               tr.completed_at IS NOT NULL AS completed,
+               tr.rejected_at IS NOT NULL AS rejected
+        FROM created c
+        LEFT JOIN transitions tr ON tr.task_id = c.task_id
+    )
+    SELECT GROUPING(p.employee_id) = 1 AS is_total,
+           p.employee_id,
+           MAX(u.full_name) AS employee_name,
+           COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE p.completed) AS completed,
+           COUNT(*) FILTER (WHERE p.rejected) AS rejected,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY p.accept_seconds) AS accept_p50,
+           percentile_cont(0.9) WITHIN GROUP (ORDER BY p.accept_seconds) AS accept_p90,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY p.complete_seconds) AS complete_p50,
+           percentile_cont(0.9) WITHIN GROUP (ORDER BY p.complete_seconds) AS complete_p90
+    FROM per_task p
+    LEFT JOIN users u ON u.user_id = p.employee_id
+    GROUP BY GROUPING SETS ((p.employee_id), ())
+    ORDER BY is_total DESC, total DESC, employee_name
+'''
+
+
+@dataclass
+class TaskMetrics:
+    employee_id: Optional[int]
+    employee_name: Optional[str]
+    total: int
+    completed: int
+    rejected: int
+    accept_p50: Optional[float]
+    accept_p90: Optional[float]
+    complete_p50: Optional[float]
+    complete_p90: Optional[float]
+
+    @property
+    def completion_rate(self) -> float:
+        return self.completed / self.total if self.total else 0.0
+
+
+@dataclass
+class ManagerAnalytics:
+    days: int
+    overall: Optional[TaskMetrics]
+    employees: list
+
+
+async def fetch_manager_analytics(pool: asyncpg.Pool, manager_id: int, days: int) -> ManagerAnalytics:
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(MANAGER_ANALYTICS_QUERY, manager_id, days)
+
+    overall = None
+    employees = []
+    for row in rows:
+        metrics = TaskMetrics(row['employee_id'], row['employee_name'], row['total'], row['completed'],
+                              row['rejected'], row['accept_p50'], row['accept_p90'],
+                              row['complete_p50'], row['complete_p90'])
+        if row['is_total']:
+            overall = metrics
+        else:
+            employees.append(metrics)
+    return ManagerAnalytics(days, overall, employees)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч"
@@ -0,0 +1,36 @@
+import logging
+
+import asyncpg
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+
+from audit import AuditMiddleware, install_audit_context
+from config import BOT_TOKEN
+from metrics import MetricsMiddleware
+from handlers import start_handlers, admin_handlers, manager_handlers, employee_handlers
+from middlewares import UserMiddleware
+from storage import create_fsm_storage
+
+
+def create_bot() -> Bot:
+    return Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+
+
+def create_dispatcher(pool: asyncpg.Pool) -> Dispatcher:
+    dp = Dispatcher(storage=create_fsm_storage(pool))
+    dp.update.outer_middleware(UserMiddleware())
+    # Контекст аудита нужен уже выбранному обработчику, поэтому это внутренние middleware
+    dp.message.middleware(AuditMiddleware())
+    dp.callback_query.middleware(AuditMiddleware())
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    install_audit_context(logging.getLogger('user_actions'))
+
+    dp.include_router(start_handlers.router)
+    dp.include_router(admin_handlers.router)
+    dp.include_router(manager_handlers.router)
+    dp.include_router(employee_handlers.router)
+    dp.include_router(start_handlers.fallback_router)
+
+    dp['pool'] = pool
+    return dp
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import AUDIT_FLUSH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_BUFFER_LIMIT
+
+app_logger = logging.getLogger('app')
+
+AUDIT_COLUMNS = ('created_at', 'user_id', 'chat_id', 'action', 'details')
+
+
+@dataclass(frozen=True)
+class AuditContext:
+    user_id: Optional[int]
+    chat_id: Optional[int]
+    action: str
+
+
+# Кто и в каком обработчике сейчас выполняет действие — ставится middleware на время обработки апдейта
+audit_context: ContextVar[Optional[AuditContext]] = ContextVar('audit_context', default=None)
+
+
+class AuditMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        from_user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        handler_object = data.get('handler')
+        token = audit_context.set(AuditContext(
+            from_user.id if from_user else None,
+            chat.id if chat else None,
+            handler_object.callback.__name__ if handler_object else type(event).__name__,
+        ))
+        try:
+            return await handler(event, data)
+        finally:
+            audit_context.reset(token)
+
+
+class AuditContextFilter(logging.Filter):
+    # Дописывает в запись user_id, chat_id и action из текущего контекста. Уже заполненные поля
+    # не трогаем: запись из воркера приходит в ведущий процесс с контекстом воркера.
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'action'):
+            context = audit_context.get()
+            record.user_id = context.user_id if context else None
+            record.chat_id = context.chat_id if context else None
+            record.action = context.action if context else None
+        return True
+
+
+class AuditBuffer:
+    def __init__(self, flush_size: int = AUDIT_FLUSH_SIZE, limit: int = AUDIT_BUFFER_LIMIT):
+        self.flush_size = flush_size
+        # При недоступной БД буфер не растет бесконечно: самые старые записи вытесняются
+        self.records = deque(maxlen=limit)
+        self.flush_needed = asyncio.Event()
+        self.loop = None
+
+    def add(self, record: tuple):
+        self.records.append(record)
+        # Записи воркеров приходят из потока пересылки логов, поэтому будим сброс через loop
+        if len(self.records) >= self.flush_size and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.flush_needed.set)
+
+    async def flush(self, pool: asyncpg.Pool) -> int:
+        self.flush_needed.clear()
+        batch = []
+        while self.records:
+            batch.append(self.records.popleft())
+        if not batch:
+            return 0
+        try:
+            async with pool.acquire() as conn:
+                await conn.copy_records_to_table('audit_events', records=batch, columns=AUDIT_COLUMNS)
+        except Exception as e:
+            # Вернем записи в начало буфера и попробуем при следующем сбросе
+            self.records.extendleft(reversed(batch))
+            app_logger.error(f"Не удалось записать {len(batch)} событий аудита: {e}")
+            return 0
+        return len(batch)
+
+    async def run(self, pool: asyncpg.Pool, interval: float = AUDIT_FLUSH_INTERVAL):
+        self.loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.flush_needed.wait(), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self.flush(pool)
+        finally:
+            await self.flush(pool)
+
+
+class AuditHandler(logging.Handler):
+    def __init__(self, buffer: AuditBuffer):
+        super().__init__()
+        self.buffer = buffer
+
+    def emit(self, record: logging.LogRecord):
+        self.buffer.add((datetime.fromtimestamp(record.created), getattr(record, 'user_id', None),
+                         getattr(record, 'chat_id', None), getattr(record, 'action', None), record.getMessage()))
+
+
+def install_audit_context(logger: logging.Logger):
+    if not any(isinstance(f, AuditContextFilter) for f in logger.filters):
+        logger.addFilter(AuditContextFilter())
+
+
+def start_audit(pool: asyncpg.Pool, logger: logging.Logger) -> asyncio.Task:
+    buffer = AuditBuffer()
+    logger.addHandler(AuditHandler(buffer))
+    return asyncio.create_task(buffer.run(pool))
+
+
+async def fetch_audit_events(pool: asyncpg.Pool, user_id: int = None, action: str = None,
+                             since: datetime = None, until: datetime = None, limit: int = 30) -> list:
+    # Условия добавляются только для заданных фильтров, чтобы планировщик выбирал подходящий индекс
+    conditions, args = [], []
+    for condition, value in (("user_id = ${}", user_id), ("action = ${}", action),
+                             ("created_at >= ${}", since), ("created_at < ${}", until)):
+        if value is not None:
+            args.append(value)
+            conditions.append(condition.format(len(args)))
+    args.append(limit)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(f'''
+            SELECT created_at, user_id, action, details
+            FROM audit_events
+            {where}
+            ORDER BY created_at DESC
+            LIMIT ${len(args)}
+        ''', *args)
+    return rows
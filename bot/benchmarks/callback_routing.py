@@ -0,0 +1,122 @@
+# Замер пропускной способности маршрутизации нажатий на inline-кнопки, без сети и БД.
+# Запуск из папки bot: python -m benchmarks.callback_routing [кол-во нажатий]
+# Сравниваются прежняя схема (строки вида "status_accepted_42" и фильтры F.data.startswith,
+# проверяемые по очереди) и фабрики callbacks.py с таблицей префиксов CallbackTableRouter.
+# Синхронные фильтры F.data aiogram выполняет через run_in_executor, так что каждая лишняя проверка
+# прежней схемы — это переход в пул потоков; фильтр фабрики асинхронный и проверяется один раз.
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+
+from aiogram import F, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery, User
+
+from callbacks import (CallbackTableRouter, DeleteOrganization, CancelDeleteOrganization, AssignManagerUser,
+                       AssignManagerOrganization, RemoveManager, ConfirmReset, CancelReset, AssignEmployee,
+                       RemoveEmployee, ToggleTaskEmployee, ToggleAllTaskEmployees, ConfirmTaskEmployees,
+                       AnalyticsWindow, SetTaskStatus, CancelTaskStatusChange, ChangeTaskStatus, CancelAction)
+from pagination import TaskPageCursor
+from pickers import PickerCursor
+
+SEED = 42
+USER = User(id=123456789, is_bot=False, first_name='bench')
+
+# Прежние callback_data в порядке регистрации обработчиков (start, admin, manager, employee)
+LEGACY_PREFIXES = [
+    'cancel_action', 'delete_org_', 'cancel_delete_org', 'select_user_assign_manager_',
+    'select_org_assign_manager_', 'select_manager_remove_', 'confirm_reset', 'cancel_reset', 'pk:',
+    'select_user_assign_employee_', 'select_employee_remove_', 'select_employee_assign_task_',
+    'select_all_employees_assign_task', 'confirm_employees_assign_task', 'tp:m:', 'analytics_',
+    'tp:e:', 'change_task_direct_', 'cancel_task_status_change', 'status_',
+]
+
+
+def _sample_payloads(rng: random.Random):
+    user_id = rng.randrange(10 ** 8, 10 ** 10)
+    task_id = rng.randrange(1, 10 ** 6)
+    created_at = datetime(2026, 1, 1, rng.randrange(24), rng.randrange(60), rng.randrange(60), rng.randrange(10 ** 6))
+    legacy = [
+        'cancel_action', f'delete_org_{task_id}', 'cancel_delete_org', f'select_user_assign_manager_{user_id}',
+        f'select_org_assign_manager_{task_id}', f'select_manager_remove_{user_id}', 'confirm_reset', 'cancel_reset',
+        f'pk:am:n:{user_id}:', f'select_user_assign_employee_{user_id}', f'select_employee_remove_{user_id}',
+        f'select_employee_assign_task_{user_id}', 'select_all_employees_assign_task', 'confirm_employees_assign_task',
+        f'tp:m:a:n:{created_at.timestamp()}:{task_id}', 'analytics_30', f'tp:e:n:n:{created_at.timestamp()}:{task_id}',
+        f'change_task_direct_{task_id}', 'cancel_task_status_change', f'status_accepted_{task_id}',
+    ]
+    packed = [
+        CancelAction(), DeleteOrganization(org_id=task_id), CancelDeleteOrganization(),
+        AssignManagerUser(user_id=user_id), AssignManagerOrganization(org_id=task_id), RemoveManager(user_id=user_id),
+        ConfirmReset(), CancelReset(), PickerCursor(picker='am', direction='n', anchor_id=user_id),
+        AssignEmployee(user_id=user_id), RemoveEmployee(user_id=user_id), ToggleTaskEmployee(user_id=user_id),
+        ToggleAllTaskEmployees(), ConfirmTaskEmployees(),
+        TaskPageCursor(scope='m', status='accepted', direction='n', created_at=created_at, task_id=task_id),
+        AnalyticsWindow(days=30),
+        TaskPageCursor(scope='e', status='new', direction='n', created_at=created_at, task_id=task_id),
+        ChangeTaskStatus(task_id=task_id), CancelTaskStatusChange(), SetTaskStatus(status='accepted', task_id=task_id),
+    ]
+    return legacy, [factory.pack() for factory in packed]
+
+
+async def _handler(callback_query: CallbackQuery):
+    return True
+
+
+def legacy_router() -> Router:
+    router = Router()
+    for prefix in LEGACY_PREFIXES:
+        # Обработчики без параметров в callback_data сравнивались на равенство, остальные — по началу строки
+        data_filter = F.data.startswith(prefix) if prefix.endswith(('_', ':')) else F.data == prefix
+        router.callback_query.register(_handler, data_filter)
+    return router
+
+
+def table_router() -> Router:
+    router = CallbackTableRouter()
+    factories = [
+        CancelAction, DeleteOrganization, CancelDeleteOrganization, AssignManagerUser, AssignManagerOrganization,
+        RemoveManager, ConfirmReset, CancelReset, PickerCursor, AssignEmployee, RemoveEmployee, ToggleTaskEmployee,
+        ToggleAllTaskEmployees, ConfirmTaskEmployees, AnalyticsWindow, ChangeTaskStatus, CancelTaskStatusChange,
+        SetTaskStatus,
+    ]
+    for factory in factories:
+        router.callback_query.register(_handler, factory.filter())
+    router.callback_query.register(_handler, TaskPageCursor.filter(F.scope == 'm'))
+    router.callback_query.register(_handler, TaskPageCursor.filter(F.scope == 'e'))
+    return router
+
+
+async def measure(router: Router, events) -> float:
+    started = time.perf_counter()
+    for event in events:
+        if await router.propagate_event('callback_query', event) is UNHANDLED:
+            raise RuntimeError(f"Нажатие не дошло до обработчика: {event.data!r}")
+    return len(events) / (time.perf_counter() - started)
+
+
+async def main(count: int):
+    rng = random.Random(SEED)
+    legacy_events, packed_events = [], []
+    max_legacy = max_packed = 0
+    for i in range(count):
+        legacy, packed = _sample_payloads(rng)
+        index = rng.randrange(len(legacy))
+        max_legacy = max(max_legacy, max(len(data.encode()) for data in legacy))
+        max_packed = max(max_packed, max(len(data.encode()) for data in packed))
+        legacy_events.append(CallbackQuery(id=str(i), from_user=USER, chat_instance='bench', data=legacy[index]))
+        packed_events.append(CallbackQuery(id=str(i), from_user=USER, chat_instance='bench', data=packed[index]))
+
+    print(f"Нажатий: {count}, обработчиков: {len(LEGACY_PREFIXES)}")
+    print(f"Самая длинная callback_data: прежняя {max_legacy} байт, упакованная {max_packed} байт (лимит 64)\n")
+    print(f"{'схема':<28}{'нажатий/с':>12}")
+    for name, router, events in (('startswith по очереди', legacy_router(), legacy_events),
+                                 ('фабрики + таблица префиксов', table_router(), packed_events)):
+        # Прогрев, затем замер
+        await measure(router, events[:1000])
+        print(f"{name:<28}{await measure(router, events):>12.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000))
@@ -0,0 +1,93 @@
+# Замер экономии аллокаций от готовых клавиатур (keyboards.memoized_keyboard), без сети и БД.
+# Запуск из папки bot: python -m benchmarks.keyboard_markup [кол-во пользователей]
+# Сравниваются сборка разметки на каждый ответ (как было) и выдача из кэша: время и память на ответ,
+# а также подготовка уведомления о запуске (on_startup_notify) на всех пользователей.
+# Время замеряется под tracemalloc, поэтому абсолютные значения завышены — сравнивать стоит соотношение.
+import random
+import sys
+import time
+import tracemalloc
+
+from broadcast import OutgoingMessage
+from keyboards import (get_main_menu_keyboard, get_start_keyboard, get_confirm_reset_keyboard, get_back_keyboard,
+                       clear_keyboard_cache, keyboard_cache_info)
+from outbox import _dump_markup, _dump_markups
+
+SEED = 42
+ROLES = ['user', 'employee', 'employee', 'employee', 'manager', 'admin']
+
+
+def _replies(rng: random.Random, count: int) -> list:
+    # Типичная смесь ответов: в основном главное меню, реже "Назад", регистрация и подтверждение сброса
+    replies = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.7:
+            replies.append((get_main_menu_keyboard, (rng.choice(ROLES),)))
+        elif kind < 0.9:
+            replies.append((get_back_keyboard, ()))
+        elif kind < 0.95:
+            replies.append((get_start_keyboard, ()))
+        else:
+            replies.append((get_confirm_reset_keyboard, ()))
+    return replies
+
+
+def measure(replies: list, cached: bool):
+    # Разметки удерживаются до конца замера, как сообщения в очереди на отправку
+    clear_keyboard_cache()
+    tracemalloc.start()
+    started = time.perf_counter()
+    if cached:
+        markups = [build(*args) for build, args in replies]
+    else:
+        markups = [build.__wrapped__(*args) for build, args in replies]
+    elapsed = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(replies) * 1e6, memory / len(markups)
+
+
+def measure_startup(users: list, cached: bool):
+    clear_keyboard_cache()
+    tracemalloc.start()
+    started = time.perf_counter()
+    if cached:
+        messages = [OutgoingMessage(user_id, 'text', reply_markup=get_main_menu_keyboard(role)) for user_id, role in users]
+        payloads = _dump_markups(messages)
+    else:
+        messages = [OutgoingMessage(user_id, 'text', reply_markup=get_main_menu_keyboard.__wrapped__(role))
+                    for user_id, role in users]
+        payloads = [_dump_markup(m.reply_markup) for m in messages]
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(payloads) == len(users)
+    return elapsed * 1000, peak / 2 ** 20
+
+
+def main(count: int):
+    rng = random.Random(SEED)
+    replies = _replies(rng, count)
+    # Прогрев: сборка моделей pydantic и импорт валидаторов
+    measure(replies[:100], cached=False)
+
+    print(f"Ответов: {count}\n")
+    print(f"{'схема':<20}{'мкс/ответ':>12}{'байт/ответ':>12}")
+    for name, cached in (('сборка на ответ', False), ('готовые разметки', True)):
+        per_reply, memory = measure(replies, cached)
+        print(f"{name:<20}{per_reply:>12.1f}{memory:>12.0f}")
+    info = keyboard_cache_info()
+    print("\nПопадания в кэш: " + ', '.join(f"{name} {stats.hits}/{stats.hits + stats.misses}"
+                                          for name, stats in info.items() if stats.hits + stats.misses))
+
+    users = [(user_id, rng.choice(ROLES)) for user_id in range(count)]
+    print(f"\nУведомление о запуске, {count} пользователей (разметки + JSON для очереди):")
+    print(f"{'схема':<20}{'мс':>12}{'пик, МиБ':>12}")
+    for name, cached in (('сборка на ответ', False), ('готовые разметки', True)):
+        elapsed, peak = measure_startup(users, cached)
+        print(f"{name:<20}{elapsed:>12.0f}{peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,88 @@
+# Замер латентности запроса аналитики менеджера на синтетической истории статусов.
+# Запуск из папки bot: python -m benchmarks.manager_analytics [кол-во задач менеджера]
+# Данные создаются в отдельной схеме bench_analytics и удаляются после замера.
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date
+
+import asyncpg
+
+from analytics import MANAGER_ANALYTICS_QUERY
+from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, ANALYTICS_WINDOWS
+from migrations import apply_migrations
+from task_events import _add_months, create_task_event_partitions
+
+SCHEMA = 'bench_analytics'
+ITERATIONS = 50
+MANAGERS = 20
+EMPLOYEES_PER_MANAGER = 50
+HISTORY_DAYS = 365
+TARGET_MS = 200
+
+
+async def seed(conn: asyncpg.Connection, tasks_per_manager: int):
+    # Каждая задача: создание, затем принятие и выполнение (или отказ) через случайные интервалы
+    await conn.execute(f'''
+        INSERT INTO users (user_id, full_name, role)
+        SELECT g, 'employee ' || g, 'employee' FROM generate_series(1, {MANAGERS * EMPLOYEES_PER_MANAGER}) g;
+
+        CREATE TEMP TABLE bench_tasks AS
+        SELECT g AS task_id,
+               1 + g % {MANAGERS} AS manager_id,
+               1 + g % {MANAGERS * EMPLOYEES_PER_MANAGER} AS employee_id,
+               now() - random() * interval '{HISTORY_DAYS} days' AS created_at,
+               random() * interval '2 days' AS to_accept,
+               random() * interval '7 days' AS to_finish,
+               g % 10 = 0 AS rejected
+        FROM generate_series(1, {tasks_per_manager * MANAGERS}) g;
+
+        INSERT INTO task_events (task_id, actor_id, manager_id, employee_id, old_status, new_status, created_at)
+        SELECT task_id, manager_id, manager_id, employee_id, NULL, 'new', created_at FROM bench_tasks
+        UNION ALL
+        SELECT task_id, employee_id, manager_id, employee_id, 'new', 'accepted', created_at + to_accept
+        FROM bench_tasks
+        UNION ALL
+        SELECT task_id, employee_id, manager_id, employee_id, 'accepted',
+               CASE WHEN rejected THEN 'rejected' ELSE 'completed' END, created_at + to_accept + to_finish
+        FROM bench_tasks;
+    ''')
+    await conn.execute('ANALYZE')
+
+
+async def main(tasks_per_manager: int):
+    conn = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, database=DB_NAME)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}')
+        await conn.execute(f'SET search_path TO {SCHEMA}')
+        await apply_migrations(conn)
+        # Секции на всю историю и на месяц вперед: события выполнения задач бывают позже сегодняшнего дня
+        history_months = HISTORY_DAYS // 28 + 1
+        await create_task_event_partitions(conn, _add_months(date.today().replace(day=1), -history_months),
+                                           history_months + 2)
+
+        print(f"Заполнение истории: {MANAGERS} менеджеров по {tasks_per_manager} задач...")
+        started = time.perf_counter()
+        await seed(conn, tasks_per_manager)
+        print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+        statement = await conn.prepare(MANAGER_ANALYTICS_QUERY)
+        print(f"{'окно, дн.':<12}{'p50, мс':>10}{'p95, мс':>10}")
+        for days in sorted(set(ANALYTICS_WINDOWS + [HISTORY_DAYS])):
+            timings = []
+            for i in range(ITERATIONS):
+                started = time.perf_counter()
+                await statement.fetch(1 + i % MANAGERS, days)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            mark = '' if p95 < TARGET_MS else f'  > {TARGET_MS} мс'
+            print(f"{days:<12}{statistics.median(timings):>10.1f}{p95:>10.1f}{mark}")
+    finally:
+        await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        await conn.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
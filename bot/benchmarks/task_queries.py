@@ -0,0 +1,116 @@
+# Замер латентности горячих запросов к задачам на синтетических данных.
+# Запуск из папки bot: python -m benchmarks.task_queries [кол-во задач]
+# Данные создаются в отдельной схеме bench_tasks и удаляются после замера.
+import asyncio
+import statistics
+import sys
+import time
+
+import asyncpg
+
+from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
+from migrations import MIGRATIONS, apply_migrations
+
+SCHEMA = 'bench_tasks'
+ITERATIONS = 200
+ORGANIZATIONS = 50
+MANAGERS_PER_ORG = 4
+EMPLOYEES_PER_ORG = 200
+
+QUERIES = {
+    'manager tasks by status': ('''
+        SELECT t.task_id, t.title, t.description, t.status
+        FROM tasks t
+        WHERE t.manager_id = $1 AND t.status = $2
+        ORDER BY t.created_at DESC
+        LIMIT 20
+    ''', 'manager'),
+    'employee tasks by status': ('''
+        SELECT t.task_id, t.title, t.description, t.status
+        FROM tasks t
+        WHERE t.employee_id = $1 AND t.status = $2
+        ORDER BY t.created_at
+    ''', 'employee'),
+    'employees of organization': ('''
+        SELECT user_id, full_name FROM users WHERE role = 'employee' AND organization_id = $1
+    ''', 'organization'),
+}
+
+
+async def seed(conn: asyncpg.Connection, task_count: int):
+    await conn.execute(f'''
+        INSERT INTO organizations (org_id, name)
+        SELECT g, 'org ' || g FROM generate_series(1, {ORGANIZATIONS}) g;
+
+        INSERT INTO users (user_id, full_name, role, organization_id)
+        SELECT g, 'manager ' || g, 'manager', (g - 1) % {ORGANIZATIONS} + 1
+        FROM generate_series(1, {ORGANIZATIONS * MANAGERS_PER_ORG}) g;
+
+        INSERT INTO users (user_id, full_name, role, organization_id)
+        SELECT 100000 + g, 'employee ' || g, 'employee', (g - 1) % {ORGANIZATIONS} + 1
+        FROM generate_series(1, {ORGANIZATIONS * EMPLOYEES_PER_ORG}) g;
+
+        INSERT INTO users (user_id, full_name, role)
+        SELECT 200000 + g, 'user ' || g, 'user' FROM generate_series(1, 5000) g;
+    ''')
+    await conn.execute(f'''
+        INSERT INTO tasks (title, description, employee_id, manager_id, organization_id, status, created_at)
+        SELECT 'task ' || g, 'description ' || g,
+               100000 + 1 + (g % {ORGANIZATIONS * EMPLOYEES_PER_ORG}),
+               1 + (g % {ORGANIZATIONS * MANAGERS_PER_ORG}),
+               1 + (g % {ORGANIZATIONS}),
+               (ARRAY['new', 'accepted', 'completed', 'completed', 'completed', 'rejected'])[1 + g % 6],
+               now() - (g || ' seconds')::interval
+        FROM generate_series(1, {task_count}) g
+    ''')
+    await conn.execute('ANALYZE')
+
+
+async def measure(conn: asyncpg.Connection) -> dict:
+    params = {
+        'manager': lambda i: (1 + i % (ORGANIZATIONS * MANAGERS_PER_ORG), 'new'),
+        'employee': lambda i: (100001 + i % (ORGANIZATIONS * EMPLOYEES_PER_ORG), 'accepted'),
+        'organization': lambda i: (1 + i % ORGANIZATIONS,),
+    }
+    results = {}
+    for name, (sql, kind) in QUERIES.items():
+        statement = await conn.prepare(sql)
+        timings = []
+        for i in range(ITERATIONS):
+            started = time.perf_counter()
+            await statement.fetch(*params[kind](i))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+    return results
+
+
+async def main(task_count: int):
+    conn = await asyncpg.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST, database=DB_NAME)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}')
+        await conn.execute(f'SET search_path TO {SCHEMA}')
+
+        # Сначала только схема без индексов, затем догоняем до последней версии
+        await apply_migrations(conn, [m for m in MIGRATIONS if m[0] <= 2])
+        print(f"Заполнение {task_count} задач...")
+        started = time.perf_counter()
+        await seed(conn, task_count)
+        print(f"Готово за {time.perf_counter() - started:.1f} с")
+
+        without_indexes = await measure(conn)
+        await apply_migrations(conn)
+        await conn.execute('ANALYZE')
+        with_indexes = await measure(conn)
+
+        print(f"\n{'запрос':<28}{'без индексов, мс (p50/p95)':>30}{'с индексами, мс (p50/p95)':>30}")
+        for name in QUERIES:
+            before, after = without_indexes[name], with_indexes[name]
+            print(f"{name:<28}{before[0]:>18.2f} / {before[1]:<9.2f}{after[0]:>18.2f} / {after[1]:<9.2f}")
+    finally:
+        await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        await conn.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+import asyncpg
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from config import BROADCAST_RATE_LIMIT, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES
+from metrics import telegram_errors
+
+app_logger = logging.getLogger('app')
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def penalize(self, seconds: float):
+        # После TelegramRetryAfter уводим бакет в минус, чтобы все отправители подождали
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class ChatRateLimiter:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed = {}
+
+    async def acquire(self, chat_id: int):
+        now = time.monotonic()
+        if len(self._next_allowed) > 10000:
+            self._next_allowed = {k: v for k, v in self._next_allowed.items() if v > now}
+        send_at = max(now, self._next_allowed.get(chat_id, now))
+        self._next_allowed[chat_id] = send_at + self.interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    def penalize(self, chat_id: int, seconds: float):
+        self._next_allowed[chat_id] = max(self._next_allowed.get(chat_id, 0), time.monotonic() + seconds)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, per_chat_interval: float):
+        self.global_bucket = TokenBucket(rate)
+        self.per_chat = ChatRateLimiter(per_chat_interval)
+
+    async def acquire(self, chat_id: int):
+        await self.per_chat.acquire(chat_id)
+        await self.global_bucket.acquire()
+
+    def penalize(self, chat_id: int, seconds: float):
+        self.per_chat.penalize(chat_id, seconds)
+        self.global_bucket.penalize(seconds)
+
+
+# Общий лимитер на процесс: все рассылки делят глобальный лимит Telegram
+rate_limiter = RateLimiter(BROADCAST_RATE_LIMIT, BROADCAST_PER_CHAT_INTERVAL)
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    reply_markup: object = None
+    parse_mode: Optional[str] = None
+
+
+@dataclass
+class BroadcastResult:
+    total: int
+    sent: int = 0
+    failed: int = 0
+    started_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+
+async def send_message(bot: Bot, chat_id: int, text: str, reply_markup=None, parse_mode: str = None,
+                       max_retries: int = BROADCAST_MAX_RETRIES) -> bool:
+    for attempt in range(max_retries + 1):
+        await rate_limiter.acquire(chat_id)
+        try:
+            kwargs = {'reply_markup': reply_markup}
+            if parse_mode:
+                kwargs['parse_mode'] = parse_mode
+            await bot.send_message(chat_id, text, **kwargs)
+            return True
+        except TelegramRetryAfter as e:
+            telegram_errors.inc('broadcast', 'retry_after')
+            rate_limiter.penalize(chat_id, e.retry_after)
+            app_logger.warning(f"Превышен лимит Telegram при отправке пользователю {chat_id}, "
+                               f"повтор через {e.retry_after} с (попытка {attempt + 1})")
+        except TelegramForbiddenError:
+            telegram_errors.inc('broadcast', 'forbidden')
+            app_logger.warning(f"Target user {chat_id} blocked the bot.")
+            return False
+        except TelegramBadRequest as e:
+            telegram_errors.inc('broadcast', 'bad_request')
+            app_logger.error(f"Failed to send message to user {chat_id}: {e}")
+            return False
+        except Exception as e:
+            telegram_errors.inc('broadcast', 'other')
+            app_logger.error(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+            return False
+    app_logger.error(f"Не удалось отправить сообщение пользователю {chat_id}: исчерпаны попытки")
+    return False
+
+
+async def broadcast(bot: Bot, messages: Iterable[OutgoingMessage],
+                    concurrency: int = BROADCAST_CONCURRENCY) -> BroadcastResult:
+    messages = list(messages)
+    result = BroadcastResult(total=len(messages))
+    queue = asyncio.Queue()
+    for outgoing in messages:
+        queue.put_nowait(outgoing)
+
+    async def worker():
+        while True:
+            try:
+                outgoing = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if await send_message(bot, outgoing.chat_id, outgoing.text, outgoing.reply_markup, outgoing.parse_mode):
+                result.sent += 1
+            else:
+                result.failed += 1
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(messages)) or 1)))
+    result.finished_at = datetime.now()
+    return result
+
+
+def text_messages(chat_ids: Iterable[int], text: str, reply_markup=None, parse_mode: str = None):
+    return [OutgoingMessage(chat_id, text, reply_markup, parse_mode) for chat_id in chat_ids]
+
+
+async def record_broadcast(pool: asyncpg.Pool, kind: str, result: BroadcastResult, created_by: int = None):
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO broadcasts (kind, created_by, total, sent, failed, started_at, finished_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+            ''', kind, created_by, result.total, result.sent, result.failed, result.started_at, result.finished_at)
+    except Exception as e:
+        app_logger.error(f"Не удалось сохранить результаты рассылки '{kind}': {e}")
+    app_logger.info(f"Рассылка '{kind}' завершена: отправлено {result.sent} из {result.total}, ошибок {result.failed}")
+
+
+def format_progress(result: BroadcastResult) -> str:
+    header = "Рассылка завершена." if result.finished_at else "Идет рассылка..."
+    return (f"{header}\n"
+            f"Обработано: {result.processed} из {result.total}\n"
+            f"Успешно отправлено: {result.sent}\n"
+            f"Не удалось отправить: {result.failed}")
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import asyncpg
+
+from config import USER_CACHE_TTL, USER_CACHE_MAX_SIZE
+from repositories import UserRepository
+
+app_logger = logging.getLogger('app')
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()
+        # Номер последнего сброса по ключу. Хранятся только недавние сбросы: для вытесненных ключей
+        # действует наибольший вытесненный номер, так что прочитанное до сброса значение не вернется в кэш
+        self._generations = OrderedDict()
+        self._last_generation = 0
+        self._evicted_generation = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def generation(self, key) -> int:
+        return self._generations.get(key, self._evicted_generation)
+
+    def set(self, key, value, generation: int = None) -> bool:
+        # generation — номер, взятый до чтения значения из БД: если ключ за это время сбросили,
+        # значение устарело и в кэш не попадает
+        if generation is not None and generation != self.generation(key):
+            return False
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return True
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+        self._last_generation += 1
+        self._generations[key] = self._last_generation
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_size:
+            _, self._evicted_generation = self._generations.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self._generations.clear()
+        self._last_generation += 1
+        self._evicted_generation = self._last_generation
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    user_id: int
+    role: str
+    organization_id: Optional[int]
+
+
+# Отсутствие пользователя тоже кэшируем, чтобы незарегистрированные не ходили в БД на каждый апдейт
+_NOT_REGISTERED = None
+
+user_profiles = TTLCache(USER_CACHE_TTL, USER_CACHE_MAX_SIZE)
+
+
+async def get_user_profile(user_id: int, pool: asyncpg.Pool) -> Optional[UserProfile]:
+    profile = user_profiles.get(user_id, _MISSING)
+    if profile is not _MISSING:
+        return profile
+
+    # Сброс во время чтения (например, снятие роли) не должен вернуть в кэш прежнюю роль на USER_CACHE_TTL
+    generation = user_profiles.generation(user_id)
+    async with pool.acquire() as conn:
+        user = await UserRepository(conn).get(user_id)
+    profile = UserProfile(user_id, user.role, user.organization_id) if user else _NOT_REGISTERED
+    user_profiles.set(user_id, profile, generation)
+    return profile
+
+
+# В режиме нескольких процессов у каждого свой кэш профилей: об изменениях сообщаем остальным
+# через LISTEN/NOTIFY PostgreSQL
+INVALIDATION_CHANNEL = 'user_cache_invalidation'
+# Полезная нагрузка NOTIFY ограничена 8000 байтами
+INVALIDATION_CHUNK_SIZE = 500
+
+_notify_pool: Optional[asyncpg.Pool] = None
+_notify_tasks = set()
+
+
+def invalidate_user(user_id: int):
+    invalidate_users([user_id])
+
+
+def invalidate_users(user_ids):
+    user_ids = list(user_ids)
+    for user_id in user_ids:
+        user_profiles.invalidate(user_id)
+    if _notify_pool is not None and user_ids:
+        task = asyncio.create_task(_publish_invalidation(_notify_pool, user_ids))
+        _notify_tasks.add(task)
+        task.add_done_callback(_notify_tasks.discard)
+
+
+async def _publish_invalidation(pool: asyncpg.Pool, user_ids: list):
+    try:
+        async with pool.acquire() as conn:
+            for i in range(0, len(user_ids), INVALIDATION_CHUNK_SIZE):
+                payload = ','.join(str(user_id) for user_id in user_ids[i:i + INVALIDATION_CHUNK_SIZE])
+                await conn.execute('SELECT pg_notify($1, $2)', INVALIDATION_CHANNEL, payload)
+    except Exception as e:
+        app_logger.error(f"Не удалось разослать сброс кэша пользователей {user_ids}: {e}")
+
+
+def _on_invalidation(conn, pid, channel, payload):
+    for user_id in payload.split(','):
+        user_profiles.invalidate(int(user_id))
+
+
+async def enable_shared_invalidation(pool: asyncpg.Pool) -> asyncpg.Connection:
+    global _notify_pool
+    # Слушающее соединение держится отдельно от пула все время работы процесса
+    conn = await pool.acquire()
+    await conn.add_listener(INVALIDATION_CHANNEL, _on_invalidation)
+    _notify_pool = pool
+    return conn
+
+
+async def disable_shared_invalidation(pool: asyncpg.Pool, conn: asyncpg.Connection):
+    global _notify_pool
+    _notify_pool = None
+    if _notify_tasks:
+        await asyncio.gather(*_notify_tasks, return_exceptions=True)
+    await conn.remove_listener(INVALIDATION_CHANNEL, _on_invalidation)
+    await pool.release(conn)
@@ -0,0 +1,203 @@
+import logging
+from datetime import datetime, timedelta
+from heapq import merge
+from typing import Annotated, Any, Dict, Iterator, List, Optional, Tuple
+
+import aiogram
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.dispatcher.middlewares.manager import MiddlewareManager
+from aiogram.filters.callback_data import CallbackData, CallbackQueryFilter
+from aiogram.types import CallbackQuery
+from pydantic import BeforeValidator, PlainSerializer
+
+app_logger = logging.getLogger('app')
+
+# Формат callback_data: "<префикс><версия>:<поле>:<поле>...", числа в base36.
+# При несовместимом изменении формата версия увеличивается: кнопки в старых сообщениях
+# перестают совпадать с префиксами и получают ответ "кнопка устарела", а не чужой обработчик.
+CALLBACK_VERSION = 1
+SEPARATOR = ':'
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+EPOCH = datetime(1970, 1, 1)
+STATUS_CODES = {'n': 'new', 'a': 'accepted', 'c': 'completed', 'r': 'rejected'}
+STATUS_TO_CODE = {status: code for code, status in STATUS_CODES.items()}
+
+
+def encode_int(value: int) -> str:
+    if value < 0:
+        return '-' + encode_int(-value)
+    digits = []
+    while True:
+        value, digit = divmod(value, 36)
+        digits.append(_DIGITS[digit])
+        if not value:
+            return ''.join(reversed(digits))
+
+
+def _decode_int(value: Any) -> Any:
+    return int(value, 36) if isinstance(value, str) else value
+
+
+def _encode_datetime(value: datetime) -> str:
+    return encode_int((value - EPOCH) // timedelta(microseconds=1))
+
+
+def _decode_datetime(value: Any) -> Any:
+    return EPOCH + timedelta(microseconds=int(value, 36)) if isinstance(value, str) else value
+
+
+def _decode_status(value: Any) -> Any:
+    return STATUS_CODES.get(value, value)
+
+
+# Поля фабрик: в коде — обычные int/datetime/статус, в callback_data — короткая строка
+PackedInt = Annotated[int, BeforeValidator(_decode_int), PlainSerializer(encode_int, return_type=str)]
+PackedDatetime = Annotated[datetime, BeforeValidator(_decode_datetime),
+                           PlainSerializer(_encode_datetime, return_type=str)]
+PackedStatus = Annotated[str, BeforeValidator(_decode_status),
+                         PlainSerializer(lambda status: STATUS_TO_CODE[status], return_type=str)]
+
+
+class PackedCallbackData(CallbackData, prefix='_'):
+    def __init_subclass__(cls, **kwargs):
+        # К префиксу каждой фабрики дописывается версия формата
+        if 'prefix' in kwargs:
+            kwargs['prefix'] = f"{kwargs['prefix']}{CALLBACK_VERSION}"
+        super().__init_subclass__(sep=SEPARATOR, **kwargs)
+
+
+# Администратор
+class DeleteOrganization(PackedCallbackData, prefix='od'):
+    org_id: PackedInt
+
+class CancelDeleteOrganization(PackedCallbackData, prefix='oc'):
+    pass
+
+class AssignManagerUser(PackedCallbackData, prefix='mu'):
+    user_id: PackedInt
+
+class AssignManagerOrganization(PackedCallbackData, prefix='mo'):
+    org_id: PackedInt
+
+class RemoveManager(PackedCallbackData, prefix='mr'):
+    user_id: PackedInt
+
+class ConfirmReset(PackedCallbackData, prefix='rs'):
+    pass
+
+class CancelReset(PackedCallbackData, prefix='rc'):
+    pass
+
+
+# Менеджер
+class AssignEmployee(PackedCallbackData, prefix='eu'):
+    user_id: PackedInt
+
+class RemoveEmployee(PackedCallbackData, prefix='er'):
+    user_id: PackedInt
+
+class ToggleTaskEmployee(PackedCallbackData, prefix='tt'):
+    user_id: PackedInt
+
+class ToggleAllTaskEmployees(PackedCallbackData, prefix='ta'):
+    pass
+
+class ConfirmTaskEmployees(PackedCallbackData, prefix='tc'):
+    pass
+
+class AnalyticsWindow(PackedCallbackData, prefix='an'):
+    days: PackedInt
+
+
+# Сотрудник
+class SetTaskStatus(PackedCallbackData, prefix='st'):
+    status: PackedStatus
+    task_id: PackedInt
+
+class CancelTaskStatusChange(PackedCallbackData, prefix='sc'):
+    pass
+
+class ChangeTaskStatus(PackedCallbackData, prefix='ct'):
+    task_id: PackedInt
+
+
+# Общие
+class CancelAction(PackedCallbackData, prefix='x'):
+    pass
+
+
+def callback_prefix(data: Optional[str]) -> Optional[str]:
+    return data.split(SEPARATOR, 1)[0] if data else None
+
+
+def _table_dispatch_supported() -> bool:
+    # CallbackTableObserver.trigger повторяет цикл TelegramEventObserver.trigger и вызывает его внутренние
+    # методы. Он проверен на версиях из TABLE_DISPATCH_AIOGRAM; на других версиях (или если методов нет)
+    # используется обычный последовательный перебор aiogram — медленнее, но с тем же результатом.
+    try:
+        version = tuple(int(part) for part in aiogram.__version__.split('.')[:2])
+    except ValueError:
+        return False
+    return (TABLE_DISPATCH_AIOGRAM[0] <= version <= TABLE_DISPATCH_AIOGRAM[1]
+            and hasattr(TelegramEventObserver, '_resolve_middlewares')
+            and hasattr(MiddlewareManager, 'wrap_middlewares'))
+
+
+TABLE_DISPATCH_AIOGRAM = ((3, 7), (3, 13))
+TABLE_DISPATCH = _table_dispatch_supported()
+if not TABLE_DISPATCH:
+    app_logger.warning(f"aiogram {aiogram.__version__}: маршрутизация нажатий по таблице префиксов отключена, "
+                       f"используется последовательный перебор обработчиков")
+
+
+class CallbackTableObserver(TelegramEventObserver):
+    # Обработчики с фильтром фабрики (Factory.filter()) раскладываются по префиксу: апдейт проверяет
+    # только обработчики своего префикса и обработчики без фабрики, а не перебирает фильтры всех.
+    # Кандидаты проверяются в порядке регистрации, как в обычном роутере aiogram.
+    def __init__(self, router: Router, event_name: str = 'callback_query'):
+        super().__init__(router=router, event_name=event_name)
+        self.table: Dict[str, List[Tuple[int, HandlerObject]]] = {}
+        self.unindexed: List[Tuple[int, HandlerObject]] = []
+
+    def register(self, callback, *filters, flags=None, **kwargs):
+        result = super().register(callback, *filters, flags=flags, **kwargs)
+        index = len(self.handlers) - 1
+        handler = self.handlers[index]
+        prefixes = [f.callback.callback_data.__prefix__ for f in handler.filters
+                    if isinstance(f.callback, CallbackQueryFilter)]
+        if prefixes:
+            self.table.setdefault(prefixes[0], []).append((index, handler))
+        else:
+            self.unindexed.append((index, handler))
+        return result
+
+    def candidates(self, data: Optional[str]) -> Iterator[HandlerObject]:
+        # Оба списка уже упорядочены по номеру регистрации, слияние сохраняет общий порядок
+        for _, handler in merge(self.table.get(callback_prefix(data), ()), self.unindexed):
+            yield handler
+
+    async def trigger(self, event: CallbackQuery, **kwargs: Any) -> Any:
+        if not TABLE_DISPATCH:
+            return await super().trigger(event, **kwargs)
+        # Тот же цикл, что в TelegramEventObserver.trigger, но только по кандидатам из таблицы
+        for handler in self.candidates(event.data):
+            kwargs['handler'] = handler
+            result, data = await handler.check(event, **kwargs)
+            if result:
+                kwargs.update(data)
+                try:
+                    wrapped_inner = self.outer_middleware.wrap_middlewares(self._resolve_middlewares(), handler.call)
+                    return await wrapped_inner(event, kwargs)
+                except SkipHandler:
+                    continue
+        return UNHANDLED
+
+
+class CallbackTableRouter(Router):
+    def __init__(self, *, name: str = None):
+        super().__init__(name=name)
+        self.callback_query = self.observers['callback_query'] = CallbackTableObserver(router=self)
@@ -0,0 +1,219 @@
+import asyncio
+import hmac
+import logging
+import logging.handlers
+import multiprocessing
+import signal
+import threading
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+from app import create_bot, create_dispatcher
+from cache import enable_shared_invalidation, disable_shared_invalidation
+from config import (BOT_MODE, WEBHOOK_PATH, WEBHOOK_SECRET, CLUSTER_POLLING_TIMEOUT, CLUSTER_SHUTDOWN_TIMEOUT,
+                    METRICS_PORT)
+from db import create_db_pool
+from metrics import start_metrics_server
+from webhook import health, serve_webhook_app, wait_for_stop_signal
+
+app_logger = logging.getLogger('app')
+
+# spawn вместо fork: дочерний процесс не наследует event loop, пул соединений и сессию бота родителя
+_mp = multiprocessing.get_context('spawn')
+
+
+def shard_key(update: Update) -> int:
+    # Все апдейты одного чата (или пользователя, если чата нет) попадают в один и тот же процесс
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.chat_id is not None:
+        return context.chat_id
+    if context.user_id is not None:
+        return context.user_id
+    return update.update_id
+
+
+class ChatSerializer:
+    # Апдейты разных чатов обрабатываются параллельно, апдейты одного чата — строго по очереди.
+    # asyncio.Lock отдает блокировку ожидающим в порядке FIFO, что и сохраняет порядок апдейтов.
+    def __init__(self):
+        self._locks = {}
+
+    async def run(self, key: int, func, *args):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await func(*args)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+
+async def _run_worker(index: int, updates):
+    bot = create_bot()
+    pool = await create_db_pool()
+    listener = await enable_shared_invalidation(pool)
+    dp = create_dispatcher(pool)
+    # У каждого воркера свои метрики на соседнем порту: METRICS_PORT + 1 + номер воркера
+    metrics_server = await start_metrics_server(METRICS_PORT + 1 + index if METRICS_PORT else 0)
+    serializer = ChatSerializer()
+    loop = asyncio.get_running_loop()
+    in_flight = set()
+    app_logger.info(f"Воркер {index} запущен")
+    try:
+        while True:
+            item = await loop.run_in_executor(None, updates.get)
+            if item is None:
+                break
+            key, data = item
+            try:
+                update = Update.model_validate(data, context={'bot': bot})
+            except Exception as e:
+                app_logger.error(f"Воркер {index}: не удалось разобрать апдейт: {e}")
+                continue
+            task = asyncio.create_task(serializer.run(key, dp.feed_update, bot, update))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            app_logger.info(f"Воркер {index}: ожидание завершения {len(in_flight)} апдейтов...")
+            await asyncio.wait(in_flight, timeout=CLUSTER_SHUTDOWN_TIMEOUT)
+    finally:
+        if metrics_server:
+            await metrics_server.cleanup()
+        await disable_shared_invalidation(pool, listener)
+        await dp.storage.close()
+        await pool.close()
+        await bot.session.close()
+        app_logger.info(f"Воркер {index} остановлен")
+
+
+def _worker_main(index: int, updates, log_queue):
+    # Сигналы остановки обрабатывает только ведущий процесс, воркеры завершаются по его команде
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # Записи логов уходят ведущему процессу, который пишет их в общие файлы
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+    asyncio.run(_run_worker(index, updates))
+
+
+def _forward_worker_logs(log_queue):
+    while True:
+        record = log_queue.get()
+        if record is None:
+            break
+        logging.getLogger(record.name).handle(record)
+
+
+class Cluster:
+    def __init__(self, size: int):
+        self.size = size
+        self.log_queue = _mp.Queue()
+        self.queues = [_mp.Queue() for _ in range(size)]
+        self.processes = [self._spawn(i) for i in range(size)]
+        self.log_thread = threading.Thread(target=_forward_worker_logs, args=(self.log_queue,), daemon=True)
+
+    def _spawn(self, index: int):
+        return _mp.Process(target=_worker_main, args=(index, self.queues[index], self.log_queue),
+                           name=f"bot-worker-{index}", daemon=True)
+
+    async def supervise(self, interval: float = 5):
+        # Упавший воркер перезапускается на той же очереди, накопившиеся апдейты он дочитает
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    app_logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    self.processes[index] = self._spawn(index)
+                    self.processes[index].start()
+
+    def start(self):
+        self.log_thread.start()
+        for process in self.processes:
+            process.start()
+        app_logger.info(f"Запущено воркеров: {self.size}")
+
+    def dispatch(self, update: Update, data: dict = None):
+        key = shard_key(update)
+        if data is None:
+            data = update.model_dump(mode='json', by_alias=True, exclude_unset=True)
+        self.queues[key % self.size].put((key, data))
+
+    async def stop(self):
+        loop = asyncio.get_running_loop()
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, CLUSTER_SHUTDOWN_TIMEOUT + 5)
+            if process.is_alive():
+                app_logger.warning(f"Воркер {process.name} не завершился вовремя, принудительная остановка")
+                process.terminate()
+        self.log_queue.put(None)
+        await loop.run_in_executor(None, self.log_thread.join)
+
+
+async def _poll_updates(cluster: Cluster, bot: Bot, allowed_updates: list):
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=CLUSTER_POLLING_TIMEOUT,
+                                            allowed_updates=allowed_updates)
+        except Exception as e:
+            app_logger.error(f"Ошибка при получении апдейтов: {e}")
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            cluster.dispatch(update)
+            offset = update.update_id + 1
+
+
+def _create_front_app(cluster: Cluster, bot: Bot, pool) -> web.Application:
+    async def receive_update(request: web.Request) -> web.Response:
+        # Наличие WEBHOOK_SECRET проверяется при запуске (check_webhook_config)
+        if not hmac.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), WEBHOOK_SECRET):
+            return web.Response(status=401, text='Unauthorized')
+        data = await request.json()
+        cluster.dispatch(Update.model_validate(data, context={'bot': bot}), data)
+        return web.Response()
+
+    app = web.Application()
+    app['pool'] = pool
+    app.router.add_post(WEBHOOK_PATH, receive_update)
+    app.router.add_get('/health', health)
+    return app
+
+
+async def run_cluster(dp: Dispatcher, bot: Bot, size: int):
+    # Ведущий процесс только принимает апдейты и раздает их воркерам по chat_id.
+    # Уведомления, очередь рассылок и очистка FSM остаются на нем же.
+    cluster = Cluster(size)
+    cluster.start()
+    allowed_updates = dp.resolve_used_update_types()
+    workflow_data = {'dispatcher': dp, 'bot': bot, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+    supervisor = asyncio.create_task(cluster.supervise())
+    try:
+        if BOT_MODE == 'webhook':
+            await serve_webhook_app(_create_front_app(cluster, bot, dp['pool']), bot, allowed_updates)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            app_logger.info("Бот запущен")
+            poller = asyncio.create_task(_poll_updates(cluster, bot, allowed_updates))
+            try:
+                await wait_for_stop_signal()
+            finally:
+                poller.cancel()
+    finally:
+        supervisor.cancel()
+        app_logger.info("Остановка воркеров...")
+        await cluster.stop()
+        await dp.emit_shutdown(**workflow_data)
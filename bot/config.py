@@ -10,3 +10,89 @@ DB_HOST = os.getenv('DB_HOST')
 DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
+
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_MAX_QUERIES = int(os.getenv('DB_POOL_MAX_QUERIES', 50000))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv('DB_POOL_MAX_INACTIVE_LIFETIME', 300))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 10))
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', 30))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+DB_STATEMENT_CACHE_LIFETIME = int(os.getenv('DB_STATEMENT_CACHE_LIFETIME', 0))
+
+BROADCAST_RATE_LIMIT = float(os.getenv('BROADCAST_RATE_LIMIT', 25))
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL', 1))
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 10))
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', 3))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 5))
+
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 2))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 20))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 2))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 120))
+# После стольких неудачных захватов (сбой воркера, падение процесса) сообщение считается недоставленным
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+
+# Сколько вариантов каждой постоянной клавиатуры (например, меню по ролям) держать готовыми
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', 64))
+
+TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', 5))
+PICKER_PAGE_SIZE = int(os.getenv('PICKER_PAGE_SIZE', 8))
+
+# Списки пользователей и организаций у администратора: сколько строк курсор забирает за раз
+# и сколько строк показывать максимум (0 — без ограничения)
+LIST_CURSOR_PREFETCH = int(os.getenv('LIST_CURSOR_PREFETCH', 200))
+LIST_MAX_ROWS = int(os.getenv('LIST_MAX_ROWS', 1000))
+
+# memory | postgres | redis
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'postgres')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 24 * 60 * 60))
+FSM_CACHE_TTL = float(os.getenv('FSM_CACHE_TTL', 300))
+FSM_CACHE_MAX_SIZE = int(os.getenv('FSM_CACHE_MAX_SIZE', 10000))
+FSM_CLEANUP_INTERVAL = float(os.getenv('FSM_CLEANUP_INTERVAL', 60 * 60))
+
+# polling | webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8080))
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv('WEBHOOK_SHUTDOWN_TIMEOUT', 30))
+
+# Число процессов-обработчиков. При WORKERS > 1 ведущий процесс принимает апдейты
+# и распределяет их по воркерам по chat_id
+WORKERS = int(os.getenv('WORKERS', 1))
+CLUSTER_POLLING_TIMEOUT = int(os.getenv('CLUSTER_POLLING_TIMEOUT', 30))
+CLUSTER_SHUTDOWN_TIMEOUT = float(os.getenv('CLUSTER_SHUTDOWN_TIMEOUT', 30))
+
+# Как часто пересчитывать снимок статистики для администратора, с
+STATS_REFRESH_INTERVAL = float(os.getenv('STATS_REFRESH_INTERVAL', 60))
+
+# На сколько месяцев вперед заранее создавать секции истории статусов задач
+TASK_EVENTS_PARTITIONS_AHEAD = int(os.getenv('TASK_EVENTS_PARTITIONS_AHEAD', 2))
+
+# Окна аналитики менеджера в днях, первое — окно по умолчанию
+ANALYTICS_WINDOWS = [int(days) for days in os.getenv('ANALYTICS_WINDOWS', '30,7,90').split(',')]
+
+# Логирование: text | json. Записи копятся в ограниченной очереди и пишутся на диск фоновым потоком;
+# при переполнении drop (по умолчанию) — отбрасывать новые записи. block — ждать до LOG_QUEUE_BLOCK_TIMEOUT секунд,
+# но только в потоках без event loop: для процесса бота это почти то же, что drop, и нужно лишь для отладки
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_QUEUE_POLICY = os.getenv('LOG_QUEUE_POLICY', 'drop')
+LOG_QUEUE_BLOCK_TIMEOUT = float(os.getenv('LOG_QUEUE_BLOCK_TIMEOUT', 1))
+
+# Аудит действий пользователей: события копятся в памяти и пишутся в БД пачкой через COPY
+AUDIT_FLUSH_SIZE = int(os.getenv('AUDIT_FLUSH_SIZE', 500))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 5))
+AUDIT_BUFFER_LIMIT = int(os.getenv('AUDIT_BUFFER_LIMIT', 100000))
+
+# Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics, 0 — отключить.
+# В многопроцессном режиме воркер N отдает свои метрики на порту METRICS_PORT + 1 + N
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
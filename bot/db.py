@@ -1,20 +1,51 @@
 import asyncpg
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
-from models import create_tables
+from dataclasses import dataclass
+from config import (DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+                    DB_POOL_MAX_QUERIES, DB_POOL_MAX_INACTIVE_LIFETIME, DB_COMMAND_TIMEOUT,
+                    DB_STATEMENT_CACHE_SIZE, DB_STATEMENT_CACHE_LIFETIME)
+from metrics import (InstrumentedPool, register_pool_gauges, pool_acquire_duration, pool_acquire_timeouts,
+                     query_duration, query_errors)
+from migrations import apply_migrations
 import logging
 
 app_logger = logging.getLogger('app')
 
+@dataclass(frozen=True)
+class PoolStats:
+    size: int
+    idle: int
+    min_size: int
+    max_size: int
+    acquires: int
+    acquire_seconds: float
+    acquire_timeouts: int
+    queries: int
+    query_seconds: float
+    query_errors: int
+    statement_cache_size: int
+
 async def create_db_pool():
     try:
         pool = await asyncpg.create_pool(
             user=DB_USER,
             password=DB_PASSWORD,
             host=DB_HOST,
-            database=DB_NAME
+            database=DB_NAME,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_queries=DB_POOL_MAX_QUERIES,
+            max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+            # 0 — без ограничения времени выполнения запроса
+            command_timeout=DB_COMMAND_TIMEOUT or None,
+            # Кэш подготовленных выражений на каждом соединении; 0 — отключить (нужно за PgBouncer
+            # в режиме transaction pooling)
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=DB_STATEMENT_CACHE_LIFETIME
         )
-        app_logger.info("Пул подключений к базе данных создан успешно")
-        return pool
+        app_logger.info(f"Пул подключений к базе данных создан успешно "
+                        f"({DB_POOL_MIN_SIZE}–{DB_POOL_MAX_SIZE} соединений)")
+        register_pool_gauges(pool)
+        return InstrumentedPool(pool)
     except Exception as e:
         app_logger.error(f"Ошибка при создании пула подключений к базе данных: {e}")
         raise
@@ -22,8 +53,16 @@ async def create_db_pool():
 async def init_db(pool):
     try:
         async with pool.acquire() as conn:
-            await create_tables(conn)
+            await apply_migrations(conn)
         app_logger.info("База данных инициализирована успешно")
     except Exception as e:
         app_logger.error(f"Ошибка при инициализации базы данных: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def get_pool_stats(pool) -> PoolStats:
+    # Счетчики ведутся в памяти процесса: в многопроцессном режиме это данные одного воркера
+    acquires, acquire_seconds = pool_acquire_duration.totals()
+    queries, query_seconds = query_duration.totals()
+    return PoolStats(pool.get_size(), pool.get_idle_size(), pool.get_min_size(), pool.get_max_size(),
+                     acquires, acquire_seconds, int(pool_acquire_timeouts.total()),
+                     queries, query_seconds, int(query_errors.total()), DB_STATEMENT_CACHE_SIZE)
\ No newline at end of file
@@ -0,0 +1,14 @@
+from typing import Optional
+
+from aiogram.filters import Filter
+from aiogram.types import TelegramObject
+
+from cache import UserProfile
+
+
+class RoleFilter(Filter):
+    def __init__(self, *roles: str):
+        self.roles = frozenset(roles)
+
+    async def __call__(self, event: TelegramObject, user: Optional[UserProfile] = None) -> bool:
+        return user is not None and user.role in self.roles
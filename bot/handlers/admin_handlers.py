@@ -1,56 +1,95 @@
-from aiogram import Router, F, Bot
+from aiogram import F, Bot
 from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 import asyncpg
+import html
 import logging
+from datetime import datetime, timedelta
 
 from keyboards import (get_main_menu_keyboard, get_confirm_delete_org_keyboard, 
-                     get_confirm_assign_manager_keyboard, get_keyboard_with_back_button, 
+                     get_back_keyboard, 
                      get_users_for_assign_manager_keyboard, get_managers_for_remove_keyboard, 
                      get_organizations_for_assign_manager_keyboard, get_confirm_reset_keyboard)
 from states import AdminStates
-from config import ADMIN_ID
+from config import ADMIN_ID, LIST_MAX_ROWS
 from instructions import MANAGER_INSTRUCTIONS
-from validators import MAX_ORG_NAME_LENGTH, MAX_BROADCAST_MESSAGE_LENGTH
-
-router = Router()
+from validators import MAX_NAME_LENGTH, MAX_ORG_NAME_LENGTH, MAX_BROADCAST_MESSAGE_LENGTH
+from broadcast import text_messages
+from outbox import enqueue_messages
+from cache import UserProfile, invalidate_user, invalidate_users
+from filters import RoleFilter
+from stats import get_statistics
+from task_status import STATUS_EMOJIS, STATUS_COUNT_NAMES
+from audit import fetch_audit_events
+from db import get_pool_stats
+from render import send_rendered, send_chunks, build_chunks
+from repositories import UserRepository, OrganizationRepository, TaskRepository
+from pickers import PickerCursor, fetch_picker_page, normalize_prefix
+from callbacks import (CallbackTableRouter, DeleteOrganization, CancelDeleteOrganization, AssignManagerUser,
+                       AssignManagerOrganization, RemoveManager, ConfirmReset, CancelReset)
+
+router = CallbackTableRouter()
+router.callback_query.filter(RoleFilter('admin'))
 
 app_logger = logging.getLogger('app')
 user_logger = logging.getLogger('user_actions')
 
-async def is_admin(user_id: int, pool: asyncpg.Pool) -> bool:
-    async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT role FROM users WHERE user_id = $1', user_id)
-        return user and user['role'] == 'admin'
+def is_admin(user: UserProfile) -> bool:
+    return user is not None and user.role == 'admin'
+
+def render_organization_row(org) -> str:
+    return f"- ID: {org.org_id}, Название: {html.escape(org.name)}\n"
+
+# ФИО и названия организаций ограничены валидаторами, более длинная строка поиска ничего не найдет
+MAX_SEARCH_LENGTH = max(MAX_NAME_LENGTH, MAX_ORG_NAME_LENGTH)
+
+PICKER_SEARCH_HINT = "<i>Чтобы найти по началу имени, отправьте его сообщением.</i>"
+
+def search_text(command: CommandObject = None) -> str:
+    return (command.args or '').strip()[:MAX_SEARCH_LENGTH] if command else ''
+
+async def send_truncation_hint(message: Message, shown: int, command: str):
+    # Курсор остановился на LIST_MAX_ROWS: остальное не выводим, а предлагаем сузить поиск
+    if LIST_MAX_ROWS and shown >= LIST_MAX_ROWS:
+        await message.answer(f"Показаны первые {shown} записей. Уточните поиск: /{command} часть имени или ID")
+
+def render_user_row(user) -> str:
+    org_name = html.escape(user.organization_name) if user.organization_name else "Нет организации"
+    return (f"---------------------------\n"
+            f"<b>ID:</b> {user.user_id}\n"
+            f"<b>ФИО:</b> {html.escape(user.full_name)}\n"
+            f"<b>Роль:</b> {user.role}\n"
+            f"<b>Организация:</b> {org_name}\n"
+            f"---------------------------\n")
 
 @router.message(F.text == "Просмотр организаций")
-async def view_organizations(message: Message, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+@router.message(Command("orgs"))
+async def view_organizations(message: Message, pool: asyncpg.Pool, user: UserProfile, command: CommandObject = None):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть организации без прав администратора")
         return
 
+    search = search_text(command)
     async with pool.acquire() as conn:
-        organizations = await conn.fetch('SELECT * FROM organizations')
-        if organizations:
-            response = "Список организаций:\n"
-            for org in organizations:
-                response += f"- ID: {org['org_id']}, Название: {org['name']}\n"
-            await message.answer(response)
-            user_logger.info(f"Администратор {message.from_user.id} просмотрел список организаций")
-        else:
-            await message.answer("Организаций пока нет.")
-            user_logger.info(f"Администратор {message.from_user.id} просмотрел список организаций (пусто)")
+        shown = await send_rendered(message.answer, OrganizationRepository(conn).stream(search, LIST_MAX_ROWS or None),
+                                    render_organization_row,
+                                    header=f"Организации по запросу «{html.escape(search)}»:\n" if search else "Список организаций:\n",
+                                    empty_text="Ничего не найдено." if search else "Организаций пока нет.")
+    await send_truncation_hint(message, shown, "orgs")
+    user_logger.info(f"Администратор {message.from_user.id} просмотрел список организаций ({shown}){f': {search}' if search else ''}")
 
 @router.message(F.text == "Создать организацию")
-async def create_organization_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def create_organization_prompt(message: Message, state: FSMContext, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался создать организацию без прав администратора")
         return
 
     await message.answer("Введите название новой организации:",
-                         reply_markup=get_keyboard_with_back_button([]))
+                         reply_markup=get_back_keyboard())
     await state.set_state(AdminStates.waiting_for_org_name_to_create)
     user_logger.info(f"Администратор {message.from_user.id} начал создание организации")
 
@@ -63,7 +102,7 @@ async def process_create_organization(message: Message, state: FSMContext, pool:
         return
     async with pool.acquire() as conn:
         try:
-            await conn.execute('INSERT INTO organizations (name) VALUES ($1)', org_name)
+            await OrganizationRepository(conn).insert(org_name)
             await message.answer(f"Организация '{org_name}' успешно создана.",
                                  reply_markup=get_main_menu_keyboard('admin'))
             user_logger.info(f"Администратор {admin_id} создал организацию: {org_name}")
@@ -78,24 +117,24 @@ async def process_create_organization(message: Message, state: FSMContext, pool:
 
 
 @router.message(F.text == "Удалить организацию")
-async def delete_organization_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def delete_organization_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался удалить организацию без прав администратора")
         return
 
     async with pool.acquire() as conn:
-        organizations = await conn.fetch('SELECT org_id, name FROM organizations')
-        if organizations:
-            response = "Выберите организацию для удаления (введите ID):\n"
-            for org in organizations:
-                response += f"- ID: {org['org_id']}, Название: {org['name']}\n"
-            await message.answer(response, reply_markup=get_keyboard_with_back_button([]))
-            await state.set_state(AdminStates.waiting_for_org_name_to_delete)
-            user_logger.info(f"Администратор {message.from_user.id} начал удаление организации")
-        else:
-            await message.answer("Организаций для удаления нет.", reply_markup=get_main_menu_keyboard('admin'))
-            user_logger.info(f"Администратор {message.from_user.id} попытался удалить организацию (нет организаций)")
+        shown = await send_rendered(message.answer, OrganizationRepository(conn).stream(limit=LIST_MAX_ROWS or None),
+                                    render_organization_row,
+                                    header="Выберите организацию для удаления (введите ID):\n",
+                                    reply_markup=get_back_keyboard())
+    if shown:
+        await send_truncation_hint(message, shown, "orgs")
+        await state.set_state(AdminStates.waiting_for_org_name_to_delete)
+        user_logger.info(f"Администратор {message.from_user.id} начал удаление организации")
+    else:
+        await message.answer("Организаций для удаления нет.", reply_markup=get_main_menu_keyboard('admin'))
+        user_logger.info(f"Администратор {message.from_user.id} попытался удалить организацию (нет организаций)")
 
 @router.message(AdminStates.waiting_for_org_name_to_delete)
 async def process_delete_organization(message: Message, state: FSMContext, pool: asyncpg.Pool):
@@ -108,40 +147,35 @@ async def process_delete_organization(message: Message, state: FSMContext, pool:
         return
 
     async with pool.acquire() as conn:
-        org = await conn.fetchrow('SELECT name FROM organizations WHERE org_id = $1', org_id)
+        org = await OrganizationRepository(conn).get(org_id)
         if org:
-            await message.answer(f"Вы уверены, что хотите удалить организацию '{org['name']}'?",
+            await message.answer(f"Вы уверены, что хотите удалить организацию '{org.name}'?",
                                  reply_markup=get_confirm_delete_org_keyboard(org_id))
             await state.clear()
-            user_logger.info(f"Администратор {message.from_user.id} подтверждает удаление организации {org_id} ({org['name']})")
+            user_logger.info(f"Администратор {message.from_user.id} подтверждает удаление организации {org_id} ({org.name})")
         else:
             await message.answer("Организация с таким ID не найдена. Пожалуйста, введите корректный ID.",
-                                 reply_markup=get_keyboard_with_back_button([]))
+                                 reply_markup=get_back_keyboard())
             app_logger.warning(f"Организация с ID {org_id} не найдена при удалении")
 
 
-@router.callback_query(F.data.startswith("confirm_delete_org_"))
-async def confirm_delete_organization(callback_query: CallbackQuery, pool: asyncpg.Pool):
-    org_id = int(callback_query.data.split('_')[3])
+@router.callback_query(DeleteOrganization.filter())
+async def confirm_delete_organization(callback_query: CallbackQuery, callback_data: DeleteOrganization, pool: asyncpg.Pool):
+    org_id = callback_data.org_id
     admin_id = callback_query.from_user.id
     async with pool.acquire() as conn:
         async with conn.transaction():
-            await conn.execute('''
-                UPDATE users
-                SET role = 'user', organization_id = NULL
-                WHERE organization_id = $1 AND role IN ('employee', 'manager')
-            ''', org_id)
-
-            org_name = await conn.fetchval('SELECT name FROM organizations WHERE org_id = $1', org_id)
-            await conn.execute('DELETE FROM organizations WHERE org_id = $1', org_id)
+            reset_user_ids = await UserRepository(conn).reset_organization(org_id)
+            org = await OrganizationRepository(conn).delete(org_id)
+        invalidate_users(reset_user_ids)
 
         await callback_query.message.edit_text(f"Организация с ID {org_id} успешно удалена. Роли сотрудников и менеджеров сброшены.",
                                              reply_markup=None)
         await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
-        user_logger.info(f"Администратор {admin_id} удалил организацию {org_id} ({org_name})")
+        user_logger.info(f"Администратор {admin_id} удалил организацию {org_id} ({org.name if org else '—'})")
     await callback_query.answer()
 
-@router.callback_query(F.data == "cancel_delete_org")
+@router.callback_query(CancelDeleteOrganization.filter())
 async def cancel_delete_organization(callback_query: CallbackQuery):
     await callback_query.message.edit_text("Удаление организации отменено.", reply_markup=None)
     await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
@@ -150,55 +184,55 @@ async def cancel_delete_organization(callback_query: CallbackQuery):
 
 
 @router.message(F.text == "Назначить менеджера")
-async def assign_manager_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def assign_manager_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался назначить менеджера без прав администратора")
         return
 
-    async with pool.acquire() as conn:
-        users = await conn.fetch('SELECT user_id, full_name, role FROM users WHERE role = $1', 'user')
-        if users:
-            await message.answer("Выберите пользователя, которого хотите назначить менеджером:",
-                                 reply_markup=get_users_for_assign_manager_keyboard(users))
-            await state.set_state(AdminStates.waiting_for_manager_id)
-            user_logger.info(f"Администратор {message.from_user.id} начал назначение менеджера")
-        else:
-            await message.answer("Нет доступных пользователей для назначения менеджером.",
-                                 reply_markup=get_main_menu_keyboard('admin'))
-            user_logger.info(f"Администратор {message.from_user.id} попытался назначить менеджера (нет пользователей)")
-
-@router.callback_query(F.data.startswith("select_user_assign_manager_"))
-async def select_user_to_assign_manager(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
-    user_id = int(callback_query.data.split('_')[4])
+    page = await fetch_picker_page(pool, 'am')
+    if page.rows:
+        await message.answer(f"Выберите пользователя, которого хотите назначить менеджером:\n{PICKER_SEARCH_HINT}",
+                             reply_markup=get_users_for_assign_manager_keyboard(page))
+        await state.set_state(AdminStates.waiting_for_manager_id)
+        user_logger.info(f"Администратор {message.from_user.id} начал назначение менеджера")
+    else:
+        await message.answer("Нет доступных пользователей для назначения менеджером.",
+                             reply_markup=get_main_menu_keyboard('admin'))
+        user_logger.info(f"Администратор {message.from_user.id} попытался назначить менеджера (нет пользователей)")
+
+@router.callback_query(AssignManagerUser.filter())
+async def select_user_to_assign_manager(callback_query: CallbackQuery, callback_data: AssignManagerUser, state: FSMContext, pool: asyncpg.Pool):
+    user_id = callback_data.user_id
     await callback_query.message.edit_reply_markup(reply_markup=None)
 
     async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT full_name, role FROM users WHERE user_id = $1', user_id)
-        if user:
-            await state.update_data(manager_user_id=user_id)
-            organizations = await conn.fetch('SELECT org_id, name FROM organizations')
-            if organizations:
-                response = f"Пользователь '<b>{user['full_name']}</b>' (Текущая роль: {user['role']}) выбран. " \
-                           f"Теперь выберите организацию, в которую назначить его менеджером:"
-                await callback_query.message.answer(response, reply_markup=get_organizations_for_assign_manager_keyboard(organizations), parse_mode='HTML')
-                user_logger.info(f"Администратор {callback_query.from_user.id} выбрал пользователя {user_id} для назначения менеджером")
-            else:
-                await callback_query.message.answer("Нет доступных организаций для назначения менеджера.",
-                                                     reply_markup=get_main_menu_keyboard('admin'))
-                await state.clear()
-                user_logger.info(f"Администратор {callback_query.from_user.id} не смог назначить менеджера (нет организаций)")
+        user = await UserRepository(conn).get(user_id)
+    if user:
+        await state.update_data(manager_user_id=user_id)
+        organizations = await fetch_picker_page(pool, 'ao')
+        if organizations.rows:
+            response = f"Пользователь '<b>{user.full_name}</b>' (Текущая роль: {user.role}) выбран. " \
+                       f"Теперь выберите организацию, в которую назначить его менеджером:\n{PICKER_SEARCH_HINT}"
+            await callback_query.message.answer(response, reply_markup=get_organizations_for_assign_manager_keyboard(organizations), parse_mode='HTML')
+            await state.set_state(AdminStates.waiting_for_manager_org_id)
+            user_logger.info(f"Администратор {callback_query.from_user.id} выбрал пользователя {user_id} для назначения менеджером")
         else:
-            await callback_query.message.answer("Пользователь с таким User ID не найден. Пожалуйста, выберите корректного пользователя.",
+            await callback_query.message.answer("Нет доступных организаций для назначения менеджера.",
                                                  reply_markup=get_main_menu_keyboard('admin'))
             await state.clear()
-            app_logger.warning(f"Пользователь {user_id} не найден при назначении менеджера")
+            user_logger.info(f"Администратор {callback_query.from_user.id} не смог назначить менеджера (нет организаций)")
+    else:
+        await callback_query.message.answer("Пользователь с таким User ID не найден. Пожалуйста, выберите корректного пользователя.",
+                                             reply_markup=get_main_menu_keyboard('admin'))
+        await state.clear()
+        app_logger.warning(f"Пользователь {user_id} не найден при назначении менеджера")
     await callback_query.answer()
 
-@router.callback_query(F.data.startswith("select_org_assign_manager_"))
-async def process_assign_manager_by_button(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
+@router.callback_query(AssignManagerOrganization.filter())
+async def process_assign_manager_by_button(callback_query: CallbackQuery, callback_data: AssignManagerOrganization, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
     await callback_query.answer()
-    org_id = int(callback_query.data.split('_')[4])
+    org_id = callback_data.org_id
     admin_id = callback_query.from_user.id
 
     data = await state.get_data()
@@ -212,16 +246,16 @@ async def process_assign_manager_by_button(callback_query: CallbackQuery, state:
         return
 
     async with pool.acquire() as conn:
-        org = await conn.fetchrow('SELECT name FROM organizations WHERE org_id = $1', org_id)
+        org = await OrganizationRepository(conn).get(org_id)
         if org:
-            await conn.execute('UPDATE users SET role = $1, organization_id = $2 WHERE user_id = $3',
-                               'manager', org_id, manager_user_id)
+            await UserRepository(conn).set_role(manager_user_id, 'manager', org_id)
+            invalidate_user(manager_user_id)
             await callback_query.message.edit_text(f"Пользователь с ID {manager_user_id} назначен менеджером "
-                                                 f"в организации '<b>{org['name']}</b>'.",
+                                                 f"в организации '<b>{org.name}</b>'.",
                                                  reply_markup=None, parse_mode='HTML')
             await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
             await state.clear()
-            user_logger.info(f"Администратор {admin_id} назначил пользователя {manager_user_id} менеджером организации {org_id} ({org['name']})")
+            user_logger.info(f"Администратор {admin_id} назначил пользователя {manager_user_id} менеджером организации {org_id} ({org.name})")
 
             try:
                 await bot.send_message(manager_user_id, MANAGER_INSTRUCTIONS, parse_mode='HTML')
@@ -237,169 +271,108 @@ async def process_assign_manager_by_button(callback_query: CallbackQuery, state:
             app_logger.warning(f"Организация {org_id} не найдена при назначении менеджера")
 
 @router.message(F.text == "Статистика")
-async def view_statistics(message: Message, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def view_statistics(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался посмотреть статистику без прав администратора")
         return
 
-    async with pool.acquire() as conn:
-        total_users = await conn.fetchval('SELECT COUNT(*) FROM users')
-        total_organizations = await conn.fetchval('SELECT COUNT(*) FROM organizations')
-        total_tasks = await conn.fetchval('SELECT COUNT(*) FROM tasks')
-        
-        total_managers = await conn.fetchval('SELECT COUNT(*) FROM users WHERE role = $1', 'manager')
-        total_employees = await conn.fetchval('SELECT COUNT(*) FROM users WHERE role = $1', 'employee')
-
-        tasks_by_status = await conn.fetch('SELECT status, COUNT(*) FROM tasks GROUP BY status')
-
-        tasks_per_organization = await conn.fetch('''
-            SELECT o.name, COUNT(t.task_id) as task_count
-            FROM organizations o
-            LEFT JOIN tasks t ON o.org_id = t.organization_id
-            GROUP BY o.name
-            ORDER BY o.name
-        ''')
-
-        tasks_by_manager = await conn.fetch('''
-            SELECT u.full_name, COUNT(t.task_id) as assigned_tasks_count
-            FROM users u
-            LEFT JOIN tasks t ON u.user_id = t.manager_id
-            WHERE u.role = 'manager'
-            GROUP BY u.full_name
-            ORDER BY u.full_name
-        ''')
-
-        tasks_completed_by_employee = await conn.fetch('''
-            SELECT u.full_name, COUNT(t.task_id) as completed_tasks_count
-            FROM users u
-            LEFT JOIN tasks t ON u.user_id = t.employee_id
-            WHERE u.role = 'employee' AND t.status = 'completed'
-            GROUP BY u.full_name
-            ORDER BY u.full_name
-        ''')
-
-        status_emojis = {
-            'new': '🆕',
-            'accepted': '✅',
-            'completed': '🎉',
-            'rejected': '❌'
-        }
-
-        status_display_map = {
-            'new': 'Новых',
-            'accepted': 'Принятых',
-            'completed': 'Выполненных',
-            'rejected': 'Отказанных'
-        }
-
-        stats_text = (
-            f"<b>📊 Общая статистика:</b>\n"
-            f"👥 Всего пользователей: {total_users}\n"
-            f"🏢 Всего организаций: {total_organizations}\n"
-            f"📝 Всего задач: {total_tasks}\n"
-            f"\n<b>Статистика задач по статусам:</b>\n"
-        )
-
-        for status_record in tasks_by_status:
-            status_key = status_record['status']
-            count = status_record['count']
-            display_status = status_display_map.get(status_key, status_key.capitalize())
-            emoji = status_emojis.get(status_key, '')
-            stats_text += f"{emoji} {display_status}: {count}\n"
-
-        stats_text += f"\n<b>Роли пользователей:</b>\n"
-        stats_text += f"🧑‍💻 Всего менеджеров: {total_managers}\n"
-        stats_text += f"👨‍🏭 Всего сотрудников: {total_employees}\n"
-
-        if tasks_per_organization:
-            stats_text += f"\n<b>Задачи по организациям:</b>\n"
-            for org_record in tasks_per_organization:
-                stats_text += f"🏢 {org_record['name']}: {org_record['task_count']} задач\n"
-        else:
-            stats_text += "\nНет задач по организациям.\n"
-
-        if tasks_by_manager:
-            stats_text += f"\n<b>Задачи, назначенные менеджерами:</b>\n"
-            for manager_record in tasks_by_manager:
-                stats_text += f"👤 {manager_record['full_name']}: {manager_record['assigned_tasks_count']} задач\n"
-        else:
-            stats_text += "\nНет назначенных задач менеджерами.\n"
-
-        if tasks_completed_by_employee:
-            stats_text += f"\n<b>Задачи, выполненные сотрудниками:</b>\n"
-            for employee_record in tasks_completed_by_employee:
-                stats_text += f"✅ {employee_record['full_name']}: {employee_record['completed_tasks_count']} задач\n"
-        else:
-            stats_text += "\nНет выполненных задач сотрудниками.\n"
-
-        await message.answer(stats_text, parse_mode='HTML')
-        user_logger.info(f"Администратор {message.from_user.id} просмотрел статистику")
+    stats = await get_statistics(pool)
+
+    blocks = [
+        f"<b>📊 Общая статистика:</b>\n"
+        f"👥 Всего пользователей: {stats.total_users}\n"
+        f"🏢 Всего организаций: {stats.total_organizations}\n"
+        f"📝 Всего задач: {stats.total_tasks}\n"
+        f"\n<b>Статистика задач по статусам:</b>\n"
+    ]
+
+    for status_key, count in stats.tasks_by_status:
+        display_status = STATUS_COUNT_NAMES.get(status_key, status_key.capitalize())
+        emoji = STATUS_EMOJIS.get(status_key, '')
+        blocks.append(f"{emoji} {display_status}: {count}\n")
+
+    blocks.append(f"\n<b>Роли пользователей:</b>\n"
+                  f"🧑‍💻 Всего менеджеров: {stats.total_managers}\n"
+                  f"👨‍🏭 Всего сотрудников: {stats.total_employees}\n")
+
+    if stats.tasks_per_organization:
+        blocks.append(f"\n<b>Задачи по организациям:</b>\n")
+        for org_name, task_count in stats.tasks_per_organization:
+            blocks.append(f"🏢 {html.escape(org_name)}: {task_count} задач\n")
+    else:
+        blocks.append("\nНет задач по организациям.\n")
+
+    if stats.tasks_by_manager:
+        blocks.append(f"\n<b>Задачи, назначенные менеджерами:</b>\n")
+        for manager_name, task_count in stats.tasks_by_manager:
+            blocks.append(f"👤 {html.escape(manager_name)}: {task_count} задач\n")
+    else:
+        blocks.append("\nНет назначенных задач менеджерами.\n")
+
+    if stats.tasks_completed_by_employee:
+        blocks.append(f"\n<b>Задачи, выполненные сотрудниками:</b>\n")
+        for employee_name, task_count in stats.tasks_completed_by_employee:
+            blocks.append(f"✅ {html.escape(employee_name)}: {task_count} задач\n")
+    else:
+        blocks.append("\nНет выполненных задач сотрудниками.\n")
+
+    blocks.append(f"\n<i>Данные на {stats.refreshed_at:%d.%m.%Y %H:%M:%S}</i>")
+    await send_chunks(message.answer, build_chunks(blocks), parse_mode='HTML')
+    user_logger.info(f"Администратор {message.from_user.id} просмотрел статистику")
 
 @router.message(F.text == "Просмотр пользователей")
-async def view_all_users(message: Message, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+@router.message(Command("users"))
+async def view_all_users(message: Message, pool: asyncpg.Pool, user: UserProfile, command: CommandObject = None):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть пользователей без прав администратора")
         return
 
     admin_user_id = message.from_user.id
+    search = search_text(command)
+    # Строки идут из курсора прямо в отправку: в памяти одновременно одна пачка курсора и одно сообщение
     async with pool.acquire() as conn:
-        users = await conn.fetch('''
-            SELECT u.user_id, u.full_name, u.role, o.name as organization_name
-            FROM users u
-            LEFT JOIN organizations o ON u.organization_id = o.org_id
-            WHERE u.user_id != $1
-            ORDER BY u.full_name
-        ''', admin_user_id)
-
-        if users:
-            response = "Список пользователей (кроме вас):\n"
-            for user in users:
-                org_name = user['organization_name'] if user['organization_name'] else "Нет организации"
-                response += (f"---------------------------\n"
-                             f"<b>ID:</b> {user['user_id']}\n"
-                             f"<b>ФИО:</b> {user['full_name']}\n"
-                             f"<b>Роль:</b> {user['role']}\n"
-                             f"<b>Организация:</b> {org_name}\n"
-                             f"---------------------------\n")
-            await message.answer(response)
-            user_logger.info(f"Администратор {admin_user_id} просмотрел список пользователей")
-        else:
-            await message.answer("Нет других пользователей для отображения.")
-            user_logger.info(f"Администратор {admin_user_id} просмотрел список пользователей (пусто)")
+        users = UserRepository(conn).stream_all_except(admin_user_id, search, LIST_MAX_ROWS or None)
+        shown = await send_rendered(message.answer, users, render_user_row,
+                                    header=(f"Пользователи по запросу «{html.escape(search)}»:\n" if search
+                                            else "Список пользователей (кроме вас). Поиск: /users часть имени или ID\n"),
+                                    empty_text="Ничего не найдено." if search else "Нет других пользователей для отображения.")
+    await send_truncation_hint(message, shown, "users")
+    user_logger.info(f"Администратор {admin_user_id} просмотрел список пользователей ({shown}){f': {search}' if search else ''}")
 
 @router.message(F.text == "Удалить менеджера")
-async def remove_manager_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def remove_manager_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался удалить менеджера без прав администратора")
         return
 
-    async with pool.acquire() as conn:
-        managers = await conn.fetch('SELECT user_id, full_name, organization_id FROM users WHERE role = $1', 'manager')
-        if managers:
-            await message.answer("Выберите менеджера, которого хотите удалить:",
-                                 reply_markup=get_managers_for_remove_keyboard(managers))
-            await state.set_state(AdminStates.waiting_for_manager_id_to_remove)
-            user_logger.info(f"Администратор {message.from_user.id} начал удаление менеджера")
-        else:
-            await message.answer("Нет менеджеров для удаления.", reply_markup=get_main_menu_keyboard('admin'))
-            user_logger.info(f"Администратор {message.from_user.id} попытался удалить менеджера (нет менеджеров)")
-
-@router.callback_query(F.data.startswith("select_manager_remove_"))
-async def select_manager_to_remove(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
-    user_id = int(callback_query.data.split('_')[3])
+    page = await fetch_picker_page(pool, 'rm')
+    if page.rows:
+        await message.answer(f"Выберите менеджера, которого хотите удалить:\n{PICKER_SEARCH_HINT}",
+                             reply_markup=get_managers_for_remove_keyboard(page))
+        await state.set_state(AdminStates.waiting_for_manager_id_to_remove)
+        user_logger.info(f"Администратор {message.from_user.id} начал удаление менеджера")
+    else:
+        await message.answer("Нет менеджеров для удаления.", reply_markup=get_main_menu_keyboard('admin'))
+        user_logger.info(f"Администратор {message.from_user.id} попытался удалить менеджера (нет менеджеров)")
+
+@router.callback_query(RemoveManager.filter())
+async def select_manager_to_remove(callback_query: CallbackQuery, callback_data: RemoveManager, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
+    user_id = callback_data.user_id
     await callback_query.message.edit_reply_markup(reply_markup=None)
 
     async with pool.acquire() as conn:
-        manager = await conn.fetchrow('SELECT full_name FROM users WHERE user_id = $1 AND role = $2', user_id, 'manager')
+        users = UserRepository(conn)
+        manager = await users.get_with_role(user_id, 'manager')
         if manager:
-            await conn.execute('UPDATE users SET role = $1, organization_id = NULL WHERE user_id = $2', 'user', user_id)
-            await callback_query.message.answer(f"Пользователь '<b>{manager['full_name']}</b>' (ID: {user_id}) успешно удален из роли менеджера и стал обычным пользователем.",
+            await users.set_role(user_id, 'user')
+            invalidate_user(user_id)
+            await callback_query.message.answer(f"Пользователь '<b>{manager.full_name}</b>' (ID: {user_id}) успешно удален из роли менеджера и стал обычным пользователем.",
                                                  reply_markup=get_main_menu_keyboard('admin'), parse_mode='HTML')
             await state.clear()
-            user_logger.info(f"Администратор {callback_query.from_user.id} удалил менеджера {user_id} ({manager['full_name']})")
+            user_logger.info(f"Администратор {callback_query.from_user.id} удалил менеджера {user_id} ({manager.full_name})")
             
             try:
                 await bot.send_message(user_id, f"<b>Уведомление:</b> Ваша роль была изменена на <b>Пользователь</b>. Вы больше не являетесь менеджером.", parse_mode='HTML')
@@ -415,8 +388,8 @@ async def select_manager_to_remove(callback_query: CallbackQuery, state: FSMCont
     await callback_query.answer()
 
 @router.message(F.text == "Сбросить все данные")
-async def reset_all_users_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def reset_all_users_prompt(message: Message, state: FSMContext, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
     
@@ -428,26 +401,21 @@ async def reset_all_users_prompt(message: Message, state: FSMContext, pool: asyn
     )
     await state.set_state(AdminStates.waiting_for_reset_confirmation)
 
-@router.callback_query(F.data == "confirm_reset", AdminStates.waiting_for_reset_confirmation)
+@router.callback_query(ConfirmReset.filter(), AdminStates.waiting_for_reset_confirmation)
 async def confirm_reset_all_users(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
     admin_id = callback_query.from_user.id
     
     async with pool.acquire() as conn:
         async with conn.transaction():
-            users_to_reset = await conn.fetch("SELECT user_id FROM users WHERE role != 'admin'")
-            
-            for user in users_to_reset:
-                user_id = user['user_id']
-                try:
-                    await bot.send_message(user_id, "Ваш аккаунт был сброшен администратором. "
-                                                    "Для продолжения использования бота, пожалуйста, "
-                                                    "нажмите на кнопку /start. 👈")
-                except Exception as e:
-                    app_logger.warning(f"Не удалось отправить сообщение о сбросе пользователю {user_id}: {e}")
-
-            await conn.execute("DELETE FROM tasks")
-            await conn.execute("DELETE FROM users WHERE role != 'admin'")
-            await conn.execute("DELETE FROM organizations")
+            await TaskRepository(conn).delete_all()
+            reset_user_ids = await UserRepository(conn).delete_all_except_admins()
+            await OrganizationRepository(conn).delete_all()
+            await enqueue_messages(conn, text_messages(reset_user_ids,
+                                                       "Ваш аккаунт был сброшен администратором. "
+                                                       "Для продолжения использования бота, пожалуйста, "
+                                                       "нажмите на кнопку /start. 👈"),
+                                   'reset', created_by=admin_id)
+    invalidate_users(reset_user_ids)
 
     await callback_query.message.edit_text("Все пользователи были сброшены.", reply_markup=None)
     await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
@@ -455,7 +423,7 @@ async def confirm_reset_all_users(callback_query: CallbackQuery, state: FSMConte
     await state.clear()
     await callback_query.answer()
 
-@router.callback_query(F.data == "cancel_reset", AdminStates.waiting_for_reset_confirmation)
+@router.callback_query(CancelReset.filter(), AdminStates.waiting_for_reset_confirmation)
 async def cancel_reset_all_users(callback_query: CallbackQuery, state: FSMContext):
     await callback_query.message.edit_text("Сброс пользователей отменен.", reply_markup=None)
     await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
@@ -463,13 +431,13 @@ async def cancel_reset_all_users(callback_query: CallbackQuery, state: FSMContex
     await callback_query.answer()
 
 @router.message(F.text == "Отправить всем сообщение")
-async def broadcast_message_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_admin(message.from_user.id, pool):
+async def broadcast_message_prompt(message: Message, state: FSMContext, user: UserProfile):
+    if not is_admin(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         return
     
     await message.answer("Введите сообщение, которое хотите отправить всем пользователям:",
-                         reply_markup=get_keyboard_with_back_button([]))
+                         reply_markup=get_back_keyboard())
     await state.set_state(AdminStates.waiting_for_broadcast_message)
 
 @router.message(AdminStates.waiting_for_broadcast_message)
@@ -481,24 +449,117 @@ async def process_broadcast_message(message: Message, state: FSMContext, pool: a
     admin_id = message.from_user.id
 
     async with pool.acquire() as conn:
-        users = await conn.fetch("SELECT user_id FROM users WHERE user_id != $1", admin_id)
-    
-    sent_count = 0
-    failed_count = 0
-    
-    for user in users:
-        try:
-            await bot.send_message(user['user_id'], broadcast_text)
-            sent_count += 1
-        except Exception as e:
-            failed_count += 1
-            app_logger.error(f"Не удалось отправить сообщение пользователю {user['user_id']}: {e}")
+        recipient_ids = await UserRepository(conn).ids_except(admin_id)
+
+    # Это сообщение воркеры очереди обновляют ходом рассылки и заменяют итоговым отчетом
+    progress_message = await message.answer(f"Рассылка поставлена в очередь.\n"
+                                            f"Обработано: 0 из {len(recipient_ids)}")
+    async with pool.acquire() as conn:
+        await enqueue_messages(conn, text_messages(recipient_ids, broadcast_text),
+                               'broadcast', created_by=admin_id, progress_message_id=progress_message.message_id)
+
+    await message.answer("Главное меню:", reply_markup=get_main_menu_keyboard('admin'))
+    user_logger.info(f"Администратор {admin_id} поставил в очередь сообщение '{broadcast_text}' для {len(recipient_ids)} пользователей.")
+    await state.clear()
+
+AUDIT_USAGE = ("Использование: /audit [user=ID] [action=имя_обработчика] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД]\n"
+               "Даты можно указывать со временем: 2025-01-31T18:00")
+
+def parse_audit_filters(args: str) -> dict:
+    filters = {}
+    for part in (args or '').split():
+        key, _, value = part.partition('=')
+        if key == 'user':
+            filters['user_id'] = int(value)
+        elif key == 'action':
+            filters['action'] = value
+        elif key == 'from':
+            filters['since'] = datetime.fromisoformat(value)
+        elif key == 'to':
+            # Дата без времени включает весь день
+            filters['until'] = datetime.fromisoformat(value) + (timedelta(days=1) if len(value) == 10 else timedelta())
+        else:
+            raise ValueError(part)
+    return filters
+
+@router.message(Command("audit"))
+async def view_audit_events(message: Message, command: CommandObject, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть журнал аудита без прав администратора")
+        return
 
+    try:
+        filters = parse_audit_filters(command.args)
+    except ValueError:
+        await message.answer(html.escape(AUDIT_USAGE))
+        return
+
+    events = await fetch_audit_events(pool, **filters)
+    if not events:
+        await message.answer("Событий по заданным условиям не найдено.")
+    else:
+        # Текст событий пишут сами пользователи, поэтому экранируется, а длинный журнал делится на сообщения
+        blocks = ["<b>Журнал аудита</b> (последние события):\n"]
+        blocks.extend(f"\n{event['created_at']:%d.%m.%Y %H:%M:%S} · {event['user_id'] or '—'} · "
+                      f"<code>{html.escape(event['action'] or '—')}</code>\n{html.escape(event['details'] or '')}\n"
+                      for event in events)
+        await send_chunks(message.answer, build_chunks(blocks), parse_mode='HTML')
+    user_logger.info(f"Администратор {message.from_user.id} просмотрел журнал аудита: {command.args or 'без фильтров'}")
+
+def _average_ms(total_seconds: float, count: int) -> str:
+    return f"{total_seconds / count * 1000:.1f} мс" if count else "—"
+
+@router.message(Command("pool"))
+async def view_pool_stats(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    if not is_admin(user):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть состояние пула без прав администратора")
+        return
+
+    stats = get_pool_stats(pool)
     await message.answer(
-        f"Рассылка завершена.\n"
-        f"Успешно отправлено: {sent_count}\n"
-        f"Не удалось отправить: {failed_count}",
-        reply_markup=get_main_menu_keyboard('admin')
-    )
-    user_logger.info(f"Администратор {admin_id} отправил сообщение '{broadcast_text}' {sent_count} пользователям.")
-    await state.clear()
\ No newline at end of file
+        f"<b>Пул соединений с БД</b>\n"
+        f"Открыто соединений: {stats.size} (свободно: {stats.idle}, занято: {stats.size - stats.idle})\n"
+        f"Лимиты пула: {stats.min_size}–{stats.max_size}\n"
+        f"Выдано соединений: {stats.acquires}, среднее ожидание: {_average_ms(stats.acquire_seconds, stats.acquires)}\n"
+        f"Таймаутов ожидания: {stats.acquire_timeouts}\n"
+        f"Запросов: {stats.queries}, среднее время: {_average_ms(stats.query_seconds, stats.queries)}\n"
+        f"Ошибок запросов: {stats.query_errors}\n"
+        f"Кэш подготовленных выражений: {stats.statement_cache_size or 'отключен'}",
+        parse_mode='HTML')
+    user_logger.info(f"Администратор {message.from_user.id} просмотрел состояние пула соединений")
+
+# Клавиатуры выбора администратора и состояния, в которых текстовое сообщение — поиск по началу имени
+ADMIN_PICKER_KEYBOARDS = {
+    'am': get_users_for_assign_manager_keyboard,
+    'ao': get_organizations_for_assign_manager_keyboard,
+    'rm': get_managers_for_remove_keyboard,
+}
+ADMIN_PICKER_STATES = {
+    AdminStates.waiting_for_manager_id.state: 'am',
+    AdminStates.waiting_for_manager_org_id.state: 'ao',
+    AdminStates.waiting_for_manager_id_to_remove.state: 'rm',
+}
+
+@router.callback_query(PickerCursor.filter())
+async def turn_picker_page(callback_query: CallbackQuery, callback_data: PickerCursor, pool: asyncpg.Pool):
+    keyboard = ADMIN_PICKER_KEYBOARDS.get(callback_data.picker)
+    if keyboard:
+        page = await fetch_picker_page(pool, callback_data.picker, cursor=callback_data)
+        try:
+            await callback_query.message.edit_reply_markup(reply_markup=keyboard(page))
+        except TelegramBadRequest as e:
+            app_logger.warning(f"Не удалось перелистать список администратора {callback_query.from_user.id}: {e}")
+    await callback_query.answer()
+
+# Регистрируется последним, чтобы кнопки главного меню работали и во время выбора
+@router.message(StateFilter(*ADMIN_PICKER_STATES), F.text)
+async def search_picker(message: Message, state: FSMContext, pool: asyncpg.Pool):
+    picker = ADMIN_PICKER_STATES[await state.get_state()]
+    prefix = normalize_prefix(message.text)
+    page = await fetch_picker_page(pool, picker, prefix=prefix)
+    found = "Выберите из найденного:" if page.rows else "Ничего не найдено, попробуйте другое начало имени."
+    await message.answer(f"Поиск «{html.escape(prefix or '')}». {found}",
+                         reply_markup=ADMIN_PICKER_KEYBOARDS[picker](page))
+    user_logger.info(f"Администратор {message.from_user.id} искал в списке выбора {picker}: {prefix}")
@@ -1,173 +1,121 @@
-from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram import F, Bot
+from aiogram.types import Message, CallbackQuery
+from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 import asyncpg
+import html
 import logging
 
-from keyboards import get_main_menu_keyboard, get_confirm_assign_employee_keyboard, get_keyboard_with_back_button, get_users_for_assign_employee_keyboard, get_employees_for_remove_keyboard, get_employees_for_assign_task_keyboard
+from keyboards import get_main_menu_keyboard, get_back_keyboard, get_users_for_assign_employee_keyboard, get_employees_for_remove_keyboard, get_employees_for_assign_task_keyboard, get_tasks_page_keyboard, get_analytics_windows_keyboard, get_task_notification_keyboard
 from states import ManagerStates
-from config import ADMIN_ID
+from config import ADMIN_ID, ANALYTICS_WINDOWS
 from instructions import EMPLOYEE_INSTRUCTIONS
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 from validators import MAX_TASK_TITLE_LENGTH, MAX_TASK_DESC_LENGTH
-
-router = Router()
+from cache import UserProfile, invalidate_user
+from filters import RoleFilter
+from pagination import TaskPageCursor, fetch_task_page, page_cursors
+from task_status import STATUS_EMOJIS, STATUS_NAMES
+from metrics import telegram_errors
+from analytics import ManagerAnalytics, fetch_manager_analytics, format_duration
+from repositories import UserRepository, TaskRepository
+from models import User, NewTask, TaskView
+from render import build_chunks, send_chunks, edit_chunks, send_rendered
+from broadcast import OutgoingMessage
+from outbox import enqueue_messages
+from pickers import PickerCursor, PickerPage, fetch_picker_page, normalize_prefix
+from callbacks import (CallbackTableRouter, AssignEmployee, RemoveEmployee, ToggleTaskEmployee, ToggleAllTaskEmployees,
+                       ConfirmTaskEmployees, AnalyticsWindow)
+
+router = CallbackTableRouter()
+router.callback_query.filter(RoleFilter('manager'))
 
 app_logger = logging.getLogger('app')
 user_logger = logging.getLogger('user_actions')
 
-status_emojis = {
-    'new': '🆕',
-    'accepted': '✅',
-    'completed': '🎉',
-    'rejected': '❌'
-}
+PICKER_SEARCH_HINT = "<i>Чтобы найти по началу имени, отправьте его сообщением.</i>"
 
-status_display_map = {
-    'new': 'Новая',
-    'accepted': 'Принята',
-    'completed': 'Выполнена',
-    'rejected': 'Отказана'
-}
-
-async def is_manager(user_id: int, pool: asyncpg.Pool) -> bool:
-    async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT role FROM users WHERE user_id = $1', user_id)
-        return user and user['role'] == 'manager'
+def is_manager(user: UserProfile) -> bool:
+    return user is not None and user.role == 'manager'
 
 async def send_task_notification(bot: Bot, user_id: int, message_text: str, reply_markup = None, parse_mode: str = 'HTML'):
     try:
         await bot.send_message(user_id, message_text, reply_markup=reply_markup, parse_mode=parse_mode)
     except TelegramForbiddenError:
+        telegram_errors.inc('task_notification', 'forbidden')
         app_logger.warning(f"Target user {user_id} blocked the bot.")
     except TelegramBadRequest as e:
+        telegram_errors.inc('task_notification', 'bad_request')
         app_logger.error(f"Failed to send message to user {user_id}: {e}")
 
-async def get_manager_tasks_by_status(manager_id: int, pool: asyncpg.Pool, status: str = None):
-    async with pool.acquire() as conn:
-        if status:
-            if status in ['completed', 'rejected']:
-                tasks = await conn.fetch('''
-                    SELECT t.task_id, t.title, t.description, t.status, u.full_name as employee_name, u2.full_name as manager_name
-                    FROM tasks t
-                    JOIN users u ON t.employee_id = u.user_id
-                    JOIN users u2 ON t.manager_id = u2.user_id
-                    WHERE t.manager_id = $1 AND t.status = $2
-                    ORDER BY t.created_at DESC
-                    LIMIT 20
-                ''', manager_id, status)
-            else:
-                tasks = await conn.fetch('''
-                    SELECT t.task_id, t.title, t.description, t.status, u.full_name as employee_name, u2.full_name as manager_name
-                    FROM tasks t
-                    JOIN users u ON t.employee_id = u.user_id
-                    JOIN users u2 ON t.manager_id = u2.user_id
-                    WHERE t.manager_id = $1 AND t.status = $2
-                    ORDER BY t.created_at DESC
-                ''', manager_id, status)
-        else:
-            tasks = await conn.fetch('''
-                SELECT t.task_id, t.title, t.description, t.status, u.full_name as employee_name, u2.full_name as manager_name
-                FROM tasks t
-                JOIN users u ON t.employee_id = u.user_id
-                JOIN users u2 ON t.manager_id = u2.user_id
-                WHERE t.manager_id = $1
-                ORDER BY t.created_at DESC
-            ''', manager_id)
-        return tasks
-
-async def format_manager_tasks_response(tasks, status_filter: str = None):
-    if tasks:
-        response = "Задачи вашей организации:\n"
-        for task in tasks:
-            display_status = status_display_map.get(task['status'], task['status'])
-            emoji = status_emojis.get(task['status'], '')
-            response += (f"---------------------------\n"
-                         f"ID: {task['task_id']}\n"
-                         f"Название: {task['title']}\n"
-                         f"Описание: {task['description']}\n"
-                         f"Статус: {emoji} {display_status}\n"
-                         f"Сотрудник: {task['employee_name']}\n")
-        
-        if status_filter in ['completed', 'rejected']:
-            response += "\n<b>(Отображены только 20 последних задач)</b>"
-    else:
-        response = "У вашей организации пока нет задач."
-    return response
 
+def render_employee_row(employee: User) -> str:
+    return f"- ID: {employee.user_id}, ФИО: {html.escape(employee.full_name)}\n"
 
 @router.message(F.text == "Просмотр сотрудников")
-async def view_employees(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
+async def view_employees(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    if not is_manager(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть сотрудников без прав менеджера")
         return
 
     user_id = message.from_user.id
+    if not user.organization_id:
+        await message.answer("Вы не привязаны ни к одной организации как менеджер.")
+        app_logger.warning(f"Менеджер {user_id} не привязан к организации при попытке просмотреть сотрудников")
+        return
+
     async with pool.acquire() as conn:
-        manager_org = await conn.fetchrow('SELECT organization_id FROM users WHERE user_id = $1', user_id)
-        if not manager_org or not manager_org['organization_id']:
-            await message.answer("Вы не привязаны ни к одной организации как менеджер.")
-            app_logger.warning(f"Менеджер {user_id} не привязан к организации при попытке просмотреть сотрудников")
-            return
-
-        employees = await conn.fetch('SELECT user_id, full_name, role FROM users WHERE organization_id = $1 AND role = $2',
-                                     manager_org['organization_id'], 'employee')
-        if employees:
-            response = "Список сотрудников вашей организации:\n"
-            for emp in employees:
-                response += f"- ID: {emp['user_id']}, ФИО: {emp['full_name']}\n"
-            await message.answer(response)
-            user_logger.info(f"Менеджер {user_id} просмотрел список сотрудников")
-        else:
-            await message.answer("В вашей организации пока нет сотрудников.")
-            user_logger.info(f"Менеджер {user_id} просмотрел список сотрудников (пусто)")
+        employees = await UserRepository(conn).organization_members(user.organization_id, 'employee')
+    shown = await send_rendered(message.answer, employees, render_employee_row,
+                                header="Список сотрудников вашей организации:\n",
+                                empty_text="В вашей организации пока нет сотрудников.")
+    user_logger.info(f"Менеджер {user_id} просмотрел список сотрудников ({shown})")
 
 @router.message(F.text == "Назначить сотрудника")
-async def assign_employee_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
+async def assign_employee_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_manager(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался назначить сотрудника без прав менеджера")
         return
 
     user_id = message.from_user.id
-    async with pool.acquire() as conn:
-        manager_org = await conn.fetchrow('SELECT organization_id FROM users WHERE user_id = $1', user_id)
-        if not manager_org or not manager_org['organization_id']:
-            await message.answer("Вы не привязаны ни к одной организации как менеджер.")
-            app_logger.warning(f"Менеджер {user_id} не привязан к организации при попытке назначить сотрудника")
-            return
-
-        users = await conn.fetch('SELECT user_id, full_name, role FROM users WHERE role = $1 AND organization_id IS NULL', 'user')
-        if users:
-            await message.answer("Выберите пользователя, которого хотите назначить сотрудником:",
-                                 reply_markup=get_users_for_assign_employee_keyboard(users))
-            await state.set_state(ManagerStates.waiting_for_employee_id)
-            user_logger.info(f"Менеджер {user_id} начал назначение сотрудника")
-        else:
-            await message.answer("Нет доступных пользователей для назначения сотрудником.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            user_logger.info(f"Менеджер {user_id} попытался назначить сотрудника (нет пользователей)")
+    if not user.organization_id:
+        await message.answer("Вы не привязаны ни к одной организации как менеджер.")
+        app_logger.warning(f"Менеджер {user_id} не привязан к организации при попытке назначить сотрудника")
+        return
+
+    page = await fetch_picker_page(pool, 'ae')
+    if page.rows:
+        await message.answer(f"Выберите пользователя, которого хотите назначить сотрудником:\n{PICKER_SEARCH_HINT}",
+                             reply_markup=get_users_for_assign_employee_keyboard(page))
+        await state.set_state(ManagerStates.waiting_for_employee_id)
+        user_logger.info(f"Менеджер {user_id} начал назначение сотрудника")
+    else:
+        await message.answer("Нет доступных пользователей для назначения сотрудником.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        user_logger.info(f"Менеджер {user_id} попытался назначить сотрудника (нет пользователей)")
 
-@router.callback_query(F.data.startswith("select_user_assign_employee_"))
-async def select_user_to_assign_employee(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
-    user_id = int(callback_query.data.split('_')[4])
+@router.callback_query(AssignEmployee.filter())
+async def select_user_to_assign_employee(callback_query: CallbackQuery, callback_data: AssignEmployee, state: FSMContext, pool: asyncpg.Pool, bot: Bot, user: UserProfile):
+    user_id = callback_data.user_id
     await callback_query.message.edit_reply_markup(reply_markup=None)
+    manager_org = user.organization_id
 
     async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT full_name, role FROM users WHERE user_id = $1', user_id)
+        users = UserRepository(conn)
+        user = await users.get(user_id)
         if user:
             manager_id = callback_query.from_user.id
-            manager_org = await conn.fetchval('SELECT organization_id FROM users WHERE user_id = $1', manager_id)
 
             if manager_org:
-                await conn.execute('UPDATE users SET role = $1, organization_id = $2 WHERE user_id = $3',
-                                   'employee', manager_org, user_id)
-                await callback_query.message.answer(f"Пользователь '<b>{user['full_name']}</b>' назначен сотрудником "
+                await users.set_role(user_id, 'employee', manager_org)
+                invalidate_user(user_id)
+                await callback_query.message.answer(f"Пользователь '<b>{user.full_name}</b>' назначен сотрудником "
                                                      f"в вашей организации.",
                                                      reply_markup=get_main_menu_keyboard('manager'), parse_mode='HTML')
                 await state.clear()
-                user_logger.info(f"Менеджер {manager_id} назначил пользователя {user_id} ({user['full_name']}) сотрудником")
+                user_logger.info(f"Менеджер {manager_id} назначил пользователя {user_id} ({user.full_name}) сотрудником")
 
                 try:
                     await bot.send_message(user_id, EMPLOYEE_INSTRUCTIONS, parse_mode='HTML')
@@ -191,47 +139,45 @@ async def select_user_to_assign_employee(callback_query: CallbackQuery, state: F
 
 
 @router.message(F.text == "Удалить сотрудника")
-async def remove_employee_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
+async def remove_employee_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_manager(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался удалить сотрудника без прав менеджера")
         return
 
     manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        manager_org_id = await conn.fetchval('SELECT organization_id FROM users WHERE user_id = $1', manager_id)
-        if not manager_org_id:
-            await message.answer("Вы не привязаны ни к одной организации. Невозможно удалить сотрудника.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            app_logger.warning(f"Менеджер {manager_id} не привязан к организации при попытке удалить сотрудника")
-            return
-
-        employees = await conn.fetch('SELECT user_id, full_name FROM users WHERE organization_id = $1 AND role = $2',
-                                     manager_org_id, 'employee')
-        if employees:
-            await message.answer("Выберите сотрудника, которого хотите удалить:",
-                                 reply_markup=get_employees_for_remove_keyboard(employees))
-            await state.set_state(ManagerStates.waiting_for_employee_id_to_remove)
-            user_logger.info(f"Менеджер {manager_id} начал удаление сотрудника")
-        else:
-            await message.answer("В вашей организации нет сотрудников для удаления.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            user_logger.info(f"Менеджер {manager_id} попытался удалить сотрудника (нет сотрудников)")
+    if not user.organization_id:
+        await message.answer("Вы не привязаны ни к одной организации. Невозможно удалить сотрудника.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        app_logger.warning(f"Менеджер {manager_id} не привязан к организации при попытке удалить сотрудника")
+        return
+
+    page = await fetch_picker_page(pool, 're', scope=user.organization_id)
+    if page.rows:
+        await message.answer(f"Выберите сотрудника, которого хотите удалить:\n{PICKER_SEARCH_HINT}",
+                             reply_markup=get_employees_for_remove_keyboard(page))
+        await state.set_state(ManagerStates.waiting_for_employee_id_to_remove)
+        user_logger.info(f"Менеджер {manager_id} начал удаление сотрудника")
+    else:
+        await message.answer("В вашей организации нет сотрудников для удаления.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        user_logger.info(f"Менеджер {manager_id} попытался удалить сотрудника (нет сотрудников)")
 
-@router.callback_query(F.data.startswith("select_employee_remove_"))
-async def select_employee_to_remove(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
-    user_id = int(callback_query.data.split('_')[3])
+@router.callback_query(RemoveEmployee.filter())
+async def select_employee_to_remove(callback_query: CallbackQuery, callback_data: RemoveEmployee, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
+    user_id = callback_data.user_id
     await callback_query.message.edit_reply_markup(reply_markup=None)
 
     async with pool.acquire() as conn:
-        employee = await conn.fetchrow('SELECT full_name FROM users WHERE user_id = $1 AND role = $2', user_id, 'employee')
+        users = UserRepository(conn)
+        employee = await users.get_with_role(user_id, 'employee')
         if employee:
-            await conn.execute('UPDATE users SET role = $1, organization_id = NULL WHERE user_id = $2',
-                               'user', user_id)
-            await callback_query.message.answer(f"Сотрудник '<b>{employee['full_name']}</b>' успешно удален из вашей организации и стал обычным пользователем.",
+            await users.set_role(user_id, 'user')
+            invalidate_user(user_id)
+            await callback_query.message.answer(f"Сотрудник '<b>{employee.full_name}</b>' успешно удален из вашей организации и стал обычным пользователем.",
                                                  reply_markup=get_main_menu_keyboard('manager'), parse_mode='HTML')
             await state.clear()
-            user_logger.info(f"Менеджер {callback_query.from_user.id} удалил сотрудника {user_id} ({employee['full_name']})")
+            user_logger.info(f"Менеджер {callback_query.from_user.id} удалил сотрудника {user_id} ({employee.full_name})")
 
             try:
                 await bot.send_message(user_id, f"<b>Уведомление:</b> Ваша роль была изменена на <b>Пользователь</b>. Вы больше не являетесь сотрудником.", parse_mode='HTML')
@@ -250,51 +196,106 @@ async def select_employee_to_remove(callback_query: CallbackQuery, state: FSMCon
 
 
 @router.message(F.text == "Назначить задачу")
-async def assign_task_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
+async def assign_task_prompt(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    if not is_manager(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
         app_logger.warning(f"Пользователь {message.from_user.id} попытался назначить задачу без прав менеджера")
         return
 
     manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        manager_org_id = await conn.fetchval('SELECT organization_id FROM users WHERE user_id = $1', manager_id)
-        if not manager_org_id:
-            await message.answer("Вы не привязаны ни к одной организации. Невозможно назначить задачу.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            app_logger.warning(f"Менеджер {manager_id} не привязан к организации при попытке назначить задачу")
-            return
-
-        employees = await conn.fetch('SELECT user_id, full_name FROM users WHERE organization_id = $1 AND role = $2',
-                                     manager_org_id, 'employee')
-        if employees:
-            await message.answer("Выберите сотрудника, которому хотите назначить задачу:",
-                                 reply_markup=get_employees_for_assign_task_keyboard(employees))
-            await state.set_state(ManagerStates.waiting_for_employee_id_to_assign_task)
-            user_logger.info(f"Менеджер {manager_id} начал назначение задачи")
-        else:
-            await message.answer("В вашей организации нет сотрудников, которым можно назначить задачу.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            user_logger.info(f"Менеджер {manager_id} попытался назначить задачу (нет сотрудников)")
+    if not user.organization_id:
+        await message.answer("Вы не привязаны ни к одной организации. Невозможно назначить задачу.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        app_logger.warning(f"Менеджер {manager_id} не привязан к организации при попытке назначить задачу")
+        return
 
-@router.callback_query(F.data.startswith("select_employee_assign_task_"))
-async def select_employee_to_assign_task(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
-    employee_id = int(callback_query.data.split('_')[4])
-    await callback_query.message.edit_reply_markup(reply_markup=None)
+    page = await fetch_picker_page(pool, 'at', scope=user.organization_id)
+    if page.rows:
+        await state.update_data(task_page=_remember_task_page(page), assigned_employee_ids=[], task_candidate_count=None)
+        await message.answer(f"Выберите сотрудников, которым хотите назначить задачу, и нажмите «Далее»:\n{PICKER_SEARCH_HINT}",
+                             reply_markup=get_employees_for_assign_task_keyboard(page))
+        await state.set_state(ManagerStates.waiting_for_employee_id_to_assign_task)
+        user_logger.info(f"Менеджер {manager_id} начал назначение задачи")
+    else:
+        await message.answer("В вашей организации нет сотрудников, которым можно назначить задачу.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        user_logger.info(f"Менеджер {manager_id} попытался назначить задачу (нет сотрудников)")
+
+# Текущая страница выбора хранится в FSM, чтобы перерисовывать отметки при каждом нажатии без запросов к users
+def _remember_task_page(page: PickerPage) -> dict:
+    return {'rows': [[employee.user_id, employee.full_name] for employee in page.rows],
+            'prefix': page.prefix, 'has_prev': page.has_prev, 'has_next': page.has_next}
+
+def _restore_task_page(data: dict) -> PickerPage:
+    saved = data.get('task_page') or {}
+    return PickerPage('at', [User(user_id, full_name) for user_id, full_name in saved.get('rows', [])],
+                      saved.get('prefix'), saved.get('has_prev', False), saved.get('has_next', False))
+
+def _task_employees_keyboard(page: PickerPage, data: dict):
+    selected = data.get('assigned_employee_ids', [])
+    # Число всех сотрудников известно после "Выбрать всех" — до этого отмечены заведомо не все
+    candidate_count = data.get('task_candidate_count')
+    all_selected = candidate_count is not None and len(selected) >= candidate_count
+    return get_employees_for_assign_task_keyboard(page, set(selected), all_selected)
+
+async def _update_task_employees_selection(callback_query: CallbackQuery, state: FSMContext, data: dict):
+    await state.update_data(assigned_employee_ids=data['assigned_employee_ids'],
+                            task_candidate_count=data.get('task_candidate_count'))
+    try:
+        await callback_query.message.edit_reply_markup(
+            reply_markup=_task_employees_keyboard(_restore_task_page(data), data))
+    except TelegramBadRequest as e:
+        app_logger.warning(f"Не удалось обновить выбор сотрудников менеджера {callback_query.from_user.id}: {e}")
+    await callback_query.answer()
 
-    async with pool.acquire() as conn:
-        employee = await conn.fetchrow('SELECT full_name FROM users WHERE user_id = $1 AND role = $2', employee_id, 'employee')
-        if employee:
-            await state.update_data(assigned_employee_id=employee_id)
-            await callback_query.message.answer(f"Сотрудник '<b>{employee['full_name']}</b>' выбран. Теперь введите название задачи:",
-                                                 reply_markup=get_keyboard_with_back_button([]), parse_mode='HTML')
-            await state.set_state(ManagerStates.waiting_for_task_title)
-            user_logger.info(f"Менеджер {callback_query.from_user.id} выбрал сотрудника {employee_id} для назначения задачи")
-        else:
-            await callback_query.message.answer("Сотрудник с таким User ID не является сотрудником или не найден. Пожалуйста, выберите корректного сотрудника.",
-                                                 reply_markup=get_main_menu_keyboard('manager'))
-            await state.clear()
-            app_logger.warning(f"Сотрудник {employee_id} не найден при назначении задачи")
+@router.callback_query(ToggleTaskEmployee.filter(), ManagerStates.waiting_for_employee_id_to_assign_task)
+async def select_employee_to_assign_task(callback_query: CallbackQuery, callback_data: ToggleTaskEmployee, state: FSMContext):
+    employee_id = callback_data.user_id
+    data = await state.get_data()
+    selected = data.setdefault('assigned_employee_ids', [])
+
+    if employee_id in selected:
+        selected.remove(employee_id)
+    elif any(user_id == employee_id for user_id, _ in data.get('task_page', {}).get('rows', [])):
+        selected.append(employee_id)
+    await _update_task_employees_selection(callback_query, state, data)
+
+@router.callback_query(ToggleAllTaskEmployees.filter(), ManagerStates.waiting_for_employee_id_to_assign_task)
+async def select_all_employees_to_assign_task(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    data = await state.get_data()
+    selected = data.get('assigned_employee_ids', [])
+    candidate_count = data.get('task_candidate_count')
+    if candidate_count is not None and len(selected) >= candidate_count:
+        data['assigned_employee_ids'] = []
+    else:
+        # Выбираются все сотрудники организации, а не только видимые на странице
+        async with pool.acquire() as conn:
+            employee_ids = await UserRepository(conn).organization_member_ids(user.organization_id, 'employee')
+        data['assigned_employee_ids'] = employee_ids
+        data['task_candidate_count'] = len(employee_ids)
+    await _update_task_employees_selection(callback_query, state, data)
+
+@router.callback_query(ConfirmTaskEmployees.filter(), ManagerStates.waiting_for_employee_id_to_assign_task)
+async def confirm_employees_to_assign_task(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    data = await state.get_data()
+    selected = data.get('assigned_employee_ids', [])
+    if not selected:
+        await callback_query.answer("Выберите хотя бы одного сотрудника.", show_alert=True)
+        return
+
+    await callback_query.message.edit_reply_markup(reply_markup=None)
+    if len(selected) == 1:
+        names = dict(data.get('task_page', {}).get('rows', []))
+        if selected[0] not in names:
+            async with pool.acquire() as conn:
+                employee = await UserRepository(conn).get(selected[0])
+            names[selected[0]] = employee.full_name if employee else selected[0]
+        text = f"Сотрудник '<b>{html.escape(str(names[selected[0]]))}</b>' выбран. Теперь введите название задачи:"
+    else:
+        text = f"Выбрано сотрудников: <b>{len(selected)}</b>. Теперь введите название задачи:"
+    await callback_query.message.answer(text, reply_markup=get_back_keyboard(), parse_mode='HTML')
+    await state.set_state(ManagerStates.waiting_for_task_title)
+    user_logger.info(f"Менеджер {callback_query.from_user.id} выбрал сотрудников {selected} для назначения задачи")
     await callback_query.answer()
 
 @router.message(ManagerStates.waiting_for_task_title)
@@ -305,158 +306,247 @@ async def process_task_title(message: Message, state: FSMContext):
         return
     await state.update_data(task_title=task_title)
     await message.answer("Теперь введите описание задачи:",
-                         reply_markup=get_keyboard_with_back_button([]))
+                         reply_markup=get_back_keyboard())
     user_logger.info(f"Менеджер {message.from_user.id} ввел название задачи: {task_title}")
     await state.set_state(ManagerStates.waiting_for_task_description)
 
 @router.message(ManagerStates.waiting_for_task_description)
-async def process_task_description(message: Message, state: FSMContext, pool: asyncpg.Pool, bot: Bot):
+async def process_task_description(message: Message, state: FSMContext, pool: asyncpg.Pool, bot: Bot, user: UserProfile):
     task_description = message.text
     if len(task_description) > MAX_TASK_DESC_LENGTH:
         await message.answer(f"Описание задачи слишком длинное. Пожалуйста, используйте описание не длиннее {MAX_TASK_DESC_LENGTH} символов.")
         return
     data = await state.get_data()
-    assigned_employee_id = data.get('assigned_employee_id')
+    assigned_employee_ids = data.get('assigned_employee_ids')
     task_title = data.get('task_title')
     manager_id = message.from_user.id
 
-    if not all([assigned_employee_id, task_title, task_description]):
+    if not all([assigned_employee_ids, task_title, task_description]):
         await message.answer("Ошибка: Не удалось получить все данные для создания задачи. Попробуйте снова.",
                              reply_markup=get_main_menu_keyboard('manager'))
         await state.clear()
         app_logger.error(f"Ошибка при создании задачи менеджером {manager_id}: недостаток данных")
         return
 
-    async with pool.acquire() as conn:
-        manager_org_id = await conn.fetchval('SELECT organization_id FROM users WHERE user_id = $1', manager_id)
-        if not manager_org_id:
-            await message.answer("Ошибка: Вы не привязаны ни к одной организации. Невозможно создать задачу.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            await state.clear()
-            app_logger.error(f"Менеджер {manager_id} не привязан к организации при создании задачи")
-            return
+    manager_org_id = user.organization_id if user else None
+    if not manager_org_id:
+        await message.answer("Ошибка: Вы не привязаны ни к одной организации. Невозможно создать задачу.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        await state.clear()
+        app_logger.error(f"Менеджер {manager_id} не привязан к организации при создании задачи")
+        return
 
-        try:
-            new_task = await conn.fetchrow('''
-                INSERT INTO tasks (title, description, manager_id, employee_id, organization_id, status)
-                VALUES ($1, $2, $3, $4, $5, 'new') RETURNING task_id
-            ''',
-                task_title, task_description, manager_id, assigned_employee_id, manager_org_id
-            )
-            new_task_id = new_task['task_id']
+    # Уведомления уходят через очередь: ошибка разметки сорвала бы доставку всем получателям
+    notification_text = (
+        f"🔔 <b>Новая задача назначена!</b>\n\n"
+        f"<b>Название:</b> {html.escape(task_title)}\n"
+        f"<b>Описание:</b> {html.escape(task_description)}\n"
+        f"<b>Менеджер:</b> {html.escape(message.from_user.full_name)}\n"
+        f"<b>Статус:</b> 🆕 Новая"
+    )
 
-            await message.answer(f"Задача \'{task_title}\' успешно назначена сотруднику.",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            await state.clear()
-            user_logger.info(f"Менеджер {manager_id} создал задачу {new_task_id} для сотрудника {assigned_employee_id}")
-
-            notification_text = (
-                f"🔔 <b>Новая задача назначена!</b>\n\n"
-                f"<b>Название:</b> {task_title}\n"
-                f"<b>Описание:</b> {task_description}\n"
-                f"<b>Менеджер:</b> {message.from_user.full_name}\n"
-                f"<b>Статус:</b> 🆕 Новая"
-            )
-            inline_kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Изменить статус", callback_data=f"change_task_direct_{new_task_id}")]])
-            await send_task_notification(bot, assigned_employee_id, notification_text, reply_markup=inline_kb, parse_mode='HTML')
-            user_logger.info(f"Отправлено уведомление сотруднику {assigned_employee_id} о новой задаче {new_task_id}")
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Пока менеджер вводил задачу, кого-то из выбранных могли перевести в другую организацию
+                employees = [employee for employee in await UserRepository(conn).get_many(assigned_employee_ids)
+                             if employee.role == 'employee' and employee.organization_id == manager_org_id]
+                tasks = await TaskRepository(conn).bulk_insert([
+                    NewTask(task_title, task_description, employee.user_id, manager_id, manager_org_id)
+                    for employee in employees])
+                # Уведомления уходят через очередь сообщений: отправка с общими ограничениями скорости,
+                # при групповом назначении менеджер получит отчет о доставке
+                await enqueue_messages(conn, [
+                    OutgoingMessage(task.employee_id, notification_text, get_task_notification_keyboard(task.task_id), 'HTML')
+                    for task in tasks], 'task_assignment', created_by=manager_id if len(tasks) > 1 else None)
+    except Exception as e:
+        await message.answer(f"Произошла ошибка при создании задачи: {html.escape(str(e))}",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        await state.clear()
+        app_logger.error(f"Ошибка при создании задачи менеджером {manager_id}: {e}")
+        return
 
-        except Exception as e:
-            await message.answer(f"Произошла ошибка при создании задачи: {e}",
-                                 reply_markup=get_main_menu_keyboard('manager'))
-            await state.clear()
-            app_logger.error(f"Ошибка при создании задачи менеджером {manager_id}: {e}")
-
-
-async def format_manager_tasks_response(tasks: list, title: str, status_filter: str = None) -> str:
-    response = f"<b>{title}:</b>\n\n"
-    if tasks:
-        for task in tasks:
-            manager_name = task['manager_name'] if task['manager_name'] else "Неизвестно"
-            employee_name = task['employee_name'] if task['employee_name'] else "Неизвестно"
-            status_emoji = status_emojis.get(task['status'], '')
-            status_display = status_display_map.get(task['status'], task['status'].capitalize())
-            response += (
-                f"---------------------------\n"
-                f"<b>ID Задачи:</b> {task['task_id']}\n"
-                f"<b>Название:</b> {task['title']}\n"
-                f"<b>Описание:</b> {task['description']}\n"
-                f"<b>Менеджер:</b> {manager_name}\n"
-                f"<b>Сотрудник:</b> {employee_name}\n"
-                f"<b>Статус:</b> {status_emoji} {status_display}\n"
-                f"---------------------------\n"
-            )
+    await state.clear()
+    skipped = len(assigned_employee_ids) - len(tasks)
+    if not tasks:
+        await message.answer("Задача не создана: выбранные сотрудники больше не состоят в вашей организации.",
+                             reply_markup=get_main_menu_keyboard('manager'))
+        app_logger.warning(f"Менеджер {manager_id} не смог создать задачу: сотрудники {assigned_employee_ids} недоступны")
+        return
+    if len(tasks) == 1 and not skipped:
+        response = f"Задача \'{html.escape(task_title)}\' успешно назначена сотруднику."
     else:
-        response += "Пока нет задач в этой категории.\n"
-    
-    if status_filter in ['completed', 'rejected']:
-        response += "\n<b>(Отображены только 20 последних задач)</b>"
+        response = f"Задача \'{html.escape(task_title)}\' назначена сотрудникам: {len(tasks)}."
+        if skipped:
+            response += f"\nПропущено (больше не в вашей организации): {skipped}."
+    await message.answer(response, reply_markup=get_main_menu_keyboard('manager'))
+    user_logger.info(f"Менеджер {manager_id} создал задачи {[task.task_id for task in tasks]} "
+                     f"для сотрудников {[task.employee_id for task in tasks]}")
+
+
+manager_task_titles = {
+    None: "Все задачи",
+    'new': "Новые задачи",
+    'accepted': "Принятые задачи",
+    'completed': "Выполненные задачи",
+    'rejected': "Отказанные задачи"
+}
 
-    return response
+def render_manager_task_row(task: TaskView) -> str:
+    manager_name = html.escape(task.manager_name) if task.manager_name else "Неизвестно"
+    employee_name = html.escape(task.employee_name) if task.employee_name else "Неизвестно"
+    status_emoji = STATUS_EMOJIS.get(task.status, '')
+    status_display = STATUS_NAMES.get(task.status, task.status.capitalize())
+    return (
+        f"---------------------------\n"
+        f"<b>ID Задачи:</b> {task.task_id}\n"
+        f"<b>Название:</b> {html.escape(task.title)}\n"
+        f"<b>Описание:</b> {html.escape(task.description or '')}\n"
+        f"<b>Менеджер:</b> {manager_name}\n"
+        f"<b>Сотрудник:</b> {employee_name}\n"
+        f"<b>Статус:</b> {status_emoji} {status_display}\n"
+        f"---------------------------\n"
+    )
+
+def format_manager_tasks_response(tasks: list, title: str) -> list:
+    header = f"<b>{title}:</b>\n\n"
+    if not tasks:
+        return [header + "Пока нет задач в этой категории.\n"]
+    return build_chunks([header] + [render_manager_task_row(task) for task in tasks])
+
+async def render_manager_tasks_page(manager_id: int, pool: asyncpg.Pool, status: str = None, cursor: TaskPageCursor = None):
+    page = await fetch_task_page(pool, 'm', manager_id, status, cursor)
+    prev_cursor, next_cursor = page_cursors(page, 'm', status)
+    chunks = format_manager_tasks_response(page.rows, manager_task_titles[status])
+    return chunks, get_tasks_page_keyboard(prev_cursor, next_cursor)
+
+async def send_manager_tasks(message: Message, pool: asyncpg.Pool, user: UserProfile, status: str = None):
+    if not is_manager(user):
+        await message.answer("У вас нет прав для выполнения этой команды.")
+        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть задачи ({status or 'все'}) без прав менеджера")
+        return
+
+    manager_id = message.from_user.id
+    chunks, keyboard = await render_manager_tasks_page(manager_id, pool, status)
+    await send_chunks(message.answer, chunks, reply_markup=keyboard, parse_mode='HTML')
+    user_logger.info(f"Менеджер {manager_id} просмотрел {manager_task_titles[status].lower()}")
 
 
 @router.message(F.text == "Все задачи")
-async def track_all_tasks_prompt(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
-        await message.answer("У вас нет прав для выполнения этой команды.")
-        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть задачи без прав менеджера")
-        return
-    tasks = await get_manager_tasks_by_status(message.from_user.id, pool)
-    await message.answer(await format_manager_tasks_response(tasks))
-    user_logger.info(f"Менеджер {message.from_user.id} просмотрел все задачи")
+async def track_all_tasks_prompt(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    await send_manager_tasks(message, pool, user)
 
 @router.message(F.text == "Новые задачи")
-async def track_new_tasks_prompt(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
-        await message.answer("У вас нет прав для выполнения этой команды.")
-        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть новые задачи без прав менеджера")
-        return
-
-    manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        tasks = await get_manager_tasks_by_status(manager_id, pool, 'new')
-        response_text = await format_manager_tasks_response(tasks, "Новые задачи", 'new')
-        await message.answer(response_text, parse_mode='HTML')
-        user_logger.info(f"Менеджер {manager_id} просмотрел новые задачи")
+async def track_new_tasks_prompt(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    await send_manager_tasks(message, pool, user, 'new')
 
 @router.message(F.text == "Принятые задачи")
-async def track_accepted_tasks_prompt(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
-        await message.answer("У вас нет прав для выполнения этой команды.")
-        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть принятые задачи без прав менеджера")
-        return
-
-    manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        tasks = await get_manager_tasks_by_status(manager_id, pool, 'accepted')
-        response_text = await format_manager_tasks_response(tasks, "Принятые задачи", 'accepted')
-        await message.answer(response_text, parse_mode='HTML')
-        user_logger.info(f"Менеджер {manager_id} просмотрел принятые задачи")
+async def track_accepted_tasks_prompt(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    await send_manager_tasks(message, pool, user, 'accepted')
 
 @router.message(F.text == "Выполненные задачи")
-async def track_completed_tasks_prompt(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
-        await message.answer("У вас нет прав для выполнения этой команды.")
-        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть выполненные задачи без прав менеджера")
-        return
-
-    manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        tasks = await get_manager_tasks_by_status(manager_id, pool, 'completed')
-        response_text = await format_manager_tasks_response(tasks, "Выполненные задачи", 'completed')
-        await message.answer(response_text, parse_mode='HTML')
-        user_logger.info(f"Менеджер {manager_id} просмотрел выполненные задачи")
+async def track_completed_tasks_prompt(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    await send_manager_tasks(message, pool, user, 'completed')
 
 @router.message(F.text == "Отказанные задачи")
-async def track_rejected_tasks_prompt(message: Message, pool: asyncpg.Pool):
-    if not await is_manager(message.from_user.id, pool):
+async def track_rejected_tasks_prompt(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    await send_manager_tasks(message, pool, user, 'rejected')
+
+@router.callback_query(TaskPageCursor.filter(F.scope == 'm'))
+async def manager_tasks_page(callback_query: CallbackQuery, callback_data: TaskPageCursor, pool: asyncpg.Pool):
+    chunks, keyboard = await render_manager_tasks_page(callback_query.from_user.id, pool, callback_data.status, callback_data)
+    try:
+        await edit_chunks(callback_query.message, chunks, reply_markup=keyboard, parse_mode='HTML')
+    except TelegramBadRequest as e:
+        app_logger.warning(f"Не удалось обновить страницу задач менеджера {callback_query.from_user.id}: {e}")
+    await callback_query.answer()
+
+def format_manager_analytics(analytics: ManagerAnalytics) -> list:
+    header = f"<b>📈 Аналитика за {analytics.days} дн.</b>\n"
+    overall = analytics.overall
+    if not overall or not overall.total:
+        return [header + "\nЗа этот период задач не создавалось."]
+
+    blocks = [header + (
+        f"\nЗадач создано: {overall.total}, выполнено: {overall.completed} "
+        f"({overall.completion_rate:.0%}), отказано: {overall.rejected}\n"
+        f"⏱ Принятие: медиана {format_duration(overall.accept_p50)}, p90 {format_duration(overall.accept_p90)}\n"
+        f"🏁 Выполнение: медиана {format_duration(overall.complete_p50)}, p90 {format_duration(overall.complete_p90)}\n"
+    )]
+    if analytics.employees:
+        blocks.append("\n<b>По сотрудникам:</b>\n")
+        for employee in analytics.employees:
+            name = html.escape(employee.employee_name) if employee.employee_name else f"ID {employee.employee_id}"
+            blocks.append(
+                f"---------------------------\n"
+                f"👤 <b>{name}</b>: {employee.completed}/{employee.total} выполнено ({employee.completion_rate:.0%})\n"
+                f"Принятие: {format_duration(employee.accept_p50)} / p90 {format_duration(employee.accept_p90)}\n"
+                f"Выполнение: {format_duration(employee.complete_p50)} / p90 {format_duration(employee.complete_p90)}\n"
+            )
+    return build_chunks(blocks)
+
+@router.message(F.text == "Аналитика")
+async def view_manager_analytics(message: Message, pool: asyncpg.Pool, user: UserProfile):
+    if not is_manager(user):
         await message.answer("У вас нет прав для выполнения этой команды.")
-        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть отказанные задачи без прав менеджера")
+        app_logger.warning(f"Пользователь {message.from_user.id} попытался просмотреть аналитику без прав менеджера")
+        return
+    days = ANALYTICS_WINDOWS[0]
+    analytics = await fetch_manager_analytics(pool, message.from_user.id, days)
+    # Окна аналитики прикрепляются только к последнему сообщению
+    await send_chunks(message.answer, format_manager_analytics(analytics), parse_mode='HTML',
+                      reply_markup=get_analytics_windows_keyboard(ANALYTICS_WINDOWS, days))
+    user_logger.info(f"Менеджер {message.from_user.id} просмотрел аналитику за {days} дн.")
+
+@router.callback_query(AnalyticsWindow.filter())
+async def switch_analytics_window(callback_query: CallbackQuery, callback_data: AnalyticsWindow, pool: asyncpg.Pool):
+    days = callback_data.days
+    if days not in ANALYTICS_WINDOWS:
+        await callback_query.answer()
         return
+    analytics = await fetch_manager_analytics(pool, callback_query.from_user.id, days)
+    try:
+        await edit_chunks(callback_query.message, format_manager_analytics(analytics), parse_mode='HTML',
+                          reply_markup=get_analytics_windows_keyboard(ANALYTICS_WINDOWS, days))
+    except TelegramBadRequest as e:
+        app_logger.warning(f"Не удалось обновить аналитику менеджера {callback_query.from_user.id}: {e}")
+    await callback_query.answer()
+    user_logger.info(f"Менеджер {callback_query.from_user.id} просмотрел аналитику за {days} дн.")
 
-    manager_id = message.from_user.id
-    async with pool.acquire() as conn:
-        tasks = await get_manager_tasks_by_status(manager_id, pool, 'rejected')
-        response_text = await format_manager_tasks_response(tasks, "Отказанные задачи", 'rejected')
-        await message.answer(response_text, parse_mode='HTML')
-        user_logger.info(f"Менеджер {manager_id} просмотрел отказанные задачи")
\ No newline at end of file
+# Клавиатуры выбора менеджера и состояния, в которых текстовое сообщение — поиск по началу имени
+MANAGER_PICKER_KEYBOARDS = {
+    'ae': get_users_for_assign_employee_keyboard,
+    're': get_employees_for_remove_keyboard,
+}
+MANAGER_PICKER_STATES = {
+    ManagerStates.waiting_for_employee_id.state: 'ae',
+    ManagerStates.waiting_for_employee_id_to_remove.state: 're',
+    ManagerStates.waiting_for_employee_id_to_assign_task.state: 'at',
+}
+
+async def _picker_markup(state: FSMContext, page: PickerPage):
+    if page.picker != 'at':
+        return MANAGER_PICKER_KEYBOARDS[page.picker](page)
+    await state.update_data(task_page=_remember_task_page(page))
+    return _task_employees_keyboard(page, await state.get_data())
+
+@router.callback_query(PickerCursor.filter())
+async def turn_picker_page(callback_query: CallbackQuery, callback_data: PickerCursor, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    # Листать можно только список того шага, на котором менеджер сейчас находится
+    if MANAGER_PICKER_STATES.get(await state.get_state()) == callback_data.picker:
+        page = await fetch_picker_page(pool, callback_data.picker, scope=user.organization_id, cursor=callback_data)
+        try:
+            await callback_query.message.edit_reply_markup(reply_markup=await _picker_markup(state, page))
+        except TelegramBadRequest as e:
+            app_logger.warning(f"Не удалось перелистать список менеджера {callback_query.from_user.id}: {e}")
+    await callback_query.answer()
+
+# Регистрируется последним, чтобы кнопки главного меню работали и во время выбора
+@router.message(StateFilter(*MANAGER_PICKER_STATES), F.text)
+async def search_picker(message: Message, state: FSMContext, pool: asyncpg.Pool, user: UserProfile):
+    picker = MANAGER_PICKER_STATES[await state.get_state()]
+    prefix = normalize_prefix(message.text)
+    page = await fetch_picker_page(pool, picker, scope=user.organization_id, prefix=prefix)
+    found = "Выберите из найденного:" if page.rows else "Ничего не найдено, попробуйте другое начало имени."
+    await message.answer(f"Поиск «{html.escape(prefix or '')}». {found}", reply_markup=await _picker_markup(state, page))
+    user_logger.info(f"Менеджер {message.from_user.id} искал в списке выбора {picker}: {prefix}")
@@ -5,12 +5,17 @@ from aiogram.fsm.context import FSMContext
 import asyncpg
 import logging
 
-from keyboards import get_start_keyboard, get_main_menu_keyboard, get_keyboard_with_back_button
+from keyboards import get_start_keyboard, get_main_menu_keyboard, get_back_keyboard
 from states import RegistrationStates
 from config import ADMIN_ID
 from validators import MAX_NAME_LENGTH
+from cache import UserProfile, invalidate_user
+from repositories import UserRepository
+from callbacks import CallbackTableRouter, CancelAction
 
-router = Router()
+router = CallbackTableRouter()
+# Подключается последним: сюда попадают нажатия, которые не подошли ни одному обработчику
+fallback_router = Router()
 
 app_logger = logging.getLogger('app')
 user_logger = logging.getLogger('user_actions')
@@ -18,31 +23,27 @@ user_logger = logging.getLogger('user_actions')
 
 
 @router.message(F.text == "Назад")
-async def cmd_back(message: Message, state: FSMContext, pool: asyncpg.Pool):
+async def cmd_back(message: Message, state: FSMContext, user: UserProfile):
     current_state = await state.get_state()
     if current_state:
         await state.clear()
     user_id = message.from_user.id
-    async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT role FROM users WHERE user_id = $1', user_id)
-        user_role = user['role'] if user else 'user'
-        await message.answer("Действие отменено. Вы вернулись в главное меню.",
-                             reply_markup=get_main_menu_keyboard(user_role))
-        user_logger.info(f"Пользователь {user_id} нажал 'Назад', текущая роль: {user_role}")
-
-@router.callback_query(F.data == "cancel_action")
-async def cmd_cancel_action(callback_query: CallbackQuery, state: FSMContext, pool: asyncpg.Pool):
+    user_role = user.role if user else 'user'
+    await message.answer("Действие отменено. Вы вернулись в главное меню.",
+                         reply_markup=get_main_menu_keyboard(user_role))
+    user_logger.info(f"Пользователь {user_id} нажал 'Назад', текущая роль: {user_role}")
+
+@router.callback_query(CancelAction.filter())
+async def cmd_cancel_action(callback_query: CallbackQuery, state: FSMContext, user: UserProfile):
     current_state = await state.get_state()
     if current_state:
         await state.clear()
     user_id = callback_query.from_user.id
-    async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT role FROM users WHERE user_id = $1', user_id)
-        user_role = user['role'] if user else 'user'
-        await callback_query.message.edit_text("Действие отменено. Вы вернулись в главное меню.",
-                                               reply_markup=None)
-        await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard(user_role))
-        user_logger.info(f"Пользователь {user_id} отменил действие через callback, текущая роль: {user_role}")
+    user_role = user.role if user else 'user'
+    await callback_query.message.edit_text("Действие отменено. Вы вернулись в главное меню.",
+                                           reply_markup=None)
+    await callback_query.message.answer("Главное меню:", reply_markup=get_main_menu_keyboard(user_role))
+    user_logger.info(f"Пользователь {user_id} отменил действие через callback, текущая роль: {user_role}")
     await callback_query.answer()
 
 @router.message(CommandStart())
@@ -56,11 +57,11 @@ async def cmd_start(message: Message, state: FSMContext, pool: asyncpg.Pool):
         return
 
     async with pool.acquire() as conn:
-        user = await conn.fetchrow('SELECT * FROM users WHERE user_id = $1', user_id)
+        user = await UserRepository(conn).get(user_id)
         if user:
-            await message.answer(f"С возвращением, {user['full_name']}! Ваша роль: {user['role']}.",
-                                 reply_markup=get_main_menu_keyboard(user['role']))
-            user_logger.info(f"Пользователь {user_id} ({user['full_name']}) запустил бота, роль: {user['role']}")
+            await message.answer(f"С возвращением, {user.full_name}! Ваша роль: {user.role}.",
+                                 reply_markup=get_main_menu_keyboard(user.role))
+            user_logger.info(f"Пользователь {user_id} ({user.full_name}) запустил бота, роль: {user.role}")
         else:
             await message.answer("Привет! Я бот для управления задачами. Чтобы начать, пожалуйста, зарегистрируйтесь.",
                                  reply_markup=get_start_keyboard())
@@ -69,7 +70,7 @@ async def cmd_start(message: Message, state: FSMContext, pool: asyncpg.Pool):
 @router.message(F.text == "Зарегистрироваться")
 async def register_user_prompt(message: Message, state: FSMContext):
     await message.answer("Пожалуйста, введите ваше полное ФИО:",
-                         reply_markup=get_keyboard_with_back_button([]))
+                         reply_markup=get_back_keyboard())
     await state.set_state(RegistrationStates.waiting_for_full_name)
     user_logger.info(f"Пользователь {message.from_user.id} начал регистрацию")
 
@@ -83,15 +84,15 @@ async def process_full_name(message: Message, state: FSMContext, pool: asyncpg.P
         return
 
     async with pool.acquire() as conn:
+        users = UserRepository(conn)
         try:
             if user_id == ADMIN_ID:
-                await conn.execute('INSERT INTO users (user_id, full_name, role) VALUES ($1, $2, $3)',
-                                   user_id, full_name, 'admin')
+                await users.insert(user_id, full_name, 'admin')
                 await message.answer(f"Вы зарегистрированы как администратор, {full_name}!",
                                      reply_markup=get_main_menu_keyboard('admin'))
                 user_logger.info(f"Администратор зарегистрирован: user_id={user_id}, full_name={full_name}")
             else:
-                await conn.execute('INSERT INTO users (user_id, full_name) VALUES ($1, $2)', user_id, full_name)
+                await users.insert(user_id, full_name)
                 await message.answer(f"Спасибо, {full_name}! Вы успешно зарегистрированы. Ожидайте назначения роли.",
                                      reply_markup=get_main_menu_keyboard('user'))
                 user_logger.info(f"Пользователь зарегистрирован: user_id={user_id}, full_name={full_name}")
@@ -99,8 +100,16 @@ async def process_full_name(message: Message, state: FSMContext, pool: asyncpg.P
         except asyncpg.exceptions.UniqueViolationError:
             await message.answer("Вы уже зарегистрированы!")
             await state.clear()
-            user = await conn.fetchrow('SELECT * FROM users WHERE user_id = $1', user_id)
+            user = await users.get(user_id)
             if user:
-                await message.answer(f"Ваша текущая роль: {user['role']}.",
-                                     reply_markup=get_main_menu_keyboard(user['role']))
-            app_logger.warning(f"Попытка повторной регистрации: user_id={user_id}")
\ No newline at end of file
+                await message.answer(f"Ваша текущая роль: {user.role}.",
+                                     reply_markup=get_main_menu_keyboard(user.role))
+            app_logger.warning(f"Попытка повторной регистрации: user_id={user_id}")
+    invalidate_user(user_id)
+
+
+@fallback_router.callback_query()
+async def stale_callback(callback_query: CallbackQuery):
+    # Кнопки из старых сообщений (прежний формат callback_data или недоступная роль)
+    await callback_query.answer("Кнопка устарела или больше не действует. Откройте меню заново.", show_alert=True)
+    app_logger.info(f"Устаревшая кнопка от пользователя {callback_query.from_user.id}: {callback_query.data!r}")
@@ -1,9 +1,39 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+from config import KEYBOARD_CACHE_SIZE
+from task_status import STATUS_NAMES, TRANSITIONS
+from pickers import PickerPage, PickerCursor, picker_cursors
+from callbacks import (DeleteOrganization, CancelDeleteOrganization, AssignManagerUser, AssignManagerOrganization,
+                       RemoveManager, ConfirmReset, CancelReset, AssignEmployee, RemoveEmployee, ToggleTaskEmployee,
+                       ToggleAllTaskEmployees, ConfirmTaskEmployees, AnalyticsWindow, SetTaskStatus,
+                       CancelTaskStatusChange, ChangeTaskStatus, CancelAction)
+
+# Реестр постоянных клавиатур (меню по ролям, подтверждения): разметка строится один раз на набор
+# аргументов и отдается всем ответам. Клавиатуры с ID задач, пользователей и т. п. сюда не входят —
+# они почти не повторяются и только вытесняли бы меню из кэша.
+# Разметка общая для всех пользователей: объекты aiogram заморожены, но списки кнопок внутри — нет
+# (pydantic превращает кортежи обратно в списки), поэтому изменять полученную разметку нельзя.
+_memoized_keyboards = []
+
+def memoized_keyboard(build):
+    cached = lru_cache(maxsize=KEYBOARD_CACHE_SIZE)(build)
+    _memoized_keyboards.append(cached)
+    return cached
 
+def keyboard_cache_info() -> dict:
+    return {cached.__name__: cached.cache_info() for cached in _memoized_keyboards}
+
+def clear_keyboard_cache():
+    for cached in _memoized_keyboards:
+        cached.cache_clear()
+
+@memoized_keyboard
 def get_start_keyboard():
     keyboard = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="Зарегистрироваться")]], resize_keyboard=True, one_time_keyboard=True)
     return keyboard
 
+@memoized_keyboard
 def get_main_menu_keyboard(role: str):
     if role == 'admin':
         keyboard_layout = [
@@ -16,7 +46,7 @@ def get_main_menu_keyboard(role: str):
     elif role == 'manager':
         keyboard_layout = [
             [KeyboardButton(text="Назначить сотрудника"), KeyboardButton(text="Удалить сотрудника"), KeyboardButton(text="Просмотр сотрудников")],
-            [KeyboardButton(text="Назначить задачу")],
+            [KeyboardButton(text="Назначить задачу"), KeyboardButton(text="Аналитика")],
             [KeyboardButton(text="Новые задачи"), KeyboardButton(text="Принятые задачи")],
             [KeyboardButton(text="Выполненные задачи"), KeyboardButton(text="Отказанные задачи")]
         ]
@@ -32,87 +62,100 @@ def get_main_menu_keyboard(role: str):
     keyboard = ReplyKeyboardMarkup(keyboard=keyboard_layout, resize_keyboard=True)
     return keyboard
 
-def get_task_status_keyboard(task_id: int, include_back: bool = False) -> InlineKeyboardMarkup:
-    buttons = [
-        [InlineKeyboardButton(text="Принята", callback_data=f"status_accepted_{task_id}")],
-        [InlineKeyboardButton(text="Выполнена", callback_data=f"status_completed_{task_id}")],
-        [InlineKeyboardButton(text="Отказана", callback_data=f"status_rejected_{task_id}")]
-    ]
+def get_task_status_keyboard(task_id: int, current_status: str = 'new', include_back: bool = False) -> InlineKeyboardMarkup:
+    # Кнопки только для переходов, допустимых из текущего статуса
+    buttons = [[InlineKeyboardButton(text=STATUS_NAMES[status], callback_data=SetTaskStatus(status=status, task_id=task_id).pack())]
+               for status in TRANSITIONS[current_status]]
     if include_back:
-        buttons.append([InlineKeyboardButton(text="Назад", callback_data="cancel_task_status_change")])
+        buttons.append([InlineKeyboardButton(text="Назад", callback_data=CancelTaskStatusChange().pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_tasks_page_keyboard(prev_cursor=None, next_cursor=None):
+    row = []
+    if prev_cursor:
+        row.append(InlineKeyboardButton(text="◀️ Предыдущие", callback_data=prev_cursor.pack()))
+    if next_cursor:
+        row.append(InlineKeyboardButton(text="Следующие ▶️", callback_data=next_cursor.pack()))
+    return InlineKeyboardMarkup(inline_keyboard=[row]) if row else None
+
+def get_analytics_windows_keyboard(windows: list, current: int) -> InlineKeyboardMarkup:
+    row = [InlineKeyboardButton(text=f"{'• ' if days == current else ''}{days} дн.", callback_data=AnalyticsWindow(days=days).pack())
+           for days in windows]
+    return InlineKeyboardMarkup(inline_keyboard=[row])
+
 def get_keyboard_with_back_button(current_keyboard_layout: list[list[KeyboardButton]]):
     keyboard_layout = current_keyboard_layout + [[KeyboardButton(text="Назад")]]
     return ReplyKeyboardMarkup(keyboard=keyboard_layout, resize_keyboard=True)
 
-def get_confirm_delete_org_keyboard(org_id: int):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Да, удалить", callback_data=f"confirm_delete_org_{org_id}"),
-         InlineKeyboardButton(text="Отмена", callback_data="cancel_delete_org")]
-    ], row_width=2)
-    return keyboard
-
-def get_confirm_assign_manager_keyboard(user_id: int):
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Да, назначить", callback_data=f"confirm_assign_manager_{user_id}"),
-         InlineKeyboardButton(text="Отмена", callback_data="cancel_assign_manager")]
-    ], row_width=2)
-    return keyboard
+@memoized_keyboard
+def get_back_keyboard():
+    return get_keyboard_with_back_button([])
 
-def get_confirm_assign_employee_keyboard(user_id: int):
+def get_confirm_delete_org_keyboard(org_id: int):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Да, назначить", callback_data=f"confirm_assign_employee_{user_id}"),
-         InlineKeyboardButton(text="Отмена", callback_data="cancel_assign_employee")]
+        [InlineKeyboardButton(text="Да, удалить", callback_data=DeleteOrganization(org_id=org_id).pack()),
+         InlineKeyboardButton(text="Отмена", callback_data=CancelDeleteOrganization().pack())]
     ], row_width=2)
     return keyboard
 
-def get_users_for_assign_manager_keyboard(users: list):
-    keyboard_layout = []
-    for user in users:
-        keyboard_layout.append([InlineKeyboardButton(text=f"{user['full_name']} (ID: {user['user_id']})", callback_data=f"select_user_assign_manager_{user['user_id']}")])
-    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data="cancel_action")])
+def _picker_keyboard(buttons: list, page: PickerPage, extra_rows: list = ()) -> InlineKeyboardMarkup:
+    # Одна страница выбора: записи, листание, сброс поиска и кнопка "Назад"
+    keyboard_layout = [[button] for button in buttons]
+    prev_cursor, next_cursor = picker_cursors(page)
+    row = []
+    if prev_cursor:
+        row.append(InlineKeyboardButton(text="◀️", callback_data=prev_cursor.pack()))
+    if next_cursor:
+        row.append(InlineKeyboardButton(text="▶️", callback_data=next_cursor.pack()))
+    if row:
+        keyboard_layout.append(row)
+    if page.prefix:
+        keyboard_layout.append([InlineKeyboardButton(text=f"✖️ Сбросить поиск «{page.prefix}»",
+                                                     callback_data=PickerCursor(picker=page.picker, direction='f').pack())])
+    keyboard_layout.extend(extra_rows)
+    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data=CancelAction().pack())])
     return InlineKeyboardMarkup(inline_keyboard=keyboard_layout)
 
-def get_managers_for_remove_keyboard(managers: list):
-    keyboard_layout = []
-    for manager in managers:
-        org_info = f" (Орг ID: {manager['organization_id']})" if manager['organization_id'] else ""
-        keyboard_layout.append([InlineKeyboardButton(text=f"{manager['full_name']} (ID: {manager['user_id']}){org_info}", callback_data=f"select_manager_remove_{manager['user_id']}")])
-    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data="cancel_action")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard_layout)
+def get_users_for_assign_manager_keyboard(page: PickerPage):
+    return _picker_keyboard([InlineKeyboardButton(text=f"{user.full_name} (ID: {user.user_id})", callback_data=AssignManagerUser(user_id=user.user_id).pack())
+                             for user in page.rows], page)
 
-def get_users_for_assign_employee_keyboard(users: list):
-    keyboard_layout = []
-    for user in users:
-        keyboard_layout.append([InlineKeyboardButton(text=f"{user['full_name']} (ID: {user['user_id']})", callback_data=f"select_user_assign_employee_{user['user_id']}")])
-    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data="cancel_action")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard_layout)
+def get_managers_for_remove_keyboard(page: PickerPage):
+    buttons = []
+    for manager in page.rows:
+        org_info = f" (Орг ID: {manager.organization_id})" if manager.organization_id else ""
+        buttons.append(InlineKeyboardButton(text=f"{manager.full_name} (ID: {manager.user_id}){org_info}", callback_data=RemoveManager(user_id=manager.user_id).pack()))
+    return _picker_keyboard(buttons, page)
 
-def get_employees_for_remove_keyboard(employees: list):
-    keyboard_layout = []
-    for employee in employees:
-        keyboard_layout.append([InlineKeyboardButton(text=f"{employee['full_name']} (ID: {employee['user_id']})", callback_data=f"select_employee_remove_{employee['user_id']}")])
-    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data="cancel_action")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard_layout)
+def get_users_for_assign_employee_keyboard(page: PickerPage):
+    return _picker_keyboard([InlineKeyboardButton(text=f"{user.full_name} (ID: {user.user_id})", callback_data=AssignEmployee(user_id=user.user_id).pack())
+                             for user in page.rows], page)
 
-def get_employees_for_assign_task_keyboard(employees: list):
-    keyboard_layout = []
-    for employee in employees:
-        keyboard_layout.append([InlineKeyboardButton(text=f"{employee['full_name']} (ID: {employee['user_id']})", callback_data=f"select_employee_assign_task_{employee['user_id']}")])
-    keyboard_layout.append([InlineKeyboardButton(text="Назад", callback_data="cancel_action")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard_layout)
+def get_employees_for_remove_keyboard(page: PickerPage):
+    return _picker_keyboard([InlineKeyboardButton(text=f"{employee.full_name} (ID: {employee.user_id})", callback_data=RemoveEmployee(user_id=employee.user_id).pack())
+                             for employee in page.rows], page)
 
-def get_organizations_for_assign_manager_keyboard(organizations) -> InlineKeyboardMarkup:
-    keyboard = []
-    for org in organizations:
-        keyboard.append([InlineKeyboardButton(text=f"{org['name']} (ID: {org['org_id']})", callback_data=f"select_org_assign_manager_{org['org_id']}")])
-    keyboard.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="cancel_action")])
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def get_employees_for_assign_task_keyboard(page: PickerPage, selected=frozenset(), all_selected: bool = False):
+    # Множественный выбор: нажатие на сотрудника отмечает или снимает отметку, отметки сохраняются при листании
+    buttons = []
+    for employee in page.rows:
+        mark = "✅ " if employee.user_id in selected else ""
+        buttons.append(InlineKeyboardButton(text=f"{mark}{employee.full_name} (ID: {employee.user_id})", callback_data=ToggleTaskEmployee(user_id=employee.user_id).pack()))
+    extra_rows = [[InlineKeyboardButton(text="Снять все" if all_selected else "Выбрать всех", callback_data=ToggleAllTaskEmployees().pack()),
+                   InlineKeyboardButton(text=f"Далее ({len(selected)})", callback_data=ConfirmTaskEmployees().pack())]]
+    return _picker_keyboard(buttons, page, extra_rows)
 
+def get_organizations_for_assign_manager_keyboard(page: PickerPage) -> InlineKeyboardMarkup:
+    return _picker_keyboard([InlineKeyboardButton(text=f"{org.name} (ID: {org.org_id})", callback_data=AssignManagerOrganization(org_id=org.org_id).pack())
+                             for org in page.rows], page)
+
+@memoized_keyboard
 def get_confirm_reset_keyboard():
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Да, сбросить", callback_data="confirm_reset"),
-         InlineKeyboardButton(text="Отмена", callback_data="cancel_reset")]
+        [InlineKeyboardButton(text="Да, сбросить", callback_data=ConfirmReset().pack()),
+         InlineKeyboardButton(text="Отмена", callback_data=CancelReset().pack())]
     ], row_width=2)
     return keyboard
+
+def get_task_notification_keyboard(task_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Изменить статус", callback_data=ChangeTaskStatus(task_id=task_id).pack())]])
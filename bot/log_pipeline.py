@@ -0,0 +1,94 @@
+import asyncio
+import atexit
+import copy
+import json
+import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_QUEUE_SIZE, LOG_QUEUE_POLICY, LOG_QUEUE_BLOCK_TIMEOUT
+
+# Атрибуты, которые есть у любой записи; все остальное пришло через extra и попадает в JSON как есть
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    # Обработчик только кладет запись в очередь, запись на диск идет в потоке QueueListener.
+    # При переполнении: drop — запись отбрасывается, block — вызывающий ждет освобождения места
+    # (не дольше LOG_QUEUE_BLOCK_TIMEOUT), затем запись тоже отбрасывается.
+    # block не останавливает event loop: ожидание до секунды на каждую запись задержало бы все обработчики,
+    # поэтому из потока с запущенным циклом запись при переполнении отбрасывается, как при drop.
+    # Ждут только посторонние потоки (пул run_in_executor, пересылка логов воркеров).
+    def __init__(self, log_queue: queue.Queue, policy: str = LOG_QUEUE_POLICY):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение собирается в вызывающем потоке: аргументы могут измениться, пока запись в очереди
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == 'block' and not _in_event_loop():
+                self.queue.put(record, timeout=LOG_QUEUE_BLOCK_TIMEOUT)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            warning = logging.makeLogRecord({
+                'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Очередь логов переполнена, потеряно записей: {dropped}",
+            })
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                self.dropped += dropped
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Очередь может быть заполнена: ждем, пока поток дочитает ее, а не теряем сигнал остановки
+        self.queue.put(self._sentinel)
+
+
+def attach_queue(logger: logging.Logger, *handlers: logging.Handler) -> QueueListener:
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    logger.addHandler(BoundedQueueHandler(log_queue))
+    listener = DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Останавливаем при выходе из процесса, чтобы дописать накопившиеся записи
+    atexit.register(listener.stop)
+    return listener
@@ -2,15 +2,24 @@ import asyncio
 import logging
 from logging.handlers import RotatingFileHandler
 import os
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram import Bot
 import asyncpg
-from aiogram.client.default import DefaultBotProperties
 
-from config import BOT_TOKEN
+from config import BOT_MODE, WORKERS, LOG_FORMAT
+from app import create_bot, create_dispatcher
+from cluster import run_cluster
+from audit import start_audit
 from db import create_db_pool, init_db
-from handlers import start_handlers, admin_handlers, manager_handlers, employee_handlers
+from log_pipeline import JsonFormatter, attach_queue
+from metrics import start_metrics_server
 from keyboards import get_main_menu_keyboard
+from stats import start_statistics_refresh
+from task_events import ensure_task_event_partitions, start_partition_maintenance
+from storage import start_storage_cleanup, check_fsm_storage_config
+from webhook import run_webhook, check_webhook_config
+from broadcast import broadcast, text_messages, record_broadcast, OutgoingMessage
+from outbox import enqueue_messages, start_outbox_workers, stop_outbox_workers
+from repositories import UserRepository
 
 app_logger = logging.getLogger('app')
 user_logger = logging.getLogger('user_actions')
@@ -25,82 +34,88 @@ def setup_logging():
     user_logger = logging.getLogger('user_actions')
     user_logger.setLevel(logging.INFO)
 
+    if LOG_FORMAT == 'json':
+        app_formatter = user_formatter = JsonFormatter()
+    else:
+        app_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        user_formatter = logging.Formatter('%(asctime)s - %(message)s')
+
     # Обработчик для app.log
     app_handler = RotatingFileHandler('logs/app.log', maxBytes=1024*1024, backupCount=10, encoding='utf-8')
     app_handler.setLevel(logging.INFO)
-    app_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     app_handler.setFormatter(app_formatter)
 
     # Обработчик для user_actions.log
     user_handler = RotatingFileHandler('logs/user_actions.log', maxBytes=1024*1024, backupCount=10, encoding='utf-8')
     user_handler.setLevel(logging.INFO)
-    user_formatter = logging.Formatter('%(asctime)s - %(message)s')
     user_handler.setFormatter(user_formatter)
 
     # Консольный обработчик для app
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(app_formatter)
-    logger.addHandler(console_handler)
 
-    # Добавляем обработчики к логгерам
-    logger.addHandler(app_handler)
-    user_logger.addHandler(user_handler)
+    # Запись в файлы и консоль идет в фоновых потоках, в event loop остается только постановка в очередь
+    attach_queue(logger, console_handler, app_handler)
+    attach_queue(user_logger, user_handler)
 
     return logger, user_logger
 
 async def on_startup_notify(bot: Bot, pool):
     app_logger.info("Отправка уведомлений пользователям об возобновлении работы бота...")
     async with pool.acquire() as conn:
-        users = await conn.fetch('SELECT user_id, role, full_name FROM users')
-        for user in users:
-            try:
-                keyboard = get_main_menu_keyboard(user['role'])
-                await bot.send_message(
-                    user['user_id'],
-                    "Возникли временные технические неполадки в работе нашего Telegram-бота. " +
-                    "Сейчас все проблемы устранены, и он снова полностью функционирует. " +
-                    "Приносим извинения за доставленные неудобства!",
-                    reply_markup=keyboard
-                )
-                user_logger.info(f"Пользователю {user['user_id']} ({user['full_name']}) отправлено обновленное меню.")
-            except Exception as e:
-                app_logger.error(f"Не удалось отправить сообщение пользователю {user['user_id']}: {e}")
-    app_logger.info("Отправка уведомлений завершена.")
+        roles = await UserRepository(conn).all_roles()
+        text = ("Возникли временные технические неполадки в работе нашего Telegram-бота. " +
+                "Сейчас все проблемы устранены, и он снова полностью функционирует. " +
+                "Приносим извинения за доставленные неудобства!")
+        messages = [OutgoingMessage(user_id, text, reply_markup=get_main_menu_keyboard(role))
+                    for user_id, role in roles.items()]
+        await enqueue_messages(conn, messages, 'startup')
+    app_logger.info("Уведомления поставлены в очередь.")
 
 async def on_shutdown_notify(bot: Bot, pool):
     app_logger.info("Отправка уведомлений пользователям о выключении бота...")
     async with pool.acquire() as conn:
-        users = await conn.fetch('SELECT user_id FROM users')
-        for user in users:
-            try:
-                await bot.send_message(
-                    user['user_id'],
-                    "Бот временно остановлен на техническое обслуживание. Мы скоро вернемся!"
-                )
-            except Exception as e:
-                app_logger.error(f"Не удалось отправить сообщение о выключении пользователю {user['user_id']}: {e}")
+        user_ids = await UserRepository(conn).all_ids()
+    result = await broadcast(bot, text_messages(user_ids,
+                                                "Бот временно остановлен на техническое обслуживание. Мы скоро вернемся!"))
+    await record_broadcast(pool, 'shutdown', result)
     app_logger.info("Отправка уведомлений о выключении завершена.")
 
 async def main():
     app_logger, user_logger = setup_logging()
+    # Ошибки настройки — до подключения к БД и уведомлений пользователей
+    check_fsm_storage_config()
+    if BOT_MODE == 'webhook':
+        check_webhook_config()
 
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-    dp = Dispatcher(storage=MemoryStorage())
-
-    dp.include_router(start_handlers.router)
-    dp.include_router(admin_handlers.router)
-    dp.include_router(manager_handlers.router)
-    dp.include_router(employee_handlers.router)
+    bot = create_bot()
 
     pool = await create_db_pool()
     await init_db(pool)
+    await ensure_task_event_partitions(pool)
 
-    dp['pool'] = pool
+    dp = create_dispatcher(pool)
+    outbox_workers = start_outbox_workers(bot, pool)
+    storage_cleanup = start_storage_cleanup(dp.storage)
+    statistics_refresh = start_statistics_refresh(pool)
+    partition_maintenance = start_partition_maintenance(pool)
+    audit_writer = start_audit(pool, user_logger)
+    metrics_server = await start_metrics_server()
 
     async def on_shutdown(bot: Bot, pool: asyncpg.Pool):
         app_logger.info("Бот останавливается...")
+        await stop_outbox_workers(outbox_workers)
+        if storage_cleanup:
+            storage_cleanup.cancel()
+        statistics_refresh.cancel()
+        partition_maintenance.cancel()
         await on_shutdown_notify(bot, pool)
+        # Остановка писателя аудита сбрасывает в БД все накопленные события
+        audit_writer.cancel()
+        await asyncio.gather(audit_writer, return_exceptions=True)
+        if metrics_server:
+            await metrics_server.cleanup()
         await pool.close()
         app_logger.info("Пул подключений к БД закрыт")
 
@@ -108,9 +123,14 @@ async def main():
 
     try:
         await on_startup_notify(bot, pool)
-        await bot.delete_webhook(drop_pending_updates=True)
-        app_logger.info("Бот запущен")
-        await dp.start_polling(bot)
+        if WORKERS > 1:
+            await run_cluster(dp, bot, WORKERS)
+        elif BOT_MODE == 'webhook':
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            app_logger.info("Бот запущен")
+            await dp.start_polling(bot)
     finally:
         await bot.session.close()
         app_logger.info("Бот остановлен")
@@ -0,0 +1,246 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import METRICS_HOST, METRICS_PORT, DB_POOL_ACQUIRE_TIMEOUT
+
+app_logger = logging.getLogger('app')
+
+# Границы корзин гистограмм по умолчанию в секундах — те же, что в официальных клиентах Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_INF_BUCKET = 'le="+Inf"'
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    # Значение снимается в момент запроса /metrics
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self) -> list:
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(value)}"]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            # Счетчики по корзинам (без накопления) + сумма + количество
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def totals(self) -> tuple:
+        # Количество наблюдений и их сумма по всем сериям
+        return (sum(series[2] for series in self._series.values()),
+                sum(series[1] for series in self._series.values()))
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, _INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+handler_duration = registry.register(Histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика апдейта', ('router', 'handler', 'status')))
+pool_acquire_duration = registry.register(Histogram(
+    'db_pool_acquire_seconds', 'Ожидание соединения из пула'))
+pool_acquire_timeouts = registry.register(Counter(
+    'db_pool_acquire_timeouts_total', 'Соединение из пула не получено за DB_POOL_ACQUIRE_TIMEOUT'))
+query_duration = registry.register(Histogram(
+    'db_query_duration_seconds', 'Время выполнения запроса к БД', ('method',)))
+query_errors = registry.register(Counter(
+    'db_query_errors_total', 'Запросы к БД, завершившиеся ошибкой', ('method',)))
+telegram_errors = registry.register(Counter(
+    'telegram_send_errors_total', 'Ошибки Telegram API при отправке сообщений', ('source', 'error')))
+
+
+class MetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        callback = data['handler'].callback
+        router = callback.__module__.rsplit('.', 1)[-1]
+        status = 'ok'
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, router, callback.__name__, status)
+
+
+# Методы соединения, время которых попадает в db_query_duration_seconds
+_TIMED_METHODS = frozenset({'execute', 'executemany', 'fetch', 'fetchrow', 'fetchval', 'copy_records_to_table'})
+
+
+class InstrumentedConnection:
+    def __init__(self, conn: asyncpg.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in _TIMED_METHODS:
+            return attr
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            except Exception:
+                query_errors.inc(name)
+                raise
+            finally:
+                query_duration.observe(time.perf_counter() - started, name)
+        return timed
+
+
+class _InstrumentedAcquire:
+    def __init__(self, pool: 'InstrumentedPool', timeout: Optional[float]):
+        self.pool = pool
+        self.timeout = timeout
+        self.conn = None
+
+    async def _acquire(self) -> InstrumentedConnection:
+        started = time.perf_counter()
+        try:
+            conn = await self.pool._pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError:
+            pool_acquire_timeouts.inc()
+            raise
+        pool_acquire_duration.observe(time.perf_counter() - started)
+        return InstrumentedConnection(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self) -> InstrumentedConnection:
+        self.conn = await self._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc):
+        await self.pool.release(self.conn)
+
+
+class InstrumentedPool:
+    # Обертка над asyncpg.Pool: acquire() работает и как `async with`, и как `await`, как у оригинала
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+
+    def acquire(self, *, timeout: float = None) -> _InstrumentedAcquire:
+        # Без явного таймаута обработчик не ждет соединения дольше DB_POOL_ACQUIRE_TIMEOUT (0 — без ограничения)
+        return _InstrumentedAcquire(self, timeout if timeout is not None else DB_POOL_ACQUIRE_TIMEOUT or None)
+
+    async def release(self, conn, *, timeout: float = None):
+        if isinstance(conn, InstrumentedConnection):
+            conn = conn._conn
+        await self._pool.release(conn, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def register_pool_gauges(pool):
+    registry.register(Gauge('db_pool_size', 'Открытых соединений в пуле', pool.get_size))
+    registry.register(Gauge('db_pool_idle', 'Свободных соединений в пуле', pool.get_idle_size))
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+async def start_metrics_server(port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_endpoint)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=METRICS_HOST, port=port).start()
+    app_logger.info(f"Метрики доступны на http://{METRICS_HOST}:{port}/metrics")
+    return runner
@@ -0,0 +1,15 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from cache import get_user_profile
+
+
+class UserMiddleware(BaseMiddleware):
+    # Загружает профиль пользователя один раз на апдейт и кладет его в data['user']
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        from_user = data.get('event_from_user')
+        data['user'] = await get_user_profile(from_user.id, data['pool']) if from_user else None
+        return await handler(event, data)
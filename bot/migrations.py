@@ -0,0 +1,174 @@
+import asyncpg
+import logging
+
+app_logger = logging.getLogger('app')
+
+# Ключ advisory-блокировки: не даем нескольким процессам накатывать миграции одновременно
+MIGRATIONS_LOCK_ID = 715_001
+
+# Миграции применяются строго по возрастанию версии. Уже выпущенные миграции не редактируются —
+# любое изменение схемы оформляется новой записью в конце списка.
+MIGRATIONS = [
+    (1, 'initial schema', '''
+        CREATE TABLE IF NOT EXISTS organizations (
+            org_id SERIAL PRIMARY KEY,
+            name VARCHAR(255) UNIQUE NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            full_name VARCHAR(255) NOT NULL,
+            role VARCHAR(50) DEFAULT 'user',
+            organization_id INTEGER REFERENCES organizations(org_id) ON DELETE SET NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id SERIAL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            employee_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+            manager_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+            organization_id INTEGER REFERENCES organizations(org_id) ON DELETE CASCADE,
+            status VARCHAR(50) DEFAULT 'new',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (2, 'broadcasts and outbox', '''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            broadcast_id SERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            created_by BIGINT,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            progress_message_id BIGINT,
+            progress_at TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            message_id BIGSERIAL PRIMARY KEY,
+            broadcast_id INTEGER REFERENCES broadcasts(broadcast_id) ON DELETE SET NULL,
+            chat_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup JSONB,
+            parse_mode VARCHAR(20),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (3, 'task hot path indexes', '''
+        -- Списки задач менеджера и сотрудника постранично по (created_at, task_id), в том числе с фильтром статуса
+        CREATE INDEX IF NOT EXISTS tasks_manager_status_page_idx
+            ON tasks (manager_id, status, created_at DESC, task_id DESC);
+        CREATE INDEX IF NOT EXISTS tasks_employee_status_page_idx
+            ON tasks (employee_id, status, created_at DESC, task_id DESC);
+        CREATE INDEX IF NOT EXISTS tasks_organization_idx
+            ON tasks (organization_id);
+        -- Сотрудники и менеджеры организации, в том числе постранично по имени в кнопках выбора
+        CREATE INDEX IF NOT EXISTS users_role_organization_name_idx
+            ON users (role, organization_id, full_name, user_id);
+    '''),
+    (4, 'fsm storage', '''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data JSONB NOT NULL DEFAULT '{}'::jsonb,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS fsm_storage_updated_idx ON fsm_storage (updated_at);
+    '''),
+    (5, 'statistics snapshot', '''
+        CREATE MATERIALIZED VIEW IF NOT EXISTS statistics_snapshot AS
+        SELECT
+            1 AS snapshot_id,
+            (SELECT COUNT(*) FROM users) AS total_users,
+            (SELECT COUNT(*) FROM organizations) AS total_organizations,
+            (SELECT COUNT(*) FROM tasks) AS total_tasks,
+            (SELECT COUNT(*) FROM users WHERE role = 'manager') AS total_managers,
+            (SELECT COUNT(*) FROM users WHERE role = 'employee') AS total_employees,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(status, task_count) ORDER BY status), '[]'::jsonb)
+             FROM (SELECT status, COUNT(*) AS task_count FROM tasks GROUP BY status) s) AS tasks_by_status,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(name, task_count) ORDER BY name), '[]'::jsonb)
+             FROM (SELECT o.name, COUNT(t.task_id) AS task_count
+                   FROM organizations o
+                   LEFT JOIN tasks t ON o.org_id = t.organization_id
+                   GROUP BY o.org_id, o.name) s) AS tasks_per_organization,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(full_name, task_count) ORDER BY full_name), '[]'::jsonb)
+             FROM (SELECT u.full_name, COUNT(t.task_id) AS task_count
+                   FROM users u
+                   LEFT JOIN tasks t ON u.user_id = t.manager_id
+                   WHERE u.role = 'manager'
+                   GROUP BY u.user_id, u.full_name) s) AS tasks_by_manager,
+            (SELECT COALESCE(jsonb_agg(jsonb_build_array(full_name, task_count) ORDER BY full_name), '[]'::jsonb)
+             FROM (SELECT u.full_name, COUNT(*) AS task_count
+                   FROM users u
+                   JOIN tasks t ON u.user_id = t.employee_id
+                   WHERE u.role = 'employee' AND t.status = 'completed'
+                   GROUP BY u.user_id, u.full_name) s) AS tasks_completed_by_employee,
+            CURRENT_TIMESTAMP AS refreshed_at;
+        -- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+        CREATE UNIQUE INDEX IF NOT EXISTS statistics_snapshot_id_idx ON statistics_snapshot (snapshot_id);
+    '''),
+    (6, 'task events', '''
+        -- История статусов только дописывается и переживает удаление самой задачи, поэтому без внешних ключей.
+        -- Помесячные секции создает task_events.ensure_task_event_partitions при запуске и затем раз в сутки.
+        -- Секции по умолчанию нет намеренно: строки в ней не дали бы создать секцию за тот же месяц.
+        CREATE TABLE IF NOT EXISTS task_events (
+            event_id BIGINT GENERATED ALWAYS AS IDENTITY,
+            task_id INTEGER NOT NULL,
+            actor_id BIGINT,
+            manager_id BIGINT,
+            employee_id BIGINT,
+            old_status VARCHAR(50),
+            new_status VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (event_id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        CREATE INDEX IF NOT EXISTS task_events_task_idx ON task_events (task_id, created_at);
+        -- Аналитика менеджера читает только эти колонки — хватает index-only scan без обращения к куче
+        CREATE INDEX IF NOT EXISTS task_events_manager_covering_idx
+            ON task_events (manager_id, created_at) INCLUDE (task_id, employee_id, old_status, new_status);
+        CREATE INDEX IF NOT EXISTS task_events_employee_idx ON task_events (employee_id, created_at);
+    '''),
+    (7, 'audit events', '''
+        CREATE TABLE IF NOT EXISTS audit_events (
+            event_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL,
+            user_id BIGINT,
+            chat_id BIGINT,
+            action VARCHAR(100),
+            details TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS audit_events_created_idx ON audit_events (created_at);
+        CREATE INDEX IF NOT EXISTS audit_events_user_idx ON audit_events (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS audit_events_action_idx ON audit_events (action, created_at);
+    '''),
+    (8, 'user name indexes', '''
+        CREATE INDEX IF NOT EXISTS users_full_name_idx ON users (full_name, user_id);
+        CREATE INDEX IF NOT EXISTS users_role_full_name_idx ON users (role, full_name, user_id);
+    '''),
+]
+
+
+async def apply_migrations(conn: asyncpg.Connection, migrations: list = MIGRATIONS):
+    # Блокировка берется до любого DDL: одновременный CREATE TABLE IF NOT EXISTS из двух процессов
+    # может упасть на уникальности системного каталога
+    await conn.execute('SELECT pg_advisory_lock($1)', MIGRATIONS_LOCK_ID)
+    try:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        ''')
+        applied = {row['version'] for row in await conn.fetch('SELECT version FROM schema_migrations')}
+        for version, name, sql in migrations:
+            if version in applied:
+                continue
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute('INSERT INTO schema_migrations (version, name) VALUES ($1, $2)', version, name)
+            app_logger.info(f"Применена миграция {version}: {name}")
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_ID)
@@ -1,61 +1,68 @@
-import asyncpg
+from dataclasses import dataclass
 from datetime import datetime
-import logging
+from typing import Optional
 
-app_logger = logging.getLogger('app')
+# Записи, которые возвращают репозитории. Неизменяемые и со __slots__: объекты без __dict__ заметно
+# меньше, их безопасно кэшировать и передавать между обработчиками.
 
+
+@dataclass(frozen=True, slots=True)
 class User:
-    def __init__(self, user_id: int, full_name: str, role: str = 'user', organization_id: int = None):
-        self.user_id = user_id
-        self.full_name = full_name
-        self.role = role
-        self.organization_id = organization_id
+    user_id: int
+    full_name: str
+    role: str = 'user'
+    organization_id: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class UserWithOrganization(User):
+    organization_name: Optional[str] = None
 
+
+@dataclass(frozen=True, slots=True)
 class Organization:
-    def __init__(self, org_id: int, name: str):
-        self.org_id = org_id
-        self.name = name
+    org_id: int
+    name: str
+
 
+@dataclass(frozen=True, slots=True)
 class Task:
-    def __init__(self, task_id: int, title: str, description: str, employee_id: int, manager_id: int, organization_id: int, status: str = 'new', created_at: datetime = None):
-        self.task_id = task_id
-        self.title = title
-        self.description = description
-        self.employee_id = employee_id
-        self.manager_id = manager_id
-        self.organization_id = organization_id
-        self.status = status
-        self.created_at = created_at if created_at is not None else datetime.now()
-
-async def create_tables(conn: asyncpg.Connection):
-    try:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS organizations (
-                org_id SERIAL PRIMARY KEY,
-                name VARCHAR(255) UNIQUE NOT NULL
-            );
-        ''')
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                full_name VARCHAR(255) NOT NULL,
-                role VARCHAR(50) DEFAULT 'user',
-                organization_id INTEGER REFERENCES organizations(org_id) ON DELETE SET NULL
-            );
-        ''')
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id SERIAL PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                description TEXT,
-                employee_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                manager_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-                organization_id INTEGER REFERENCES organizations(org_id) ON DELETE CASCADE,
-                status VARCHAR(50) DEFAULT 'new',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        ''')
-        app_logger.info("Таблицы в базе данных созданы успешно")
-    except Exception as e:
-        app_logger.error(f"Ошибка при создании таблиц в базе данных: {e}")
-        raise
\ No newline at end of file
+    task_id: int
+    title: str
+    description: Optional[str]
+    employee_id: Optional[int]
+    manager_id: Optional[int]
+    organization_id: Optional[int]
+    status: str
+    created_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class NewTask:
+    title: str
+    description: Optional[str]
+    employee_id: int
+    manager_id: int
+    organization_id: int
+
+
+@dataclass(frozen=True, slots=True)
+class TaskView:
+    # Задача для показа в списках: вместе с именами менеджера и сотрудника
+    task_id: int
+    title: str
+    description: Optional[str]
+    status: str
+    created_at: datetime
+    manager_id: Optional[int] = None
+    employee_id: Optional[int] = None
+    manager_name: Optional[str] = None
+    employee_name: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class TaskStatusChange:
+    task_id: int
+    title: str
+    manager_id: Optional[int]
+    old_status: str
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Iterable
+
+import asyncpg
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+from broadcast import OutgoingMessage, BroadcastResult, send_message, format_progress
+from config import (OUTBOX_WORKERS, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS,
+                    BROADCAST_PROGRESS_INTERVAL)
+
+app_logger = logging.getLogger('app')
+
+# Будит воркеры этого процесса сразу после постановки сообщений в очередь
+_wakeup = asyncio.Event()
+
+
+def _dump_markup(reply_markup) -> str:
+    if reply_markup is None:
+        return None
+    return reply_markup.model_dump_json(exclude_none=True)
+
+
+def _dump_markups(messages: list) -> list:
+    # Клавиатуры из keyboards.py общие для всех получателей: каждая сериализуется один раз
+    dumped = {}
+    for m in messages:
+        if id(m.reply_markup) not in dumped:
+            dumped[id(m.reply_markup)] = _dump_markup(m.reply_markup)
+    return [dumped[id(m.reply_markup)] for m in messages]
+
+
+def _load_markup(raw: str):
+    if raw is None:
+        return None
+    data = json.loads(raw)
+    if 'inline_keyboard' in data:
+        return InlineKeyboardMarkup.model_validate(data)
+    return ReplyKeyboardMarkup.model_validate(data)
+
+
+async def enqueue_messages(conn: asyncpg.Connection, messages: Iterable[OutgoingMessage], kind: str,
+                           created_by: int = None, progress_message_id: int = None) -> int:
+    # progress_message_id — сообщение в чате created_by, которое воркеры обновляют ходом рассылки
+    messages = list(messages)
+    async with conn.transaction():
+        broadcast_id = await conn.fetchval('''
+            INSERT INTO broadcasts (kind, created_by, total, finished_at, progress_message_id)
+            VALUES ($1, $2, $3, CASE WHEN $3 = 0 THEN CURRENT_TIMESTAMP END, $4)
+            RETURNING broadcast_id
+        ''', kind, created_by, len(messages), progress_message_id)
+        if messages:
+            await conn.execute('''
+                INSERT INTO outbox (broadcast_id, chat_id, text, reply_markup, parse_mode)
+                SELECT $1, m.chat_id, m.text, m.reply_markup, m.parse_mode
+                FROM unnest($2::bigint[], $3::text[], $4::jsonb[], $5::varchar[])
+                     AS m(chat_id, text, reply_markup, parse_mode)
+            ''', broadcast_id,
+                [m.chat_id for m in messages],
+                [m.text for m in messages],
+                _dump_markups(messages),
+                [m.parse_mode for m in messages])
+    _wakeup.set()
+    app_logger.info(f"Рассылка '{kind}' ({broadcast_id}) поставлена в очередь: {len(messages)} сообщений")
+    return broadcast_id
+
+
+async def _claim_batch(pool: asyncpg.Pool):
+    async with pool.acquire() as conn:
+        return await conn.fetch('''
+            UPDATE outbox
+            SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => $2), attempts = attempts + 1
+            WHERE message_id IN (
+                SELECT message_id FROM outbox
+                WHERE (locked_until IS NULL OR locked_until < CURRENT_TIMESTAMP) AND attempts < $3
+                ORDER BY message_id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING message_id, broadcast_id, chat_id, text, reply_markup, parse_mode
+        ''', OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS)
+
+
+async def _record_results(conn: asyncpg.Connection, rows: list, delivered: dict) -> list:
+    # rows — удаленные этим воркером строки очереди. Засчитываются только они: если аренда истекла
+    # и сообщение уже завершил другой воркер, счетчики рассылки и отчет о ее завершении не дублируются.
+    # Возвращает рассылки, о которых пора сообщить: завершенные и те, чей прогресс давно не обновлялся
+    counts = defaultdict(lambda: [0, 0])
+    for row in rows:
+        if row['broadcast_id'] is not None:
+            counts[row['broadcast_id']][0 if delivered.get(row['message_id']) else 1] += 1
+    reports = []
+    for broadcast_id, (sent, failed) in counts.items():
+        row = await conn.fetchrow('''
+            UPDATE broadcasts b
+            SET sent = b.sent + $2, failed = b.failed + $3,
+                finished_at = CASE WHEN b.sent + $2 + b.failed + $3 >= b.total THEN CURRENT_TIMESTAMP END,
+                progress_at = CASE
+                    WHEN COALESCE(b.progress_at, b.started_at) <= CURRENT_TIMESTAMP - make_interval(secs => $4)
+                    THEN CURRENT_TIMESTAMP ELSE b.progress_at END
+            FROM (SELECT broadcast_id, progress_at FROM broadcasts WHERE broadcast_id = $1 FOR UPDATE) old
+            WHERE b.broadcast_id = old.broadcast_id
+            RETURNING b.kind, b.created_by, b.total, b.sent, b.failed, b.started_at, b.finished_at,
+                      b.progress_message_id, b.progress_at IS DISTINCT FROM old.progress_at AS progress_due
+        ''', broadcast_id, sent, failed, BROADCAST_PROGRESS_INTERVAL)
+        if row and (row['finished_at'] or row['progress_due']):
+            reports.append(row)
+    return reports
+
+
+async def _edit_progress(bot: Bot, row, text: str) -> bool:
+    try:
+        await bot.edit_message_text(text, chat_id=row['created_by'], message_id=row['progress_message_id'])
+        return True
+    except TelegramBadRequest as e:
+        # Сообщение удалено или слишком старое для редактирования
+        app_logger.warning(f"Не удалось обновить прогресс рассылки для {row['created_by']}: {e}")
+        return False
+
+
+async def _report_progress(bot: Bot, reports: list):
+    for row in reports:
+        if row['finished_at']:
+            app_logger.info(f"Рассылка '{row['kind']}' завершена: отправлено {row['sent']} из {row['total']}, "
+                            f"ошибок {row['failed']}")
+        if not row['created_by']:
+            continue
+        result = BroadcastResult(total=row['total'], sent=row['sent'], failed=row['failed'],
+                                 started_at=row['started_at'], finished_at=row['finished_at'])
+        text = format_progress(result)
+        if row['progress_message_id'] and await _edit_progress(bot, row, text):
+            continue
+        # Без сообщения о прогрессе автор рассылки получает только итоговый отчет
+        if row['finished_at']:
+            await send_message(bot, row['created_by'], text)
+
+
+async def _complete_batch(bot: Bot, pool: asyncpg.Pool, delivered: dict):
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch('''
+                DELETE FROM outbox WHERE message_id = ANY($1::bigint[])
+                RETURNING message_id, broadcast_id
+            ''', list(delivered))
+            reports = await _record_results(conn, rows, delivered)
+    await _report_progress(bot, reports)
+
+
+async def _discard_exhausted(bot: Bot, pool: asyncpg.Pool):
+    # Сообщения, которые ни разу не удалось довести до конца за OUTBOX_MAX_ATTEMPTS захватов,
+    # больше не повторяются и засчитываются рассылке как недоставленные
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch('''
+                DELETE FROM outbox
+                WHERE attempts >= $1 AND locked_until < CURRENT_TIMESTAMP
+                RETURNING message_id, broadcast_id, chat_id
+            ''', OUTBOX_MAX_ATTEMPTS)
+            reports = await _record_results(conn, rows, {})
+    for row in rows:
+        app_logger.error(f"Сообщение {row['message_id']} для {row['chat_id']} не доставлено "
+                         f"за {OUTBOX_MAX_ATTEMPTS} попыток и удалено из очереди")
+    await _report_progress(bot, reports)
+
+
+async def _deliver(bot: Bot, row) -> bool:
+    # Ошибка одного сообщения (например, испорченная разметка) не должна срывать весь захваченный пакет
+    try:
+        return await send_message(bot, row['chat_id'], row['text'], _load_markup(row['reply_markup']),
+                                  row['parse_mode'])
+    except Exception as e:
+        app_logger.error(f"Не удалось подготовить сообщение {row['message_id']} из очереди: {e}")
+        return False
+
+
+async def outbox_worker(bot: Bot, pool: asyncpg.Pool, worker_id: int):
+    app_logger.info(f"Воркер очереди сообщений {worker_id} запущен")
+    while True:
+        try:
+            # Сброс до захвата: сообщения, поставленные в очередь во время захвата, снова разбудят воркер
+            _wakeup.clear()
+            batch = await _claim_batch(pool)
+            if not batch:
+                await _discard_exhausted(bot, pool)
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            results = await asyncio.gather(*(_deliver(bot, row) for row in batch))
+            await _complete_batch(bot, pool, {row['message_id']: delivered for row, delivered in zip(batch, results)})
+        except asyncio.CancelledError:
+            app_logger.info(f"Воркер очереди сообщений {worker_id} остановлен")
+            raise
+        except Exception as e:
+            app_logger.error(f"Ошибка в воркере очереди сообщений {worker_id}: {e}")
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+
+def start_outbox_workers(bot: Bot, pool: asyncpg.Pool, count: int = OUTBOX_WORKERS) -> list:
+    return [asyncio.create_task(outbox_worker(bot, pool, i)) for i in range(count)]
+
+
+async def stop_outbox_workers(workers: list):
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import asyncpg
+
+from callbacks import PackedCallbackData, PackedDatetime, PackedInt, PackedStatus
+from config import TASKS_PAGE_SIZE
+from models import TaskView
+
+OWNER_COLUMNS = {'m': 'manager_id', 'e': 'employee_id'}
+
+
+@dataclass
+class Page:
+    rows: List[TaskView]
+    has_prev: bool
+    has_next: bool
+
+
+class TaskPageCursor(PackedCallbackData, prefix='tp'):
+    scope: str
+    status: Optional[PackedStatus]
+    direction: str
+    created_at: PackedDatetime
+    task_id: PackedInt
+
+
+def _task_page_query(owner_column: str, with_status: bool, direction: Optional[str]) -> str:
+    conditions = [f"t.{owner_column} = $1"]
+    if with_status:
+        conditions.append("t.status = $2")
+    next_param = 3 if with_status else 2
+    order = "DESC"
+    if direction == 'n':
+        conditions.append(f"(t.created_at, t.task_id) < (${next_param}, ${next_param + 1})")
+    elif direction == 'p':
+        conditions.append(f"(t.created_at, t.task_id) > (${next_param}, ${next_param + 1})")
+        order = "ASC"
+    limit_param = next_param + (2 if direction else 0)
+    return f'''
+        SELECT t.task_id, t.title, t.description, t.status, t.created_at, t.manager_id, t.employee_id,
+               u.full_name AS employee_name, u2.full_name AS manager_name
+        FROM tasks t
+        JOIN users u ON t.employee_id = u.user_id
+        JOIN users u2 ON t.manager_id = u2.user_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY t.created_at {order}, t.task_id {order}
+        LIMIT ${limit_param}
+    '''
+
+
+# Тексты запросов строятся один раз, чтобы asyncpg переиспользовал подготовленные выражения
+_TASK_PAGE_QUERIES = {
+    (scope, with_status, direction): _task_page_query(owner_column, with_status, direction)
+    for scope, owner_column in OWNER_COLUMNS.items()
+    for with_status in (True, False)
+    for direction in (None, 'n', 'p')
+}
+
+
+async def fetch_task_page(pool: asyncpg.Pool, scope: str, owner_id: int, status: Optional[str] = None,
+                          cursor: TaskPageCursor = None, page_size: int = TASKS_PAGE_SIZE) -> Page:
+    direction = cursor.direction if cursor else None
+    args = [owner_id]
+    if status:
+        args.append(status)
+    if cursor:
+        args += [cursor.created_at, cursor.task_id]
+    args.append(page_size + 1)
+
+    async with pool.acquire() as conn:
+        rows = [TaskView(**row) for row in await conn.fetch(_TASK_PAGE_QUERIES[(scope, bool(status), direction)], *args)]
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'p':
+        rows.reverse()
+        return Page(rows, has_prev=has_more, has_next=True)
+    return Page(rows, has_prev=direction == 'n', has_next=has_more)
+
+
+def page_cursors(page: Page, scope: str, status: Optional[str]):
+    prev_cursor = next_cursor = None
+    if page.rows and page.has_prev:
+        first = page.rows[0]
+        prev_cursor = TaskPageCursor(scope=scope, status=status, direction='p', created_at=first.created_at,
+                                     task_id=first.task_id)
+    if page.rows and page.has_next:
+        last = page.rows[-1]
+        next_cursor = TaskPageCursor(scope=scope, status=status, direction='n', created_at=last.created_at,
+                                     task_id=last.task_id)
+    return prev_cursor, next_cursor
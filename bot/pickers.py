@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import asyncpg
+
+from callbacks import SEPARATOR, PackedCallbackData, PackedInt
+from config import PICKER_PAGE_SIZE
+from models import User, Organization
+from repositories import escape_like
+
+# callback_data ограничена 64 байтами: префикс поиска режется так, чтобы поместилась и самая длинная запись
+MAX_PREFIX_BYTES = 32
+
+
+@dataclass(frozen=True)
+class PickerSource:
+    table: str
+    id_column: str
+    name_column: str
+    columns: str
+    record_class: type
+    condition: str = ''
+    # Значения параметров условия; ID организации менеджера подставляется при запросе (scope)
+    params: tuple = ()
+    scoped: bool = False
+
+
+_USERS = dict(table='users', id_column='user_id', name_column='full_name',
+              columns='user_id, full_name, role, organization_id', record_class=User)
+
+# Код выбора -> откуда берутся записи. Код попадает в callback_data, по нему же выбирается клавиатура
+PICKER_SOURCES = {
+    'am': PickerSource(**_USERS, condition='role = $1', params=('user',)),
+    'rm': PickerSource(**_USERS, condition='role = $1', params=('manager',)),
+    'ae': PickerSource(**_USERS, condition='role = $1 AND organization_id IS NULL', params=('user',)),
+    're': PickerSource(**_USERS, condition='role = $1 AND organization_id = $2', params=('employee',), scoped=True),
+    'at': PickerSource(**_USERS, condition='role = $1 AND organization_id = $2', params=('employee',), scoped=True),
+    'ao': PickerSource('organizations', 'org_id', 'name', 'org_id, name', Organization),
+}
+
+
+@dataclass
+class PickerPage:
+    picker: str
+    rows: list
+    prefix: Optional[str]
+    has_prev: bool
+    has_next: bool
+
+
+class PickerCursor(PackedCallbackData, prefix='pk'):
+    # Страница задается ID соседней записи: ключ (имя, ID) дочитывается подзапросом,
+    # поэтому имя не нужно класть в callback_data
+    picker: str
+    direction: str  # f — первая страница, n — после anchor_id, p — до anchor_id
+    anchor_id: Optional[PackedInt] = None
+    prefix: Optional[str] = None
+
+
+def normalize_prefix(text: Optional[str]) -> Optional[str]:
+    # Разделитель полей callback_data в строке поиска не допускается
+    prefix = (text or '').replace(SEPARATOR, ' ').strip()
+    prefix = prefix.encode('utf-8')[:MAX_PREFIX_BYTES].decode('utf-8', 'ignore').strip()
+    return prefix or None
+
+
+def _picker_query(source: PickerSource, direction: str, with_prefix: bool) -> str:
+    conditions = [source.condition] if source.condition else []
+    next_param = len(source.params) + (2 if source.scoped else 1)
+    if with_prefix:
+        conditions.append(f"{source.name_column} ILIKE ${next_param}")
+        next_param += 1
+    order = "ASC"
+    if direction in ('n', 'p'):
+        key = f"({source.name_column}, {source.id_column})"
+        anchor = f"(SELECT {source.name_column}, {source.id_column} FROM {source.table} WHERE {source.id_column} = ${next_param})"
+        conditions.append(f"{key} {'>' if direction == 'n' else '<'} {anchor}")
+        next_param += 1
+        if direction == 'p':
+            order = "DESC"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f'''
+        SELECT {source.columns} FROM {source.table}
+        {where}
+        ORDER BY {source.name_column} {order}, {source.id_column} {order}
+        LIMIT ${next_param}
+    '''
+
+
+# Тексты запросов строятся один раз, чтобы asyncpg переиспользовал подготовленные выражения
+_PICKER_QUERIES = {
+    (picker, direction, with_prefix): _picker_query(source, direction, with_prefix)
+    for picker, source in PICKER_SOURCES.items()
+    for direction in ('f', 'n', 'p')
+    for with_prefix in (True, False)
+}
+
+
+async def fetch_picker_page(pool: asyncpg.Pool, picker: str, scope: int = None, cursor: PickerCursor = None,
+                            prefix: str = None, page_size: int = PICKER_PAGE_SIZE) -> PickerPage:
+    source = PICKER_SOURCES[picker]
+    if cursor:
+        prefix = cursor.prefix
+    direction = cursor.direction if cursor and cursor.anchor_id is not None else 'f'
+
+    args = list(source.params)
+    if source.scoped:
+        args.append(scope)
+    if prefix:
+        args.append(f"{escape_like(prefix)}%")
+    if direction != 'f':
+        args.append(cursor.anchor_id)
+    args.append(page_size + 1)
+
+    async with pool.acquire() as conn:
+        rows = [source.record_class(**row) for row in await conn.fetch(_PICKER_QUERIES[(picker, direction, bool(prefix))], *args)]
+    if not rows and direction != 'f':
+        # Запись-ориентир удалили или переименовали — начинаем список сначала
+        return await fetch_picker_page(pool, picker, scope, prefix=prefix, page_size=page_size)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'p':
+        rows.reverse()
+        return PickerPage(picker, rows, prefix, has_prev=has_more, has_next=True)
+    return PickerPage(picker, rows, prefix, has_prev=direction == 'n', has_next=has_more)
+
+
+def picker_cursors(page: PickerPage):
+    id_column = PICKER_SOURCES[page.picker].id_column
+    prev_cursor = next_cursor = None
+    if page.rows and page.has_prev:
+        prev_cursor = PickerCursor(picker=page.picker, direction='p', anchor_id=getattr(page.rows[0], id_column),
+                                   prefix=page.prefix)
+    if page.rows and page.has_next:
+        next_cursor = PickerCursor(picker=page.picker, direction='n', anchor_id=getattr(page.rows[-1], id_column),
+                                   prefix=page.prefix)
+    return prev_cursor, next_cursor
@@ -0,0 +1,95 @@
+# SQL-запросы слоя доступа к данным. asyncpg кэширует подготовленные выражения на каждом соединении по
+# тексту запроса (размер кэша — DB_STATEMENT_CACHE_SIZE), поэтому один и тот же текст разбирается и
+# планируется сервером только при первом выполнении на соединении. Роли и прочие значения передаются
+# параметрами, а не подставляются в текст: иначе каждое значение давало бы отдельное выражение в кэше.
+
+# Пользователи
+_USER_COLUMNS = 'user_id, full_name, role, organization_id'
+USER_BY_ID = f'SELECT {_USER_COLUMNS} FROM users WHERE user_id = $1'
+USERS_BY_IDS = f'SELECT {_USER_COLUMNS} FROM users WHERE user_id = ANY($1::bigint[]) ORDER BY user_id'
+USER_WITH_ROLE = f'SELECT {_USER_COLUMNS} FROM users WHERE user_id = $1 AND role = $2'
+ORGANIZATION_MEMBERS = f'SELECT {_USER_COLUMNS} FROM users WHERE organization_id = $1 AND role = $2'
+ORGANIZATION_MEMBER_IDS = 'SELECT user_id FROM users WHERE organization_id = $1 AND role = $2'
+# Списки для администратора читаются курсором в порядке индекса (full_name, user_id), без сортировки в памяти.
+# Поиск: точное совпадение ID или подстрока в ФИО без учета регистра; NULL вместо строки поиска — все записи.
+USERS_DIRECTORY = '''
+    SELECT u.user_id, u.full_name, u.role, u.organization_id, o.name as organization_name
+    FROM users u
+    LEFT JOIN organizations o ON u.organization_id = o.org_id
+    WHERE u.user_id != $1 AND ($2::text IS NULL OR u.user_id::text = $2 OR u.full_name ILIKE $3)
+    ORDER BY u.full_name, u.user_id
+    LIMIT $4
+'''
+BROADCAST_RECIPIENTS = 'SELECT user_id FROM users WHERE user_id != $1'
+# Уведомления о запуске и остановке бота
+ALL_USER_IDS = 'SELECT user_id FROM users'
+ALL_USER_ROLES = 'SELECT user_id, role FROM users'
+INSERT_USER = f'INSERT INTO users (user_id, full_name, role) VALUES ($1, $2, $3) RETURNING {_USER_COLUMNS}'
+BULK_INSERT_USERS = f'''
+    INSERT INTO users (user_id, full_name, role, organization_id)
+    SELECT * FROM unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::int[])
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING {_USER_COLUMNS}
+'''
+SET_USER_ROLE = 'UPDATE users SET role = $1, organization_id = $2 WHERE user_id = $3'
+
+# Организации
+ORGANIZATIONS_DIRECTORY = '''
+    SELECT org_id, name FROM organizations
+    WHERE $1::text IS NULL OR org_id::text = $1 OR name ILIKE $2
+    ORDER BY name
+    LIMIT $3
+'''
+ORGANIZATION_BY_ID = 'SELECT org_id, name FROM organizations WHERE org_id = $1'
+ORGANIZATIONS_BY_IDS = 'SELECT org_id, name FROM organizations WHERE org_id = ANY($1::int[]) ORDER BY org_id'
+INSERT_ORGANIZATION = 'INSERT INTO organizations (name) VALUES ($1) RETURNING org_id, name'
+BULK_INSERT_ORGANIZATIONS = '''
+    INSERT INTO organizations (name)
+    SELECT * FROM unnest($1::varchar[])
+    ON CONFLICT (name) DO NOTHING
+    RETURNING org_id, name
+'''
+DELETE_ORGANIZATION = 'DELETE FROM organizations WHERE org_id = $1 RETURNING org_id, name'
+RESET_ORGANIZATION_MEMBERS = '''
+    UPDATE users
+    SET role = 'user', organization_id = NULL
+    WHERE organization_id = $1 AND role IN ('employee', 'manager')
+    RETURNING user_id
+'''
+
+# Полный сброс данных администратором
+DELETE_ALL_TASKS = 'DELETE FROM tasks'
+TRUNCATE_TASK_EVENTS = 'TRUNCATE task_events'
+DELETE_NON_ADMIN_USERS = "DELETE FROM users WHERE role != 'admin' RETURNING user_id"
+DELETE_ALL_ORGANIZATIONS = 'DELETE FROM organizations'
+
+# Задачи
+_TASK_COLUMNS = 'task_id, title, description, employee_id, manager_id, organization_id, status, created_at'
+TASK_BY_ID = f'SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = $1'
+TASKS_BY_IDS = f'SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = ANY($1::int[]) ORDER BY task_id'
+EMPLOYEE_TASK = f'SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = $1 AND employee_id = $2'
+EMPLOYEE_TASK_STATUSES = 'SELECT task_id, status FROM tasks WHERE task_id = ANY($1::int[]) AND employee_id = $2'
+# Создание задач записывается в историю как переход в начальный статус, тем же запросом
+BULK_INSERT_TASKS = f'''
+    WITH created AS (
+        INSERT INTO tasks (title, description, employee_id, manager_id, organization_id, status)
+        SELECT title, description, employee_id, manager_id, organization_id, $6
+        FROM unnest($1::varchar[], $2::text[], $3::bigint[], $4::bigint[], $5::int[])
+             AS new_tasks (title, description, employee_id, manager_id, organization_id)
+        RETURNING {_TASK_COLUMNS}
+    ), event AS (
+        INSERT INTO task_events (task_id, actor_id, manager_id, employee_id, old_status, new_status)
+        SELECT task_id, manager_id, manager_id, employee_id, NULL, status FROM created
+    )
+    SELECT {_TASK_COLUMNS} FROM created ORDER BY task_id
+'''
+
+# Невыполненные задачи сотрудника вместе с именем менеджера загружаются один раз при входе в обход
+_PENDING_TASKS = '''
+    SELECT t.task_id, t.title, t.description, t.status, t.created_at, t.manager_id, u.full_name AS manager_name
+    FROM tasks t
+    JOIN users u ON t.manager_id = u.user_id
+    WHERE t.employee_id = $1 AND t.status IN ('new', 'accepted')
+'''
+PENDING_TASKS = f"{_PENDING_TASKS} ORDER BY t.created_at ASC, t.task_id ASC"
+PENDING_TASK = f"{_PENDING_TASKS} AND t.task_id = $2"
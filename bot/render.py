@@ -0,0 +1,231 @@
+import re
+from contextlib import aclosing
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, Union
+
+from aiogram.types import Message
+
+# Ограничение Telegram на длину текста сообщения. Считаем в UTF-16, как сам Telegram,
+# и по исходному HTML — после разбора разметки текст только короче.
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Тег, HTML-сущность или кусок обычного текста
+_HTML_TOKEN = re.compile(r'<(/?)([a-zA-Z][\w-]*)[^>]*>|&#?\w+;|[^<&]+|[<&]')
+
+
+# Символ вне BMP (например, эмодзи) занимает две единицы UTF-16
+MAX_CHAR_LENGTH = 2
+
+
+def text_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _split_text(text: str, capacity: int) -> tuple:
+    # Режем по последнему переводу строки или пробелу, который помещается в capacity
+    head = text[:max(capacity, 0)]
+    while text_length(head) > capacity:
+        head = head[:-1]
+    cut = max(head.rfind('\n'), head.rfind(' '))
+    if cut > 0:
+        head = head[:cut + 1]
+    return head, text[len(head):]
+
+
+def split_html(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    # Делит один слишком длинный блок: незакрытые на границе теги закрываются в конце куска
+    # и открываются заново в начале следующего, сущности вроде &amp; не разрываются.
+    # Теги, которым вместе с закрытием не хватает места в куске, отбрасываются (текст сохраняется),
+    # непарные закрывающие теги тоже: Telegram такую разметку не принимает.
+    # limit должен вмещать самую длинную сущность, остальное гарантированно укладывается в limit.
+    chunks = []
+    stack = []  # [имя, открывающий тег, оставлен ли тег]; отброшенные нужны, чтобы пропустить их закрытие
+    parts, length = [], 0
+    has_text = False  # в куске есть текст или сущности
+    fresh = True  # в куске только заново открытые теги: места хватит хотя бы на один символ
+
+    def kept() -> list:
+        return [entry for entry in stack if entry[2]]
+
+    def closing_tags() -> str:
+        return ''.join(f'</{name}>' for name, _, _ in reversed(kept()))
+
+    def overhead(tags) -> int:
+        # Открыть теги в начале куска и закрыть в конце, оставив место хотя бы на один символ
+        return sum(text_length(tag) + text_length(name) + 3 for name, tag, _ in tags) + MAX_CHAR_LENGTH
+
+    def reopen():
+        nonlocal parts, length
+        parts = [tag for _, tag, _ in kept()]
+        length = sum(text_length(tag) for tag in parts)
+
+    def drop_innermost():
+        kept()[-1][2] = False
+
+    def flush():
+        nonlocal has_text, fresh
+        if has_text:
+            chunks.append(''.join(parts) + closing_tags())
+        while overhead(kept()) > limit:
+            drop_innermost()
+        reopen()
+        has_text, fresh = False, True
+
+    def fits(token_length: int) -> bool:
+        return length + token_length + text_length(closing_tags()) <= limit
+
+    def append(token: str, token_length: int):
+        nonlocal length, fresh
+        parts.append(token)
+        length += token_length
+        fresh = False
+
+    for match in _HTML_TOKEN.finditer(text):
+        token = match.group(0)
+        token_length = text_length(token)
+
+        if match.group(2) is not None:
+            name = match.group(2).lower()
+            if match.group(1) != '/':
+                if not fits(token_length + text_length(name) + 3) and not fresh:
+                    flush()
+                entry = [name, token, overhead(kept() + [[name, token, True]]) <= limit]
+                stack.append(entry)
+                if entry[2]:
+                    append(token, token_length)
+                continue
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    # Место под закрывающий тег оставленного тега уже зарезервировано
+                    if stack[i][2]:
+                        append(token, token_length)
+                    del stack[i]
+                    break
+            continue
+
+        if token.startswith('&'):
+            # Сущность или одиночный спецсимвол не разрываются
+            if not fits(token_length) and not fresh:
+                flush()
+            if not fits(token_length) and kept():
+                while kept() and not fits(token_length):
+                    drop_innermost()
+                reopen()
+            append(token, token_length)
+            has_text = True
+            continue
+
+        while token:
+            if fits(token_length):
+                append(token, token_length)
+                has_text = True
+                break
+            head, token = _split_text(token, limit - length - text_length(closing_tags()))
+            if head:
+                append(head, text_length(head))
+                has_text = True
+            # В свежем куске всегда помещается хотя бы один символ (см. overhead), так что цикл продвигается
+            flush()
+            token_length = text_length(token)
+
+    if has_text:
+        chunks.append(''.join(parts) + closing_tags())
+    return chunks
+
+
+class ChunkBuilder:
+    # Собирает сообщения из готовых блоков (записей), не разрывая блок без необходимости.
+    # Куски копятся в списке и склеиваются один раз, когда сообщение заполнено.
+    def __init__(self, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.limit = limit
+        self._parts = []
+        self._length = 0
+
+    def _flush(self) -> str:
+        chunk = ''.join(self._parts)
+        self._parts, self._length = [], 0
+        return chunk
+
+    def add(self, block: str) -> List[str]:
+        ready = []
+        length = text_length(block)
+        if self._parts and self._length + length > self.limit:
+            ready.append(self._flush())
+        if length > self.limit:
+            pieces = split_html(block, self.limit)
+            ready.extend(pieces[:-1])
+            block = pieces[-1]
+            length = text_length(block)
+        self._parts.append(block)
+        self._length += length
+        return ready
+
+    def finish(self) -> List[str]:
+        return [self._flush()] if self._parts else []
+
+
+def build_chunks(blocks: Iterable[str], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    builder = ChunkBuilder(limit)
+    chunks = []
+    for block in blocks:
+        chunks.extend(builder.add(block))
+    return chunks + builder.finish()
+
+
+async def _iterate(rows: Union[Iterable, AsyncIterable]):
+    if hasattr(rows, '__aiter__'):
+        # Асинхронный источник (например, курсор БД) закрывается сразу, даже если отправка прервалась
+        if hasattr(rows, 'aclose'):
+            async with aclosing(rows):
+                async for row in rows:
+                    yield row
+        else:
+            async for row in rows:
+                yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def send_chunks(send: Callable[..., Awaitable], chunks: List[str], reply_markup=None, **kwargs):
+    # Клавиатура прикрепляется только к последнему сообщению
+    for i, chunk in enumerate(chunks):
+        await send(chunk, reply_markup=reply_markup if i == len(chunks) - 1 else None, **kwargs)
+
+
+async def send_rendered(send: Callable[..., Awaitable], rows: Union[Iterable, AsyncIterable],
+                        render_row: Callable[..., str], header: str = None, empty_text: str = None,
+                        reply_markup=None, **kwargs) -> int:
+    # Сообщения отправляются по мере заполнения, не дожидаясь конца строк. Одно готовое сообщение
+    # придерживается, чтобы прикрепить клавиатуру к последнему. Возвращает число строк.
+    builder = ChunkBuilder()
+    pending = None
+    count = 0
+    async with aclosing(_iterate(rows)) as iterated:
+        async for row in iterated:
+            blocks = [header, render_row(row)] if count == 0 and header else [render_row(row)]
+            count += 1
+            for block in blocks:
+                for chunk in builder.add(block):
+                    if pending is not None:
+                        await send(pending, **kwargs)
+                    pending = chunk
+
+    if not count:
+        if empty_text:
+            await send(empty_text, reply_markup=reply_markup, **kwargs)
+        return 0
+    for chunk in builder.finish():
+        if pending is not None:
+            await send(pending, **kwargs)
+        pending = chunk
+    await send(pending, reply_markup=reply_markup, **kwargs)
+    return count
+
+
+async def edit_chunks(message: Message, chunks: List[str], reply_markup=None, **kwargs):
+    # Помещается в одно сообщение — редактируем его, иначе убираем клавиатуру и досылаем новые
+    if len(chunks) == 1:
+        await message.edit_text(chunks[0], reply_markup=reply_markup, **kwargs)
+        return
+    await message.edit_reply_markup(reply_markup=None)
+    await send_chunks(message.answer, chunks, reply_markup=reply_markup, **kwargs)
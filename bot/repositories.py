@@ -0,0 +1,157 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence
+
+import asyncpg
+
+from config import LIST_CURSOR_PREFETCH
+from models import User, UserWithOrganization, Organization, Task, NewTask, TaskView
+from queries import (
+    USER_BY_ID, USERS_BY_IDS, USER_WITH_ROLE, ORGANIZATION_MEMBERS, ORGANIZATION_MEMBER_IDS, USERS_DIRECTORY,
+    BROADCAST_RECIPIENTS, ALL_USER_IDS, ALL_USER_ROLES, INSERT_USER, BULK_INSERT_USERS, SET_USER_ROLE,
+    RESET_ORGANIZATION_MEMBERS, DELETE_NON_ADMIN_USERS,
+    ORGANIZATIONS_DIRECTORY, ORGANIZATION_BY_ID, ORGANIZATIONS_BY_IDS, INSERT_ORGANIZATION, BULK_INSERT_ORGANIZATIONS,
+    DELETE_ORGANIZATION, DELETE_ALL_ORGANIZATIONS,
+    TASK_BY_ID, TASKS_BY_IDS, EMPLOYEE_TASK, EMPLOYEE_TASK_STATUSES, BULK_INSERT_TASKS, PENDING_TASKS, PENDING_TASK,
+    DELETE_ALL_TASKS, TRUNCATE_TASK_EVENTS,
+)
+from task_status import INITIAL_STATUS
+
+
+def escape_like(text: str) -> str:
+    # Спецсимволы LIKE/ILIKE в пользовательском вводе ищутся как обычные символы
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_args(search: Optional[str]) -> tuple:
+    # Строка поиска для сравнения с ID и шаблон ILIKE по подстроке
+    if not search:
+        return None, None
+    return search, f'%{escape_like(search)}%'
+
+
+class Repository:
+    # Работает поверх соединения (в том числе внутри транзакции) или пула:
+    # у обоих есть fetch/execute
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+
+    async def _one(self, record_class, query: str, *args):
+        row = await self.conn.fetchrow(query, *args)
+        return record_class(**row) if row else None
+
+    async def _all(self, record_class, query: str, *args) -> list:
+        return [record_class(**row) for row in await self.conn.fetch(query, *args)]
+
+    async def _ids(self, query: str, *args) -> List[int]:
+        return [row[0] for row in await self.conn.fetch(query, *args)]
+
+    async def _stream(self, record_class, query: str, *args) -> AsyncIterator:
+        # Серверный курсор: строки приходят пачками по LIST_CURSOR_PREFETCH,
+        # в памяти только текущая пачка.
+        # Курсор живет внутри транзакции, поэтому соединение занято до конца обхода.
+        async with self.conn.transaction():
+            async for row in self.conn.cursor(query, *args, prefetch=LIST_CURSOR_PREFETCH):
+                yield record_class(**row)
+
+
+class UserRepository(Repository):
+    async def get(self, user_id: int) -> Optional[User]:
+        return await self._one(User, USER_BY_ID, user_id)
+
+    async def get_many(self, user_ids: Iterable[int]) -> List[User]:
+        return await self._all(User, USERS_BY_IDS, list(user_ids))
+
+    async def get_with_role(self, user_id: int, role: str) -> Optional[User]:
+        return await self._one(User, USER_WITH_ROLE, user_id, role)
+
+    async def organization_members(self, organization_id: int, role: str) -> List[User]:
+        return await self._all(User, ORGANIZATION_MEMBERS, organization_id, role)
+
+    async def organization_member_ids(self, organization_id: int, role: str) -> List[int]:
+        return await self._ids(ORGANIZATION_MEMBER_IDS, organization_id, role)
+
+    def stream_all_except(self, user_id: int, search: str = None,
+                          limit: int = None) -> AsyncIterator[UserWithOrganization]:
+        return self._stream(UserWithOrganization, USERS_DIRECTORY, user_id, *_search_args(search), limit)
+
+    async def ids_except(self, user_id: int) -> List[int]:
+        return await self._ids(BROADCAST_RECIPIENTS, user_id)
+
+    async def all_ids(self) -> List[int]:
+        return await self._ids(ALL_USER_IDS)
+
+    async def all_roles(self) -> Dict[int, str]:
+        return {row['user_id']: row['role'] for row in await self.conn.fetch(ALL_USER_ROLES)}
+
+    async def insert(self, user_id: int, full_name: str, role: str = 'user') -> User:
+        return await self._one(User, INSERT_USER, user_id, full_name, role)
+
+    async def bulk_insert(self, users: Sequence[User]) -> List[User]:
+        # Одним запросом через unnest; уже существующие пользователи пропускаются
+        # и не попадают в результат
+        return await self._all(User, BULK_INSERT_USERS,
+                               [user.user_id for user in users], [user.full_name for user in users],
+                               [user.role for user in users], [user.organization_id for user in users])
+
+    async def set_role(self, user_id: int, role: str, organization_id: int = None):
+        await self.conn.execute(SET_USER_ROLE, role, organization_id, user_id)
+
+    async def reset_organization(self, organization_id: int) -> List[int]:
+        return await self._ids(RESET_ORGANIZATION_MEMBERS, organization_id)
+
+    async def delete_all_except_admins(self) -> List[int]:
+        return await self._ids(DELETE_NON_ADMIN_USERS)
+
+
+class OrganizationRepository(Repository):
+    def stream(self, search: str = None, limit: int = None) -> AsyncIterator[Organization]:
+        return self._stream(Organization, ORGANIZATIONS_DIRECTORY, *_search_args(search), limit)
+
+    async def get(self, org_id: int) -> Optional[Organization]:
+        return await self._one(Organization, ORGANIZATION_BY_ID, org_id)
+
+    async def get_many(self, org_ids: Iterable[int]) -> List[Organization]:
+        return await self._all(Organization, ORGANIZATIONS_BY_IDS, list(org_ids))
+
+    async def insert(self, name: str) -> Organization:
+        return await self._one(Organization, INSERT_ORGANIZATION, name)
+
+    async def bulk_insert(self, names: Sequence[str]) -> List[Organization]:
+        return await self._all(Organization, BULK_INSERT_ORGANIZATIONS, list(names))
+
+    async def delete(self, org_id: int) -> Optional[Organization]:
+        return await self._one(Organization, DELETE_ORGANIZATION, org_id)
+
+    async def delete_all(self):
+        await self.conn.execute(DELETE_ALL_ORGANIZATIONS)
+
+
+class TaskRepository(Repository):
+    async def get(self, task_id: int) -> Optional[Task]:
+        return await self._one(Task, TASK_BY_ID, task_id)
+
+    async def get_many(self, task_ids: Iterable[int]) -> List[Task]:
+        return await self._all(Task, TASKS_BY_IDS, list(task_ids))
+
+    async def get_for_employee(self, task_id: int, employee_id: int) -> Optional[Task]:
+        return await self._one(Task, EMPLOYEE_TASK, task_id, employee_id)
+
+    async def statuses_for_employee(self, task_ids: Iterable[int], employee_id: int) -> Dict[int, str]:
+        rows = await self.conn.fetch(EMPLOYEE_TASK_STATUSES, list(task_ids), employee_id)
+        return {row['task_id']: row['status'] for row in rows}
+
+    async def pending_for_employee(self, employee_id: int) -> List[TaskView]:
+        return await self._all(TaskView, PENDING_TASKS, employee_id)
+
+    async def get_pending(self, employee_id: int, task_id: int) -> Optional[TaskView]:
+        return await self._one(TaskView, PENDING_TASK, employee_id, task_id)
+
+    async def bulk_insert(self, tasks: Sequence[NewTask]) -> List[Task]:
+        return await self._all(Task, BULK_INSERT_TASKS,
+                               [task.title for task in tasks], [task.description for task in tasks],
+                               [task.employee_id for task in tasks], [task.manager_id for task in tasks],
+                               [task.organization_id for task in tasks], INITIAL_STATUS)
+
+    async def delete_all(self):
+        # История статусов хранится без внешних ключей и очищается вместе с задачами
+        await self.conn.execute(DELETE_ALL_TASKS)
+        await self.conn.execute(TRUNCATE_TASK_EVENTS)
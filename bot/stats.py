@@ -0,0 +1,61 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import asyncpg
+
+from config import STATS_REFRESH_INTERVAL
+
+app_logger = logging.getLogger('app')
+
+
+@dataclass
+class StatisticsSnapshot:
+    total_users: int
+    total_organizations: int
+    total_tasks: int
+    total_managers: int
+    total_employees: int
+    tasks_by_status: list
+    tasks_per_organization: list
+    tasks_by_manager: list
+    tasks_completed_by_employee: list
+    refreshed_at: datetime
+
+
+async def get_statistics(pool: asyncpg.Pool) -> StatisticsSnapshot:
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow('SELECT * FROM statistics_snapshot')
+    return StatisticsSnapshot(
+        total_users=row['total_users'],
+        total_organizations=row['total_organizations'],
+        total_tasks=row['total_tasks'],
+        total_managers=row['total_managers'],
+        total_employees=row['total_employees'],
+        tasks_by_status=json.loads(row['tasks_by_status']),
+        tasks_per_organization=json.loads(row['tasks_per_organization']),
+        tasks_by_manager=json.loads(row['tasks_by_manager']),
+        tasks_completed_by_employee=json.loads(row['tasks_completed_by_employee']),
+        refreshed_at=row['refreshed_at'],
+    )
+
+
+async def refresh_statistics(pool: asyncpg.Pool):
+    async with pool.acquire() as conn:
+        # CONCURRENTLY не блокирует чтение снимка на время пересчета
+        await conn.execute('REFRESH MATERIALIZED VIEW CONCURRENTLY statistics_snapshot')
+
+
+async def run_statistics_refresh(pool: asyncpg.Pool, interval: float = STATS_REFRESH_INTERVAL):
+    while True:
+        try:
+            await refresh_statistics(pool)
+        except Exception as e:
+            app_logger.error(f"Ошибка при обновлении статистики: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_statistics_refresh(pool: asyncpg.Pool) -> asyncio.Task:
+    return asyncio.create_task(run_statistics_refresh(pool))
@@ -0,0 +1,144 @@
+import asyncio
+import importlib.util
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from cache import TTLCache
+from config import (FSM_STORAGE, REDIS_URL, FSM_STATE_TTL, FSM_CACHE_TTL, FSM_CACHE_MAX_SIZE,
+                    FSM_CLEANUP_INTERVAL)
+
+app_logger = logging.getLogger('app')
+
+_MISSING = object()
+
+FSM_STORAGES = ('postgres', 'redis', 'memory')
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, pool: asyncpg.Pool, state_ttl: int = FSM_STATE_TTL, key_builder: KeyBuilder = None):
+        self.pool = pool
+        self.state_ttl = state_ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO fsm_storage (key, state, updated_at) VALUES ($1, $2, CURRENT_TIMESTAMP)
+                ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            ''', self.key_builder.build(key), _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval('''
+                SELECT state FROM fsm_storage
+                WHERE key = $1 AND updated_at > CURRENT_TIMESTAMP - make_interval(secs => $2)
+            ''', self.key_builder.build(key), self.state_ttl)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO fsm_storage (key, data, updated_at) VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP)
+                ON CONFLICT (key) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+            ''', self.key_builder.build(key), json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        async with self.pool.acquire() as conn:
+            raw = await conn.fetchval('''
+                SELECT data FROM fsm_storage
+                WHERE key = $1 AND updated_at > CURRENT_TIMESTAMP - make_interval(secs => $2)
+            ''', self.key_builder.build(key), self.state_ttl)
+        return json.loads(raw) if raw else {}
+
+    async def purge_expired(self) -> int:
+        async with self.pool.acquire() as conn:
+            result = await conn.execute('''
+                DELETE FROM fsm_storage
+                WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                   OR (state IS NULL AND data = '{}'::jsonb)
+            ''', self.state_ttl)
+        return int(result.split()[-1])
+
+    async def run_cleanup(self, interval: float = FSM_CLEANUP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    app_logger.info(f"Удалено устаревших FSM-состояний: {purged}")
+            except Exception as e:
+                app_logger.error(f"Ошибка при очистке FSM-состояний: {e}")
+
+    async def close(self) -> None:
+        pass
+
+
+class CachedStorage(BaseStorage):
+    # Локальный write-through кэш поверх любого хранилища: запись идет сразу в хранилище и в кэш,
+    # чтение из кэша. Корректен, пока апдейты одного чата обрабатывает один процесс.
+    def __init__(self, storage: BaseStorage, ttl: float = FSM_CACHE_TTL, max_size: int = FSM_CACHE_MAX_SIZE):
+        self.storage = storage
+        self._states = TTLCache(ttl, max_size)
+        self._data = TTLCache(ttl, max_size)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+        self._states.set(key, _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state = self._states.get(key, _MISSING)
+        if state is _MISSING:
+            state = await self.storage.get_state(key)
+            self._states.set(key, state)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+        self._data.set(key, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = self._data.get(key, _MISSING)
+        if data is _MISSING:
+            data = await self.storage.get_data(key)
+            self._data.set(key, data.copy())
+        return data.copy()
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+def check_fsm_storage_config():
+    if FSM_STORAGE not in FSM_STORAGES:
+        raise ValueError(f"Неизвестный тип FSM-хранилища: {FSM_STORAGE}, ожидается одно из: {', '.join(FSM_STORAGES)}")
+    # redis — необязательная зависимость, нужна только для этого режима
+    if FSM_STORAGE == 'redis' and importlib.util.find_spec('redis') is None:
+        raise ValueError("Для FSM_STORAGE=redis необходим пакет redis: pip install -r requirements-redis.txt")
+
+
+def create_fsm_storage(pool: asyncpg.Pool) -> BaseStorage:
+    check_fsm_storage_config()
+    if FSM_STORAGE == 'memory':
+        return MemoryStorage()
+    if FSM_STORAGE == 'redis':
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(REDIS_URL, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    else:
+        storage = PostgresStorage(pool)
+    return CachedStorage(storage) if FSM_CACHE_TTL > 0 else storage
+
+
+def start_storage_cleanup(storage: BaseStorage) -> Optional[asyncio.Task]:
+    if isinstance(storage, CachedStorage):
+        storage = storage.storage
+    if isinstance(storage, PostgresStorage):
+        return asyncio.create_task(storage.run_cleanup())
+    return None
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from datetime import date
+
+import asyncpg
+
+from config import TASK_EVENTS_PARTITIONS_AHEAD
+
+app_logger = logging.getLogger('app')
+
+# Проверять наличие секций раз в сутки более чем достаточно: они создаются на несколько месяцев вперед
+PARTITION_CHECK_INTERVAL = 24 * 60 * 60
+# После сбоя (недоступна БД, таймаут пула) следующая попытка — не через сутки, а раньше
+PARTITION_RETRY_INTERVAL = 5 * 60
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+async def create_task_event_partitions(conn: asyncpg.Connection, first_month: date, count: int):
+    for i in range(count):
+        start = _add_months(first_month, i)
+        end = _add_months(start, 1)
+        name = f"task_events_y{start.year}m{start.month:02d}"
+        await conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} PARTITION OF task_events
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        ''')
+
+
+async def ensure_task_event_partitions(pool: asyncpg.Pool, months_ahead: int = TASK_EVENTS_PARTITIONS_AHEAD):
+    # Секции по умолчанию нет: событие за месяц без секции не запишется и сорвет смену статуса задачи,
+    # поэтому ошибка здесь при запуске бота фатальна. Прошлый месяц — на случай, если часы БД
+    # в другом часовом поясе и там еще не наступил текущий.
+    first_month = _add_months(date.today().replace(day=1), -1)
+    async with pool.acquire() as conn:
+        await create_task_event_partitions(conn, first_month, months_ahead + 2)
+
+
+async def run_partition_maintenance(pool: asyncpg.Pool, interval: float = PARTITION_CHECK_INTERVAL):
+    delay = interval
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await ensure_task_event_partitions(pool)
+            delay = interval
+        except Exception as e:
+            # Без секций на следующие месяцы вставка в task_events перестанет работать, поэтому цикл не должен умирать
+            app_logger.error(f"Ошибка обслуживания секций истории задач: {e}")
+            delay = min(interval, PARTITION_RETRY_INTERVAL)
+
+
+def start_partition_maintenance(pool: asyncpg.Pool) -> asyncio.Task:
+    return asyncio.create_task(run_partition_maintenance(pool))
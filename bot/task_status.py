@@ -0,0 +1,65 @@
+from typing import Optional
+
+import asyncpg
+
+from models import TaskStatusChange
+
+INITIAL_STATUS = 'new'
+
+# Разрешенные переходы статусов задачи: из какого статуса в какие можно перейти.
+# Выполненная и отказанная задачи — конечные, из них переходов нет.
+TRANSITIONS = {
+    'new': ('accepted', 'completed', 'rejected'),
+    'accepted': ('completed', 'rejected'),
+    'completed': (),
+    'rejected': (),
+}
+
+FINAL_STATUSES = frozenset(status for status, targets in TRANSITIONS.items() if not targets)
+
+# Для каждого целевого статуса — из каких статусов в него можно попасть
+ALLOWED_FROM = {
+    target: [status for status, targets in TRANSITIONS.items() if target in targets]
+    for target in TRANSITIONS
+}
+
+STATUS_EMOJIS = {
+    'new': '🆕',
+    'accepted': '✅',
+    'completed': '🎉',
+    'rejected': '❌'
+}
+
+STATUS_NAMES = {
+    'new': 'Новая',
+    'accepted': 'Принята',
+    'completed': 'Выполнена',
+    'rejected': 'Отказана'
+}
+
+# Родительный падеж множественного числа: «Новых: 5»
+STATUS_COUNT_NAMES = {
+    'new': 'Новых',
+    'accepted': 'Принятых',
+    'completed': 'Выполненных',
+    'rejected': 'Отказанных'
+}
+
+
+async def transition_task(conn: asyncpg.Connection, task_id: int, employee_id: int,
+                          new_status: str) -> Optional[TaskStatusChange]:
+    # Проверка владельца, допустимости перехода, смена статуса и запись в историю — одним запросом.
+    # Возвращает None, если задача не принадлежит сотруднику или переход уже невозможен.
+    row = await conn.fetchrow('''
+        WITH changed AS (
+            UPDATE tasks t SET status = $1
+            FROM (SELECT task_id, status FROM tasks WHERE task_id = $2 FOR UPDATE) old
+            WHERE t.task_id = old.task_id AND t.employee_id = $3 AND t.status = ANY($4::varchar[])
+            RETURNING t.task_id, t.title, t.manager_id, t.employee_id, old.status AS old_status, t.status AS new_status
+        ), event AS (
+            INSERT INTO task_events (task_id, actor_id, manager_id, employee_id, old_status, new_status)
+            SELECT task_id, $3, manager_id, employee_id, old_status, new_status FROM changed
+        )
+        SELECT task_id, title, manager_id, old_status FROM changed
+    ''', new_status, task_id, employee_id, ALLOWED_FROM.get(new_status, []))
+    return TaskStatusChange(**row) if row else None
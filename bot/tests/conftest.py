@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Модули бота импортируются как верхнеуровневые (запуск из папки bot), config требует эти переменные
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '123456:test')
+os.environ.setdefault('ADMIN_ID', '1')
@@ -0,0 +1,39 @@
+from contextlib import asynccontextmanager
+
+
+class FakeConnection:
+    # Записывает запросы и отвечает заранее заданными результатами по порядку.
+    # Результат может быть функцией от (query, args) — для ответов, зависящих от аргументов
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.calls = []
+
+    def _result(self, query, args):
+        self.calls.append((query, args))
+        result = self.results.pop(0) if self.results else None
+        return result(query, args) if callable(result) else result
+
+    async def fetch(self, query, *args):
+        return self._result(query, args) or []
+
+    async def fetchrow(self, query, *args):
+        return self._result(query, args)
+
+    async def fetchval(self, query, *args):
+        return self._result(query, args)
+
+    async def execute(self, query, *args):
+        return self._result(query, args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakePool:
+    def __init__(self, results=()):
+        self.conn = FakeConnection(results)
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
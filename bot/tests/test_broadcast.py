@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+import broadcast
+from broadcast import ChatRateLimiter, TokenBucket
+
+
+class FakeClock:
+    # Время идет только во время sleep, поэтому проверки не зависят от скорости машины
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        # Как и настоящий sleep, занимает хоть сколько-то времени: иначе поправка в 1e-17 с
+        # не меняет float и бакет навсегда остается чуть меньше одного токена
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(broadcast.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(broadcast.asyncio, 'sleep', clock.sleep)
+    return clock
+
+
+def test_burst_up_to_capacity_without_waiting(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+
+    async def run():
+        for _ in range(5):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    assert clock.sleeps == []
+
+
+def test_rate_is_enforced_after_burst(clock):
+    bucket = TokenBucket(rate=10)
+    started = clock.now
+
+    async def run():
+        for _ in range(30):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    # 10 токенов сразу, остальные 20 — по 0.1 с
+    assert clock.now - started == pytest.approx(2.0, abs=1e-3)
+
+
+def test_refill_is_capped_by_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    clock.now += 60
+
+    async def run():
+        for _ in range(4):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    assert sum(clock.sleeps) == pytest.approx(0.1, abs=1e-5)
+
+
+def test_penalize_makes_everyone_wait(clock):
+    bucket = TokenBucket(rate=10, capacity=10)
+    bucket.penalize(3)
+    started = clock.now
+
+    asyncio.run(bucket.acquire())
+    # Бакет уведен в минус на 3 с работы и еще нужен один токен
+    assert clock.now - started == pytest.approx(3.1, abs=1e-3)
+
+
+def test_chat_rate_limiter_spaces_messages_per_chat(clock):
+    limiter = ChatRateLimiter(interval=1)
+
+    async def run():
+        await limiter.acquire(1)
+        await limiter.acquire(2)
+        await limiter.acquire(1)
+
+    asyncio.run(run())
+    assert clock.sleeps == [pytest.approx(1)]
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import cache
+from cache import TTLCache, UserProfile, get_user_profile, invalidate_user
+from fakes import FakePool
+
+
+@pytest.fixture
+def now(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    profiles = TTLCache(ttl=60, max_size=10)
+    monkeypatch.setattr(cache, 'user_profiles', profiles)
+    return profiles
+
+
+def test_entry_expires_after_ttl(now):
+    ttl_cache = TTLCache(ttl=10, max_size=10)
+    ttl_cache.set('a', 1)
+    now[0] += 10
+    assert ttl_cache.get('a') == 1
+    now[0] += 0.1
+    assert ttl_cache.get('a', 'missing') == 'missing'
+    assert len(ttl_cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    ttl_cache = TTLCache(ttl=60, max_size=2)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+    ttl_cache.get('a')
+    ttl_cache.set('c', 3)
+    assert ttl_cache.get('b') is None
+    assert (ttl_cache.get('a'), ttl_cache.get('c')) == (1, 3)
+
+
+def test_cached_none_differs_from_missing():
+    ttl_cache = TTLCache(ttl=60, max_size=2)
+    ttl_cache.set('a', None)
+    assert ttl_cache.get('a', 'missing') is None
+
+
+def test_invalidate_drops_entry_and_rejects_stale_set():
+    ttl_cache = TTLCache(ttl=60, max_size=10)
+    ttl_cache.set('a', 1)
+    generation = ttl_cache.generation('a')
+    ttl_cache.invalidate('a')
+    assert ttl_cache.get('a') is None
+    assert not ttl_cache.set('a', 1, generation)
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.set('a', 2, ttl_cache.generation('a'))
+    assert ttl_cache.get('a') == 2
+
+
+def test_stale_set_rejected_after_generation_is_evicted():
+    ttl_cache = TTLCache(ttl=60, max_size=2)
+    generation = ttl_cache.generation('a')
+    ttl_cache.invalidate('a')
+    for key in 'bcd':
+        ttl_cache.invalidate(key)
+    assert not ttl_cache.set('a', 1, generation)
+
+
+def test_clear_rejects_reads_started_before_it():
+    ttl_cache = TTLCache(ttl=60, max_size=10)
+    generation = ttl_cache.generation('a')
+    ttl_cache.clear()
+    assert not ttl_cache.set('a', 1, generation)
+
+
+def _user_row(role: str) -> dict:
+    return dict(user_id=5, full_name='user', role=role, organization_id=None)
+
+
+def test_profile_is_read_once(profiles):
+    pool = FakePool([_user_row('manager')])
+    first = asyncio.run(get_user_profile(5, pool))
+    second = asyncio.run(get_user_profile(5, pool))
+    assert first == second == UserProfile(5, 'manager', None)
+    assert len(pool.conn.calls) == 1
+
+
+def test_unregistered_user_is_cached(profiles):
+    pool = FakePool([None])
+    assert asyncio.run(get_user_profile(5, pool)) is None
+    assert asyncio.run(get_user_profile(5, pool)) is None
+    assert len(pool.conn.calls) == 1
+
+
+def test_invalidation_during_read_is_not_overwritten(profiles):
+    def demote_while_reading(query, args):
+        # Роль сняли, пока шел запрос: ответ базы уже устарел
+        invalidate_user(5)
+        return _user_row('admin')
+
+    pool = FakePool([demote_while_reading, _user_row('user')])
+    assert asyncio.run(get_user_profile(5, pool)).role == 'admin'
+    assert asyncio.run(get_user_profile(5, pool)).role == 'user'
+    assert len(pool.conn.calls) == 2
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram import F
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery, User
+
+import callbacks
+from callbacks import (CALLBACK_VERSION, AnalyticsWindow, AssignManagerUser, CallbackTableRouter, CancelAction,
+                       ChangeTaskStatus, SetTaskStatus, callback_prefix, encode_int)
+from pickers import PickerCursor
+
+USER = User(id=1, is_bot=False, first_name='test')
+TELEGRAM_CALLBACK_LIMIT = 64
+
+
+def _event(data: str) -> CallbackQuery:
+    return CallbackQuery(id='1', from_user=USER, chat_instance='test', data=data)
+
+
+@pytest.mark.parametrize('value', [0, 1, 35, 36, 123456789, 10 ** 12, -42])
+def test_encode_int_is_base36(value):
+    assert int(encode_int(value), 36) == value
+
+
+def test_pack_is_compact_and_versioned():
+    assert AssignManagerUser(user_id=123456789).pack() == f'mu{CALLBACK_VERSION}:21i3v9'
+    assert CancelAction().pack() == f'x{CALLBACK_VERSION}'
+    assert SetTaskStatus(status='accepted', task_id=100).pack() == f'st{CALLBACK_VERSION}:a:2s'
+
+
+@pytest.mark.parametrize('factory', [
+    AssignManagerUser(user_id=10 ** 15),
+    SetTaskStatus(status='rejected', task_id=2 ** 31),
+    ChangeTaskStatus(task_id=2 ** 31),
+    AnalyticsWindow(days=365),
+    PickerCursor(picker='am', direction='n', anchor_id=10 ** 15, prefix='я' * 16),
+])
+def test_round_trip_within_telegram_limit(factory):
+    packed = factory.pack()
+    assert len(packed.encode('utf-8')) <= TELEGRAM_CALLBACK_LIMIT
+    assert type(factory).unpack(packed) == factory
+
+
+def test_task_page_cursor_round_trip_keeps_microseconds():
+    from pagination import TaskPageCursor
+    cursor = TaskPageCursor(scope='m', status=None, direction='n',
+                            created_at=datetime(2026, 3, 1, 12, 30, 15, 123456), task_id=987654)
+    packed = cursor.pack()
+    assert len(packed) <= TELEGRAM_CALLBACK_LIMIT
+    assert TaskPageCursor.unpack(packed) == cursor
+
+
+def test_unpack_rejects_other_prefix_and_old_version():
+    with pytest.raises(ValueError):
+        AssignManagerUser.unpack(ChangeTaskStatus(task_id=1).pack())
+    with pytest.raises(ValueError):
+        AssignManagerUser.unpack('mu0:1')
+
+
+def test_callback_prefix():
+    assert callback_prefix('st1:a:2s') == 'st1'
+    assert callback_prefix('x1') == 'x1'
+    assert callback_prefix(None) is None
+
+
+def _router(calls: list) -> CallbackTableRouter:
+    router = CallbackTableRouter()
+
+    async def any_callback(callback_query: CallbackQuery):
+        calls.append('any')
+
+    async def set_status(callback_query: CallbackQuery, callback_data: SetTaskStatus):
+        calls.append(('status', callback_data.status, callback_data.task_id))
+
+    async def change_status(callback_query: CallbackQuery, callback_data: ChangeTaskStatus):
+        calls.append(('change', callback_data.task_id))
+
+    router.callback_query.register(set_status, SetTaskStatus.filter(F.status == 'completed'))
+    router.callback_query.register(any_callback, F.data == 'legacy')
+    router.callback_query.register(change_status, ChangeTaskStatus.filter())
+    router.callback_query.register(any_callback)
+    router.callback_query.register(set_status, SetTaskStatus.filter())
+    return router
+
+
+def _dispatch(router: CallbackTableRouter, data: str):
+    return asyncio.run(router.propagate_event('callback_query', _event(data)))
+
+
+@pytest.mark.parametrize('table_dispatch', [True, False])
+def test_dispatch_preserves_registration_order(monkeypatch, table_dispatch):
+    monkeypatch.setattr(callbacks, 'TABLE_DISPATCH', table_dispatch)
+    calls = []
+    router = _router(calls)
+    _dispatch(router, SetTaskStatus(status='completed', task_id=7).pack())
+    _dispatch(router, ChangeTaskStatus(task_id=8).pack())
+    # Обработчик без фабрики зарегистрирован раньше второго обработчика SetTaskStatus и перехватывает нажатие
+    _dispatch(router, SetTaskStatus(status='accepted', task_id=9).pack())
+    _dispatch(router, 'unknown')
+    assert calls == [('status', 'completed', 7), ('change', 8), 'any', 'any']
+
+
+def test_unmatched_callback_is_unhandled():
+    router = CallbackTableRouter()
+
+    async def change_status(callback_query: CallbackQuery):
+        pass
+
+    router.callback_query.register(change_status, ChangeTaskStatus.filter())
+    assert _dispatch(router, 'change_task_direct_5') is UNHANDLED
+    assert _dispatch(router, AssignManagerUser(user_id=1).pack()) is UNHANDLED
@@ -0,0 +1,139 @@
+import asyncio
+import random
+from datetime import datetime
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, InlineQuery, Message, Update, User
+
+from cluster import ChatSerializer, Cluster, shard_key
+
+USER = User(id=77, is_bot=False, first_name='test')
+
+
+def _message_update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(id=chat_id, type='private' if chat_id > 0 else 'supergroup')
+    return Update(update_id=update_id, message=Message(message_id=update_id, date=datetime(2026, 3, 1), chat=chat,
+                                                       from_user=USER, text='hi'))
+
+
+class FakeQueue:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def _cluster(size: int) -> Cluster:
+    # Без запуска процессов: проверяется только раздача апдейтов по очередям
+    fake = object.__new__(Cluster)
+    fake.size = size
+    fake.queues = [FakeQueue() for _ in range(size)]
+    return fake
+
+
+def test_shard_key_prefers_chat_then_user():
+    assert shard_key(_message_update(1, 500)) == 500
+    callback = CallbackQuery(id='1', from_user=USER, chat_instance='x', data='x1',
+                             message=_message_update(2, -100123).message)
+    assert shard_key(Update(update_id=2, callback_query=callback)) == -100123
+    inline = InlineQuery(id='1', from_user=USER, query='', offset='')
+    assert shard_key(Update(update_id=3, inline_query=inline)) == USER.id
+
+
+@pytest.mark.parametrize('chat_id', [1, 500, 123456789, -1001234567890])
+def test_chat_always_goes_to_same_worker(chat_id):
+    fake = _cluster(4)
+    for update_id in range(20):
+        fake.dispatch(_message_update(update_id, chat_id), {'update_id': update_id})
+    used = [index for index, queue in enumerate(fake.queues) if queue.items]
+    assert used == [chat_id % 4]
+    assert [data['update_id'] for _, data in fake.queues[used[0]].items] == list(range(20))
+
+
+def test_chats_are_spread_over_workers():
+    fake = _cluster(4)
+    for chat_id in range(100):
+        fake.dispatch(_message_update(chat_id, chat_id), {})
+    assert [len(queue.items) for queue in fake.queues] == [25, 25, 25, 25]
+
+
+def test_serializer_keeps_per_chat_order_under_concurrent_feeds():
+    rng = random.Random(42)
+    serializer = ChatSerializer()
+    handled = {1: [], 2: []}
+    running = set()
+    overlapped = []
+
+    async def feed(chat_id: int, number: int):
+        running.add(chat_id)
+        overlapped.append(len(running) > 1)
+        await asyncio.sleep(rng.random() / 1000)
+        handled[chat_id].append(number)
+        running.discard(chat_id)
+
+    async def run():
+        tasks = [asyncio.create_task(serializer.run(chat_id, feed, chat_id, number))
+                 for number in range(20) for chat_id in (1, 2)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert handled == {1: list(range(20)), 2: list(range(20))}
+    # Разные чаты обрабатывались параллельно
+    assert any(overlapped)
+    assert serializer._locks == {}
+
+
+def test_serializer_releases_chat_after_error():
+    serializer = ChatSerializer()
+
+    async def fail():
+        raise RuntimeError('handler failed')
+
+    async def ok():
+        return 'ok'
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await serializer.run(1, fail)
+        return await serializer.run(1, ok)
+
+    assert asyncio.run(run()) == 'ok'
+    assert serializer._locks == {}
+
+
+class FakeProcess:
+    def __init__(self, alive: bool):
+        self.alive = alive
+        self.exitcode = None if alive else 1
+        self.started = False
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def start(self):
+        self.started = True
+
+
+def test_supervisor_restarts_dead_workers(monkeypatch):
+    fake = _cluster(2)
+    healthy = FakeProcess(alive=True)
+    fake.processes = [healthy, FakeProcess(alive=False)]
+    spawned = []
+
+    def spawn(index):
+        spawned.append(index)
+        return FakeProcess(alive=True)
+
+    monkeypatch.setattr(fake, '_spawn', spawn)
+
+    async def run():
+        supervisor = asyncio.create_task(fake.supervise(interval=0))
+        await asyncio.sleep(0.01)
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+
+    asyncio.run(run())
+    assert spawned == [1]
+    assert fake.processes[0] is healthy
+    assert fake.processes[1].started
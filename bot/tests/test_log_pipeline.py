@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import queue
+import time
+
+import log_pipeline
+from log_pipeline import BoundedQueueHandler
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.makeLogRecord({'name': 'app', 'levelno': logging.INFO, 'levelname': 'INFO', 'msg': message})
+
+
+def test_drop_reports_lost_records_once_there_is_room():
+    log_queue = queue.Queue(maxsize=2)
+    handler = BoundedQueueHandler(log_queue, policy='drop')
+    for message in ('first', 'second', 'lost'):
+        handler.emit(_record(message))
+    assert handler.dropped == 1
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    handler.emit(_record('third'))
+    assert log_queue.get_nowait().getMessage() == 'third'
+    assert 'потеряно записей: 1' in log_queue.get_nowait().getMessage()
+    assert handler.dropped == 0
+
+
+def test_block_never_waits_inside_event_loop(monkeypatch):
+    monkeypatch.setattr(log_pipeline, 'LOG_QUEUE_BLOCK_TIMEOUT', 5)
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1), policy='block')
+
+    async def log_from_handler():
+        started = time.monotonic()
+        handler.emit(_record('first'))
+        handler.emit(_record('lost'))
+        return time.monotonic() - started
+
+    assert asyncio.run(log_from_handler()) < 1
+    assert handler.dropped == 1
+
+
+def test_block_waits_outside_event_loop(monkeypatch):
+    monkeypatch.setattr(log_pipeline, 'LOG_QUEUE_BLOCK_TIMEOUT', 0.2)
+    handler = BoundedQueueHandler(queue.Queue(maxsize=1), policy='block')
+    handler.emit(_record('first'))
+    started = time.monotonic()
+    handler.emit(_record('lost'))
+    assert time.monotonic() - started >= 0.2
+    assert handler.dropped == 1
@@ -0,0 +1,25 @@
+import asyncio
+import re
+
+from fakes import FakeConnection
+from migrations import MIGRATIONS, apply_migrations
+
+
+def test_versions_are_sequential():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_each_index_is_created_once_and_never_dropped():
+    sql = '\n'.join(sql for _, _, sql in MIGRATIONS)
+    created = re.findall(r'CREATE (?:UNIQUE )?INDEX IF NOT EXISTS (\w+)', sql)
+    assert len(created) == len(set(created))
+    assert 'DROP INDEX' not in sql
+
+
+def test_lock_is_taken_before_any_ddl():
+    conn = FakeConnection()
+    asyncio.run(apply_migrations(conn))
+    queries = [query for query, _ in conn.calls]
+    assert 'pg_advisory_lock' in queries[0]
+    assert 'pg_advisory_unlock' in queries[-1]
+    assert len([query for query in queries if 'INSERT INTO schema_migrations' in query]) == len(MIGRATIONS)
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+
+import broadcast
+import outbox
+from config import OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS
+from fakes import FakePool
+
+STARTED = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    # Отчеты уходят одному автору: общий лимитер процесса заставил бы тесты ждать между ними
+    monkeypatch.setattr(broadcast, 'rate_limiter', broadcast.RateLimiter(rate=1000, per_chat_interval=0))
+
+
+class FakeBot:
+    def __init__(self, edit_error: Exception = None):
+        self.sent = []
+        self.edited = []
+        self.edit_error = edit_error
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        if self.edit_error:
+            raise self.edit_error
+        self.edited.append((chat_id, message_id, text))
+
+
+def _broadcast_row(sent: int, failed: int, total: int = 3, finished: bool = True, progress_due: bool = False,
+                   created_by: int = 42, progress_message_id: int = None) -> dict:
+    return dict(kind='broadcast', created_by=created_by, total=total, sent=sent, failed=failed, started_at=STARTED,
+                finished_at=datetime(2026, 3, 1, 12, 5) if finished else None,
+                progress_message_id=progress_message_id, progress_due=progress_due)
+
+
+def test_claim_batch_skips_exhausted_and_leased_rows():
+    pool = FakePool()
+    asyncio.run(outbox._claim_batch(pool))
+    query, args = pool.conn.calls[0]
+    assert 'attempts < $3' in query and 'FOR UPDATE SKIP LOCKED' in query
+    assert args == (OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS)
+
+
+def test_complete_counts_only_rows_deleted_by_this_worker():
+    # Сообщение 3 уже завершил другой воркер после истечения аренды: DELETE его не вернул
+    pool = FakePool([
+        [{'message_id': 1, 'broadcast_id': 7}, {'message_id': 2, 'broadcast_id': 7}],
+        None,
+    ])
+    asyncio.run(outbox._complete_batch(FakeBot(), pool, {1: True, 2: False, 3: True}))
+    (_, delete_args), (update_query, update_args) = pool.conn.calls
+    assert delete_args == ([1, 2, 3],)
+    assert 'UPDATE broadcasts' in update_query
+    assert update_args[:3] == (7, 1, 1)
+
+
+def test_repeated_completion_changes_nothing():
+    pool = FakePool([[]])
+    bot = FakeBot()
+    asyncio.run(outbox._complete_batch(bot, pool, {1: True}))
+    assert len(pool.conn.calls) == 1
+    assert bot.sent == [] and bot.edited == []
+
+
+def test_finished_broadcast_reports_once_to_creator():
+    pool = FakePool([[{'message_id': 1, 'broadcast_id': 7}], _broadcast_row(sent=3, failed=0)])
+    bot = FakeBot()
+    asyncio.run(outbox._complete_batch(bot, pool, {1: True}))
+    assert len(bot.sent) == 1
+    chat_id, text = bot.sent[0]
+    assert chat_id == 42 and text.startswith("Рассылка завершена.")
+
+
+def test_progress_message_is_edited_while_running():
+    bot = FakeBot()
+    asyncio.run(outbox._report_progress(bot, [
+        _broadcast_row(sent=1, failed=0, finished=False, progress_due=True, progress_message_id=500),
+    ]))
+    assert bot.sent == []
+    (chat_id, message_id, text), = bot.edited
+    assert (chat_id, message_id) == (42, 500)
+    assert "Обработано: 1 из 3" in text
+
+
+def test_progress_without_message_waits_for_final_report():
+    bot = FakeBot()
+    asyncio.run(outbox._report_progress(bot, [_broadcast_row(sent=1, failed=0, finished=False, progress_due=True)]))
+    assert bot.sent == [] and bot.edited == []
+
+
+def test_final_report_is_sent_when_progress_message_is_gone():
+    bot = FakeBot(edit_error=TelegramBadRequest(method=None, message='message to edit not found'))
+    asyncio.run(outbox._report_progress(bot, [_broadcast_row(sent=2, failed=1, progress_message_id=500)]))
+    assert len(bot.sent) == 1
+
+
+def test_discard_counts_exhausted_messages_as_failed():
+    pool = FakePool([
+        [{'message_id': 1, 'broadcast_id': 7, 'chat_id': 10}, {'message_id': 2, 'broadcast_id': 7, 'chat_id': 11}],
+        None,
+    ])
+    asyncio.run(outbox._discard_exhausted(FakeBot(), pool))
+    (delete_query, delete_args), (_, update_args) = pool.conn.calls
+    assert 'attempts >= $1' in delete_query and delete_args == (OUTBOX_MAX_ATTEMPTS,)
+    assert update_args[:3] == (7, 0, 2)
+
+
+def test_enqueue_during_claim_wakes_worker(monkeypatch):
+    monkeypatch.setattr(outbox, 'OUTBOX_POLL_INTERVAL', 60)
+
+    async def run():
+        monkeypatch.setattr(outbox, '_wakeup', asyncio.Event())
+        claims = []
+
+        async def claim(pool):
+            claims.append(len(claims))
+            if len(claims) == 1:
+                # Сообщения поставлены в очередь, пока первый захват шел в БД
+                outbox._wakeup.set()
+            return []
+
+        async def discard(bot, pool):
+            pass
+
+        monkeypatch.setattr(outbox, '_claim_batch', claim)
+        monkeypatch.setattr(outbox, '_discard_exhausted', discard)
+        worker = asyncio.create_task(outbox.outbox_worker(FakeBot(), None, 0))
+        await asyncio.sleep(0.1)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        return claims
+
+    # Без ожидания OUTBOX_POLL_INTERVAL воркер сразу идет за вторым пакетом
+    assert len(asyncio.run(run())) == 2
+
@@ -0,0 +1,84 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from fakes import FakePool
+from pagination import Page, TaskPageCursor, _task_page_query, fetch_task_page, page_cursors
+
+START = datetime(2026, 3, 1, 12, 0, 0, 123456)
+
+
+def _row(task_id: int) -> dict:
+    # Задачи идут от новых к старым, как в выдаче ORDER BY created_at DESC
+    return dict(task_id=task_id, title=f'task {task_id}', description=None, status='new',
+                created_at=START - timedelta(minutes=task_id), manager_id=1, employee_id=2,
+                manager_name='manager', employee_name='employee')
+
+
+def _fetch(rows, **kwargs):
+    # База отдает не больше LIMIT строк — последний аргумент запроса
+    pool = FakePool([lambda query, args: rows[:args[-1]]])
+    page = asyncio.run(fetch_task_page(pool, 'm', 1, page_size=3, **kwargs))
+    return page, pool.conn.calls[0]
+
+
+@pytest.mark.parametrize('with_status, direction, params', [
+    (False, None, 2),
+    (True, None, 3),
+    (False, 'n', 4),
+    (True, 'p', 5),
+])
+def test_query_placeholders_are_sequential(with_status, direction, params):
+    query = _task_page_query('manager_id', with_status, direction)
+    used = sorted({int(number) for number in re.findall(r'\$(\d+)', query)})
+    assert used == list(range(1, params + 1))
+    assert f'LIMIT ${params}' in query
+
+
+def test_query_direction_sets_comparison_and_order():
+    assert '< ($2, $3)' in _task_page_query('employee_id', False, 'n')
+    assert 'DESC' in _task_page_query('employee_id', False, 'n')
+    previous = _task_page_query('employee_id', True, 'p')
+    assert '> ($3, $4)' in previous and 'ASC' in previous
+
+
+def test_first_page_has_next_when_more_rows():
+    page, (_, args) = _fetch([_row(i) for i in range(1, 6)])
+    assert [task.task_id for task in page.rows] == [1, 2, 3]
+    assert not page.has_prev and page.has_next
+    # Запрашивается на одну строку больше страницы, чтобы узнать о следующей
+    assert args == (1, 4)
+
+
+def test_last_page_after_next_cursor():
+    cursor = TaskPageCursor(scope='m', status='new', direction='n', created_at=START, task_id=3)
+    page, (_, args) = _fetch([_row(4), _row(5)], status='new', cursor=cursor)
+    assert [task.task_id for task in page.rows] == [4, 5]
+    assert page.has_prev and not page.has_next
+    assert args == (1, 'new', START, 3, 4)
+
+
+def test_previous_page_is_reversed():
+    cursor = TaskPageCursor(scope='m', status=None, direction='p', created_at=START, task_id=7)
+    # При движении назад база отдает строки по возрастанию, ближайшие к курсору — первыми
+    page, _ = _fetch([_row(6), _row(5), _row(4), _row(3)], cursor=cursor)
+    assert [task.task_id for task in page.rows] == [4, 5, 6]
+    assert page.has_prev and page.has_next
+
+
+def test_page_cursors_point_at_page_edges():
+    page, _ = _fetch([_row(i) for i in range(1, 6)])
+    page.has_prev = True
+    prev_cursor, next_cursor = page_cursors(page, 'e', 'accepted')
+    assert prev_cursor == TaskPageCursor(scope='e', status='accepted', direction='p',
+                                         created_at=page.rows[0].created_at, task_id=1)
+    assert next_cursor == TaskPageCursor(scope='e', status='accepted', direction='n',
+                                         created_at=page.rows[-1].created_at, task_id=3)
+
+
+def test_page_cursors_absent_on_single_or_empty_page():
+    page, _ = _fetch([_row(1)])
+    assert page_cursors(page, 'm', None) == (None, None)
+    assert page_cursors(Page([], has_prev=True, has_next=True), 'm', None) == (None, None)
@@ -0,0 +1,114 @@
+import asyncio
+import re
+
+import pytest
+
+from handlers.manager_handlers import render_employee_row
+from models import User
+from render import TELEGRAM_MESSAGE_LIMIT, ChunkBuilder, build_chunks, send_rendered, split_html, text_length
+
+_TAG = re.compile(r'<(/?)(\w+)[^>]*>')
+
+
+def _plain(html: str) -> str:
+    return _TAG.sub('', html)
+
+
+def _assert_balanced(chunk: str):
+    stack = []
+    for match in _TAG.finditer(chunk):
+        if match.group(1):
+            assert stack and stack[-1] == match.group(2), chunk
+            stack.pop()
+        else:
+            stack.append(match.group(2))
+    assert not stack, chunk
+
+
+def test_short_text_is_one_chunk():
+    assert split_html('<b>привет</b>', 100) == ['<b>привет</b>']
+
+
+def test_astral_character_with_tight_limit_terminates():
+    # Раньше зацикливалось: после переоткрытия <b> оставалась одна единица UTF-16 под эмодзи
+    chunks = split_html('<b>😀</b>', 8)
+    assert chunks == ['😀']
+    assert split_html('<b>😀</b>', 9) == ['<b>😀</b>']
+
+
+def test_nested_tags_never_exceed_limit():
+    chunks = split_html('<b>' * 3 + 'abc', 10)
+    assert all(text_length(chunk) <= 10 for chunk in chunks)
+    assert ''.join(_plain(chunk) for chunk in chunks) == 'abc'
+    for chunk in chunks:
+        _assert_balanced(chunk)
+
+
+def test_tags_are_reopened_in_next_chunk():
+    chunks = split_html('<b>' + 'слово ' * 10 + '</b>', 20)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith('<b>') and chunk.endswith('</b>')
+        assert text_length(chunk) <= 20
+    assert ''.join(_plain(chunk) for chunk in chunks) == 'слово ' * 10
+
+
+def test_entities_are_not_split():
+    chunks = split_html('a' * 8 + '&amp;' + 'b' * 8, 10)
+    assert all(text_length(chunk) <= 10 for chunk in chunks)
+    assert any('&amp;' in chunk for chunk in chunks)
+    assert ''.join(chunks) == 'a' * 8 + '&amp;' + 'b' * 8
+
+
+def test_closing_tag_of_dropped_tag_is_skipped():
+    chunks = split_html('<b><code><b>&amp;</b></code>😀</b>', 20)
+    for chunk in chunks:
+        _assert_balanced(chunk)
+        assert text_length(chunk) <= 20
+    assert ''.join(_plain(chunk) for chunk in chunks) == '&amp;😀'
+
+
+@pytest.mark.parametrize('limit', [5, 7, 13, 40])
+def test_text_is_preserved_and_limit_respected(limit):
+    text = '<i>x</i> <b>жирный <code>код 😀😀</code> &lt;текст&gt;</b>\n' * 5
+    chunks = split_html(text, limit)
+    assert all(text_length(chunk) <= limit for chunk in chunks)
+    assert ''.join(_plain(chunk) for chunk in chunks) == _plain(text)
+    for chunk in chunks:
+        _assert_balanced(chunk)
+
+
+def test_build_chunks_keeps_blocks_whole():
+    blocks = ['a' * 6, 'b' * 6, 'c' * 6]
+    assert build_chunks(blocks, 12) == ['a' * 6 + 'b' * 6, 'c' * 6]
+
+
+def test_chunk_builder_splits_oversized_block():
+    builder = ChunkBuilder(10)
+    ready = builder.add('x' * 25)
+    assert ready == ['x' * 10, 'x' * 10]
+    assert builder.finish() == ['x' * 5]
+
+
+def _send_rendered(rows, **kwargs):
+    sent = []
+
+    async def send(text, reply_markup=None, **send_kwargs):
+        sent.append((text, reply_markup))
+
+    shown = asyncio.run(send_rendered(send, rows, render_employee_row, **kwargs))
+    return shown, sent
+
+
+def test_long_employee_list_is_chunked_and_escaped():
+    employees = [User(user_id=i, full_name=f'<Сотрудник & {i}>', role='employee') for i in range(500)]
+    shown, sent = _send_rendered(employees, header='Список:\n', reply_markup='keyboard')
+    assert shown == 500 and len(sent) > 1
+    assert all(text_length(text) <= TELEGRAM_MESSAGE_LIMIT for text, _ in sent)
+    assert [markup for _, markup in sent] == [None] * (len(sent) - 1) + ['keyboard']
+    text = ''.join(text for text, _ in sent)
+    assert '<Сотрудник' not in text and text.count('&lt;Сотрудник &amp; ') == 500
+
+
+def test_empty_list_sends_empty_text():
+    assert _send_rendered([], header='Список:\n', empty_text='Пусто') == (0, [('Пусто', None)])
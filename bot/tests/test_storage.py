@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import cache
+import storage
+from fakes import FakePool
+from states import AdminStates
+from storage import CachedStorage, PostgresStorage, check_fsm_storage_config
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+        self.fail_writes = False
+
+    async def get_state(self, key):
+        self.reads += 1
+        return await super().get_state(key)
+
+    async def get_data(self, key):
+        self.reads += 1
+        return await super().get_data(key)
+
+    async def set_state(self, key, state=None):
+        if self.fail_writes:
+            raise ConnectionError('storage is down')
+        await super().set_state(key, state)
+
+    async def set_data(self, key, data):
+        if self.fail_writes:
+            raise ConnectionError('storage is down')
+        await super().set_data(key, data)
+
+
+def test_postgres_reads_skip_expired_rows():
+    pool = FakePool([None, None])
+    fsm_storage = PostgresStorage(pool, state_ttl=600)
+    assert asyncio.run(fsm_storage.get_state(KEY)) is None
+    assert asyncio.run(fsm_storage.get_data(KEY)) == {}
+    for query, args in pool.conn.calls:
+        assert 'updated_at > CURRENT_TIMESTAMP - make_interval(secs => $2)' in query
+        assert args == (fsm_storage.key_builder.build(KEY), 600)
+
+
+def test_postgres_data_round_trips_through_json():
+    pool = FakePool([None, '{"title": "Задача", "ids": [1, 2]}'])
+    fsm_storage = PostgresStorage(pool)
+    asyncio.run(fsm_storage.set_data(KEY, {'title': 'Задача', 'ids': [1, 2]}))
+    assert pool.conn.calls[0][1][1] == '{"title": "Задача", "ids": [1, 2]}'
+    assert asyncio.run(fsm_storage.get_data(KEY)) == {'title': 'Задача', 'ids': [1, 2]}
+
+
+def test_purge_expired_returns_deleted_count():
+    fsm_storage = PostgresStorage(FakePool(['DELETE 3']), state_ttl=600)
+    assert asyncio.run(fsm_storage.purge_expired()) == 3
+
+
+def test_cleanup_survives_errors(monkeypatch):
+    purges = []
+
+    async def purge_expired():
+        purges.append(len(purges))
+        if len(purges) == 1:
+            raise ConnectionError('database is down')
+        return 1
+
+    async def sleep(seconds):
+        if len(purges) == 3:
+            raise asyncio.CancelledError
+
+    fsm_storage = PostgresStorage(FakePool())
+    monkeypatch.setattr(fsm_storage, 'purge_expired', purge_expired)
+    monkeypatch.setattr(storage.asyncio, 'sleep', sleep)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(fsm_storage.run_cleanup())
+    assert len(purges) == 3
+
+
+def test_cached_storage_writes_through_and_reads_from_cache():
+    backend = CountingStorage()
+    cached = CachedStorage(backend, ttl=60, max_size=10)
+
+    async def run():
+        await cached.set_state(KEY, AdminStates.waiting_for_broadcast_message)
+        await cached.set_data(KEY, {'step': 1})
+        assert await backend.get_state(KEY) == AdminStates.waiting_for_broadcast_message.state
+        assert await backend.get_data(KEY) == {'step': 1}
+        reads = backend.reads
+        assert await cached.get_state(KEY) == AdminStates.waiting_for_broadcast_message.state
+        assert await cached.get_data(KEY) == {'step': 1}
+        assert backend.reads == reads
+
+    asyncio.run(run())
+
+
+def test_cached_data_is_not_shared_with_callers():
+    cached = CachedStorage(CountingStorage(), ttl=60, max_size=10)
+
+    async def run():
+        data = {'ids': 1}
+        await cached.set_data(KEY, data)
+        data['ids'] = 2
+        (await cached.get_data(KEY))['ids'] = 3
+        return await cached.get_data(KEY)
+
+    assert asyncio.run(run()) == {'ids': 1}
+
+
+def test_failed_write_leaves_cache_unchanged():
+    backend = CountingStorage()
+    cached = CachedStorage(backend, ttl=60, max_size=10)
+
+    async def run():
+        await cached.set_state(KEY, 'first')
+        await cached.set_data(KEY, {'step': 1})
+        backend.fail_writes = True
+        with pytest.raises(ConnectionError):
+            await cached.set_state(KEY, 'second')
+        with pytest.raises(ConnectionError):
+            await cached.set_data(KEY, {'step': 2})
+        return await cached.get_state(KEY), await cached.get_data(KEY)
+
+    assert asyncio.run(run()) == ('first', {'step': 1})
+
+
+def test_clear_resets_state_and_data_together():
+    cached = CachedStorage(CountingStorage(), ttl=60, max_size=10)
+
+    async def run():
+        await cached.set_state(KEY, 'first')
+        await cached.set_data(KEY, {'step': 1})
+        # FSMContext.clear()
+        await cached.set_state(KEY, None)
+        await cached.set_data(KEY, {})
+        return await cached.get_state(KEY), await cached.get_data(KEY)
+
+    assert asyncio.run(run()) == (None, {})
+
+
+def test_expired_cache_entry_is_reread(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    backend = CountingStorage()
+    cached = CachedStorage(backend, ttl=60, max_size=10)
+
+    async def run():
+        await cached.set_state(KEY, 'first')
+        await backend.set_state(KEY, 'changed elsewhere')
+        assert await cached.get_state(KEY) == 'first'
+        now[0] += 61
+        assert await cached.get_state(KEY) == 'changed elsewhere'
+
+    asyncio.run(run())
+
+
+def test_unknown_storage_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(storage, 'FSM_STORAGE', 'sqlite')
+    with pytest.raises(ValueError):
+        check_fsm_storage_config()
+
+
+def test_redis_without_package_fails_at_startup(monkeypatch):
+    monkeypatch.setattr(storage, 'FSM_STORAGE', 'redis')
+    monkeypatch.setattr(storage.importlib.util, 'find_spec', lambda name: None)
+    with pytest.raises(ValueError, match='requirements-redis.txt'):
+        check_fsm_storage_config()
+
+
+def test_cleanup_runs_only_for_postgres(monkeypatch):
+    async def run():
+        monkeypatch.setattr(PostgresStorage, 'run_cleanup', lambda self: asyncio.sleep(0))
+        task = storage.start_storage_cleanup(CachedStorage(PostgresStorage(FakePool())))
+        assert task is not None
+        await task
+        assert storage.start_storage_cleanup(MemoryStorage()) is None
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+import re
+from datetime import date
+
+import pytest
+
+import task_events
+from fakes import FakePool
+from task_events import _add_months, ensure_task_event_partitions
+
+
+class FixedDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2026, 12, 17)
+
+
+def test_add_months_crosses_year():
+    assert _add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert _add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_partitions_cover_previous_current_and_ahead(monkeypatch):
+    monkeypatch.setattr(task_events, 'date', FixedDate)
+    pool = FakePool()
+    asyncio.run(ensure_task_event_partitions(pool, months_ahead=2))
+    ranges = [re.search(r"(task_events_y\d+m\d+) .* FROM \('([\d-]+)'\) TO \('([\d-]+)'\)", ' '.join(query.split()))
+              .groups() for query, _ in pool.conn.calls]
+    assert ranges == [
+        ('task_events_y2026m11', '2026-11-01', '2026-12-01'),
+        ('task_events_y2026m12', '2026-12-01', '2027-01-01'),
+        ('task_events_y2027m01', '2027-01-01', '2027-02-01'),
+        ('task_events_y2027m02', '2027-02-01', '2027-03-01'),
+    ]
+
+
+def test_partition_error_is_not_swallowed():
+    def fail(query, args):
+        raise ConnectionError('database is down')
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(ensure_task_event_partitions(FakePool([fail])))
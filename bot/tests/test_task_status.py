@@ -0,0 +1,30 @@
+from callbacks import STATUS_CODES
+from task_status import (ALLOWED_FROM, FINAL_STATUSES, INITIAL_STATUS, STATUS_COUNT_NAMES, STATUS_EMOJIS,
+                         STATUS_NAMES, TRANSITIONS)
+
+
+def test_transitions_lead_to_known_statuses():
+    assert INITIAL_STATUS in TRANSITIONS
+    for status, targets in TRANSITIONS.items():
+        assert set(targets) <= set(TRANSITIONS)
+        assert status not in targets
+
+
+def test_final_statuses_have_no_transitions():
+    assert FINAL_STATUSES == {'completed', 'rejected'}
+    assert all(not TRANSITIONS[status] for status in FINAL_STATUSES)
+
+
+def test_allowed_from_is_inverse_of_transitions():
+    assert ALLOWED_FROM == {
+        'new': [],
+        'accepted': ['new'],
+        'completed': ['new', 'accepted'],
+        'rejected': ['new', 'accepted'],
+    }
+
+
+def test_every_status_has_names_and_callback_code():
+    for mapping in (STATUS_EMOJIS, STATUS_NAMES, STATUS_COUNT_NAMES):
+        assert set(mapping) == set(TRANSITIONS)
+    assert set(STATUS_CODES.values()) == set(TRANSITIONS)
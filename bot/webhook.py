@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import re
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT, WEBHOOK_SHUTDOWN_TIMEOUT
+
+app_logger = logging.getLogger('app')
+
+# Ограничения Telegram на secret_token: 1-256 символов A-Z, a-z, 0-9, _ и -
+_SECRET_TOKEN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+
+def check_webhook_config():
+    if not WEBHOOK_URL:
+        raise ValueError("Для режима webhook необходимо задать WEBHOOK_URL")
+    # Без секрета любой, кто узнал путь webhook, сможет присылать поддельные апдейты
+    if not WEBHOOK_SECRET:
+        raise ValueError("Для режима webhook необходимо задать WEBHOOK_SECRET")
+    if not _SECRET_TOKEN.fullmatch(WEBHOOK_SECRET):
+        raise ValueError("WEBHOOK_SECRET может содержать только A-Z, a-z, 0-9, _ и - (до 256 символов)")
+
+
+async def health(request: web.Request) -> web.Response:
+    pool = request.app['pool']
+    try:
+        async with pool.acquire() as conn:
+            await conn.fetchval('SELECT 1')
+    except Exception as e:
+        app_logger.error(f"Проверка здоровья: база данных недоступна: {e}")
+        return web.json_response({'status': 'error', 'database': 'unavailable'}, status=503)
+    return web.json_response({'status': 'ok'})
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    app = web.Application()
+    app['pool'] = dp['pool']
+    request_handler = SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET,
+                                           handle_in_background=True)
+
+    async def drain_updates(app: web.Application):
+        # Даем уже принятым апдейтам доработать до остановки диспетчера. Набор задач — внутренний
+        # атрибут aiogram: если в новой версии его не окажется, просто не ждем
+        tasks = getattr(request_handler, '_background_feed_update_tasks', None)
+        if tasks is None:
+            app_logger.warning("Не удалось получить список обрабатываемых апдейтов, ожидание пропущено")
+            return
+        pending = list(tasks)
+        if pending:
+            app_logger.info(f"Ожидание завершения {len(pending)} апдейтов...")
+            await asyncio.wait(pending, timeout=WEBHOOK_SHUTDOWN_TIMEOUT)
+
+    app.on_shutdown.append(drain_updates)
+    setup_application(app, dp, bot=bot)
+    request_handler.register(app, path=WEBHOOK_PATH)
+    app.router.add_get('/health', health)
+    return app
+
+
+async def wait_for_stop_signal():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    await stop_event.wait()
+
+
+async def serve_webhook_app(app: web.Application, bot: Bot, allowed_updates: list):
+    check_webhook_config()
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=WEBAPP_HOST, port=WEBAPP_PORT)
+    await site.start()
+
+    await bot.set_webhook(f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                          allowed_updates=allowed_updates, drop_pending_updates=True)
+    app_logger.info(f"Бот запущен в режиме webhook на {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await wait_for_stop_signal()
+    finally:
+        app_logger.info("Остановка webhook-сервера...")
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    await serve_webhook_app(create_webhook_app(dp, bot), bot, dp.resolve_used_update_types())